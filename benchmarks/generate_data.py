@@ -0,0 +1,147 @@
+import argparse
+import csv
+import os
+import random
+from typing import List
+
+# Формат AD-выгрузки: лишние столбцы, как в реальном экспорте
+AD_HEADER = ['DisplayName', 'telephoneNumber', 'Department', 'mail', 'Enabled', 'Title']
+DEPARTMENTS = ['Отдел ИТ', 'Отдел продаж', 'Бухгалтерия', 'Склад', 'Юридический отдел']
+FIRST_NAMES = ['Иван', 'Анна', 'Пётр', 'Мария', 'Сергей', 'Ольга', 'Дмитрий', 'Елена']
+LAST_NAMES = ['Иванов', 'Петрова', 'Сидоров', 'Смирнова', 'Кузнецов', 'Попова', 'Волков', 'Соколова']
+UPLOAD_PHONE_HEADERS = ['number', 'phone', 'f_extension']
+PHONE_FORMATS = ['{}', '{}-{}-{}', '+7 ({}) {}-{}', '({}){}{}', ' {} {} {} ']
+
+
+def random_phone(rnd: random.Random) -> str:
+    """Возвращает случайный шестизначный номер."""
+    return str(rnd.randint(100000, 999999))
+
+
+def format_phone(phone: str, rnd: random.Random) -> str:
+    """Записывает номер в одном из встречающихся в выгрузках форматов."""
+    template = rnd.choice(PHONE_FORMATS)
+    if template == '{}':
+        return phone
+    return template.format(phone[:2], phone[2:4], phone[4:])
+
+
+def anomaly_phone(rnd: random.Random) -> str:
+    """Возвращает номер, который парсер AD должен признать аномалией."""
+    return rnd.choice(['XX' + str(rnd.randint(100, 999)), str(rnd.randint(1000, 99999)), 'доб.', '-'])
+
+
+def generate_ad_file(path: str, rows: int, seed: int = 1, encoding: str = 'windows-1251') -> List[str]:
+    """Создаёт AD-выгрузку с множественными номерами, дубликатами и аномалиями.
+
+    Около 20% ячеек telephoneNumber содержат несколько номеров через ';' или
+    '#', около 2% номеров повторяются у разных пользователей, около 1% —
+    аномалии, около 3% ячеек пустые.
+
+    Args:
+        path: Путь к создаваемому файлу.
+        rows: Количество пользователей.
+        seed: Зерно генератора.
+        encoding: Кодировка файла.
+
+    Returns:
+        Список корректных номеров AD (для построения выгрузок).
+    """
+    rnd = random.Random(seed)
+    phones = []
+    with open(path, 'w', newline='', encoding=encoding) as file_:
+        writer = csv.writer(file_, delimiter=';', quoting=csv.QUOTE_ALL)
+        writer.writerow(AD_HEADER)
+        for index in range(rows):
+            roll = rnd.random()
+            if roll < 0.03:
+                cell = ''
+            elif roll < 0.04:
+                cell = anomaly_phone(rnd)
+            else:
+                count = rnd.choice([2, 3]) if roll < 0.24 else 1
+                cell_phones = []
+                for _ in range(count):
+                    phone = rnd.choice(phones) if phones and rnd.random() < 0.02 else random_phone(rnd)
+                    cell_phones.append(phone)
+                phones.extend(cell_phones)
+                cell = rnd.choice([';', '#']).join(format_phone(phone, rnd) for phone in cell_phones)
+            name = f"{rnd.choice(LAST_NAMES)} {rnd.choice(FIRST_NAMES)} {index}"
+            writer.writerow([
+                name, cell, rnd.choice(DEPARTMENTS), f"user{index}@company.com",
+                rnd.choice(['True', 'True', 'True', 'False']), 'Специалист',
+            ])
+    return phones
+
+
+def generate_upload_files(directory: str, rows: int, ad_phones: List[str], seed: int = 2,
+                          files: int = 4, hit_rate: float = 0.6) -> List[str]:
+    """Создаёт выгрузки .txt и .csv с повторяющимися номерами, как в журналах звонков.
+
+    Args:
+        directory: Папка для файлов.
+        rows: Общее количество номеров во всех файлах.
+        ad_phones: Номера AD, часть которых попадёт в выгрузки.
+        seed: Зерно генератора.
+        files: Количество файлов (чередуются .txt и .csv).
+        hit_rate: Доля номеров, которые есть в AD.
+
+    Returns:
+        Список путей к созданным файлам.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    # Журналы звонков: небольшой набор «популярных» номеров повторяется часто
+    pool_size = max(10, rows // 20)
+    pool = [
+        rnd.choice(ad_phones) if ad_phones and rnd.random() < hit_rate else random_phone(rnd)
+        for _ in range(pool_size)
+    ]
+    paths = []
+    per_file = [rows // files + (1 if index < rows % files else 0) for index in range(files)]
+    for index, count in enumerate(per_file):
+        if index % 2 == 0:
+            path = os.path.join(directory, f"calls_{index}.txt")
+            with open(path, 'w', newline='', encoding='utf-8') as file_:
+                for _ in range(count):
+                    file_.write(format_phone(rnd.choice(pool), rnd) + '\n')
+        else:
+            path = os.path.join(directory, f"calls_{index}.csv")
+            with open(path, 'w', newline='', encoding='utf-8') as file_:
+                writer = csv.writer(file_, delimiter=',')
+                writer.writerow(['date', UPLOAD_PHONE_HEADERS[index // 2 % len(UPLOAD_PHONE_HEADERS)], 'duration'])
+                for _ in range(count):
+                    writer.writerow(['2025-04-26 12:00:00', format_phone(rnd.choice(pool), rnd), rnd.randint(0, 3600)])
+        paths.append(path)
+    return paths
+
+
+def generate_tier(directory: str, rows: int, seed: int = 1) -> dict:
+    """Создаёт набор данных одного размера: AD-файл и выгрузки.
+
+    Args:
+        directory: Папка набора.
+        rows: Количество строк AD и номеров в выгрузках.
+        seed: Зерно генератора.
+
+    Returns:
+        Словарь {"ad_file", "upload_files"}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    ad_file = os.path.join(directory, 'ad_input.csv')
+    ad_phones = generate_ad_file(ad_file, rows, seed)
+    upload_files = generate_upload_files(os.path.join(directory, 'phone_data'), rows, ad_phones, seed + 1)
+    return {'ad_file': ad_file, 'upload_files': upload_files}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация тестовых данных для бенчмарков")
+    parser.add_argument("directory", help="Папка для данных")
+    parser.add_argument("rows", type=lambda value: int(float(value)), help="Количество строк (например, 1e5)")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора")
+    args = parser.parse_args()
+    generate_tier(args.directory, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from phone_matcher.match import match_phones
+from phone_matcher.output import write_output_file
+from phone_matcher.parse_ad import parse_ad_file
+from phone_matcher.parse_phone import parse_phone_file
+
+from .generate_data import generate_tier
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+DEFAULT_TIERS = ['1e3', '1e4', '1e5']
+
+
+def timed(func: Callable, repeat: int):
+    """Выполняет func repeat раз и возвращает (лучшее время, результат последнего вызова)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load_tier(rows: int) -> dict:
+    """Возвращает набор данных размера rows, создавая его при первом запуске."""
+    directory = os.path.join(DATA_DIR, f"tier_{rows}")
+    ad_file = os.path.join(directory, 'ad_input.csv')
+    upload_files = sorted(glob.glob(os.path.join(directory, 'phone_data', 'calls_*')))
+    if os.path.exists(ad_file) and upload_files:
+        return {'ad_file': ad_file, 'upload_files': upload_files}
+    print(f"Генерация данных: {rows} строк -> {directory}")
+    return generate_tier(directory, rows)
+
+
+def run_tier(rows: int, repeat: int) -> List[dict]:
+    """Замеряет этапы обработки на наборе данных одного размера.
+
+    Этапы замеряются по отдельности: разбор AD, разбор выгрузок,
+    сопоставление и запись результата.
+
+    Args:
+        rows: Размер набора.
+        repeat: Количество повторов, берётся лучшее время.
+
+    Returns:
+        Список замеров {"tier", "stage", "seconds", "rows", "rows_per_sec"}.
+    """
+    data = load_tier(rows)
+    results = []
+
+    def record(stage, seconds, count):
+        results.append({
+            'tier': rows,
+            'stage': stage,
+            'seconds': round(seconds, 4),
+            'rows': count,
+            'rows_per_sec': round(count / seconds) if seconds else None,
+        })
+        print(f"{rows:>10} {stage:<20} {seconds:>9.3f} с {count:>10} строк")
+
+    seconds, (ad_data, _) = timed(lambda: parse_ad_file(data['ad_file']), repeat)
+    record('parse_ad_file', seconds, rows)
+
+    def parse_uploads():
+        phones = []
+        for upload_file in data['upload_files']:
+            phones.extend(parse_phone_file(upload_file))
+        return phones
+    seconds, phones = timed(parse_uploads, repeat)
+    record('parse_phone_file', seconds, len(phones))
+
+    seconds, matches = timed(lambda: match_phones(phones, ad_data), repeat)
+    record('match_phones', seconds, len(matches))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_file = os.path.join(temp_dir, 'output.csv')
+        seconds, count = timed(lambda: write_output_file(matches, output_file), repeat)
+    record('write_output_file', seconds, count)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    """Возвращает текущий коммит git или None."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+            text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous() -> Optional[dict]:
+    """Загружает последний сохранённый отчёт о замерах."""
+    reports = sorted(glob.glob(os.path.join(RESULTS_DIR, 'bench_*.json')))
+    if not reports:
+        return None
+    with open(reports[-1], encoding='utf-8') as file_:
+        return json.load(file_)
+
+
+def compare(previous: dict, results: List[dict]) -> None:
+    """Печатает изменение времени этапов относительно прошлого отчёта."""
+    baseline = {(item['tier'], item['stage']): item['seconds'] for item in previous['results']}
+    print(f"\nСравнение с {previous['timestamp']} ({previous.get('revision') or 'без ревизии'}):")
+    for item in results:
+        old = baseline.get((item['tier'], item['stage']))
+        if old:
+            change = (item['seconds'] - old) / old * 100
+            print(f"{item['tier']:>10} {item['stage']:<20} {old:>9.3f} -> {item['seconds']:.3f} с ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки этапов обработки ADPhoneMatcher")
+    parser.add_argument("--tiers", nargs="+", default=DEFAULT_TIERS,
+                        help="Размеры наборов в строках, от 1e3 до 1e7 (по умолчанию 1e3 1e4 1e5)")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на этап, берётся лучшее время")
+    parser.add_argument("--no-save", action="store_true", help="Не сохранять отчёт")
+    args = parser.parse_args()
+
+    previous = load_previous()
+    results = []
+    for tier in args.tiers:
+        results.extend(run_tier(int(float(tier)), args.repeat))
+
+    report = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if previous:
+        compare(previous, results)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        report_file = os.path.join(RESULTS_DIR, f"bench_{report['timestamp']}.json")
+        with open(report_file, 'w', encoding='utf-8') as file_:
+            json.dump(report, file_, ensure_ascii=False, indent=2)
+        print(f"\nОтчёт сохранён в {report_file}")
+
+
+if __name__ == "__main__":
+    main()
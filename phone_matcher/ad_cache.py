@@ -0,0 +1,175 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import List, Optional, Tuple
+
+from . import config
+from .ad_index import AdIndex
+from .parse_ad import parse_ad_file
+from .utils import ensure_dir, log_error, log_info, log_verbose
+
+CACHE_FORMAT_VERSION = 3  # Увеличивается при изменении формата индекса
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """Считает хеш содержимого файла.
+
+    Args:
+        file_path: Путь к файлу.
+
+    Returns:
+        Хеш BLAKE2b в шестнадцатеричном виде.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as file_:
+        for chunk in iter(lambda: file_.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(file_paths: List[str]) -> str:
+    """Считает общий хеш содержимого нескольких файлов.
+
+    Для одного файла совпадает с hash_file.
+
+    Args:
+        file_paths: Пути к файлам.
+
+    Returns:
+        Хеш BLAKE2b в шестнадцатеричном виде.
+    """
+    if len(file_paths) == 1:
+        return hash_file(file_paths[0])
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path in file_paths:
+        digest.update(f"{os.path.basename(file_path)}:{hash_file(file_path)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def fingerprint_file(file_path: str, content_hash: Optional[str] = None) -> dict:
+    """Возвращает отпечаток файла: размер, время изменения и хеш содержимого.
+
+    Args:
+        file_path: Путь к файлу.
+        content_hash: Уже посчитанный хеш содержимого, если есть.
+
+    Returns:
+        Словарь {"size", "mtime_ns", "hash"}.
+    """
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': content_hash or hash_file(file_path),
+    }
+
+
+def get_cache_path(ad_file: str) -> str:
+    """Возвращает путь к файлу кэша для AD-файла.
+
+    Args:
+        ad_file: Путь к файлу AD.
+
+    Returns:
+        Путь к файлу кэша в config.AD_CACHE_DIR.
+    """
+    abs_path = os.path.abspath(ad_file)
+    path_hash = hashlib.blake2b(abs_path.encode('utf-8'), digest_size=6).hexdigest()
+    return os.path.join(config.AD_CACHE_DIR, f"{os.path.basename(abs_path)}.{path_hash}.idx")
+
+
+def _read_cache_header(file_) -> Optional[dict]:
+    """Читает заголовок кэша, None — если формат не подходит."""
+    header = pickle.load(file_)
+    if not isinstance(header, dict) or header.get('version') != CACHE_FORMAT_VERSION:
+        return None
+    return header
+
+
+def _load_cached_index(ad_file: str, cache_file: str) -> Optional[Tuple[AdIndex, int]]:
+    """Загружает индекс из кэша, если отпечаток AD-файла не изменился.
+
+    Хеш содержимого считается только при совпадении размера и времени изменения.
+
+    Args:
+        ad_file: Путь к файлу AD.
+        cache_file: Путь к файлу кэша.
+
+    Returns:
+        Кортеж (данные AD, количество аномалий) или None, если кэш устарел.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as file_:
+            header = _read_cache_header(file_)
+            if header is None:
+                log_verbose(f"Кэш AD {cache_file} в устаревшем формате")
+                return None
+            stat = os.stat(ad_file)
+            cached = header['fingerprint']
+            if cached['size'] != stat.st_size or cached['mtime_ns'] != stat.st_mtime_ns:
+                log_verbose(f"Файл AD {ad_file} изменился, кэш будет пересобран")
+                return None
+            if cached['hash'] != hash_file(ad_file):
+                log_verbose(f"Содержимое AD {ad_file} изменилось, кэш будет пересобран")
+                return None
+            return pickle.load(file_), header['anomaly_count']
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError) as exc:
+        log_error(f"Ошибка чтения кэша AD {cache_file}: {exc}")
+        return None
+
+
+def _write_cache(cache_file: str, fingerprint: dict, ad_data: AdIndex, anomaly_count: int) -> None:
+    """Атомарно записывает индекс AD в кэш.
+
+    Args:
+        cache_file: Путь к файлу кэша.
+        fingerprint: Отпечаток AD-файла.
+        ad_data: Индекс AD.
+        anomaly_count: Количество аномалий.
+    """
+    cache_dir = os.path.dirname(cache_file)
+    ensure_dir(cache_dir)
+    fd, temp_file = tempfile.mkstemp(prefix='.ad_cache_', dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as file_:
+            header = {'version': CACHE_FORMAT_VERSION, 'fingerprint': fingerprint, 'anomaly_count': anomaly_count}
+            pickle.dump(header, file_, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(ad_data, file_, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except OSError as exc:
+        log_error(f"Ошибка записи кэша AD {cache_file}: {exc}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def load_ad_index(ad_file: str) -> Tuple[AdIndex, int]:
+    """Загружает индекс AD из кэша или строит его из CSV и сохраняет в кэш.
+
+    Кэш привязан к размеру, времени изменения и хешу содержимого AD-файла
+    и пересобирается автоматически при изменении выгрузки.
+
+    Args:
+        ad_file: Путь к файлу AD.
+
+    Returns:
+        Кортеж: (индекс AdIndex {номер: [(ФИО, email, Enabled), ...]}, количество аномалий).
+
+    Raises:
+        FileNotFoundError: Если файл AD не найден.
+        ValueError: Если формат AD некорректен.
+    """
+    cache_file = get_cache_path(ad_file)
+    cached = _load_cached_index(ad_file, cache_file)
+    if cached is not None:
+        log_info(f"Индекс AD загружен из кэша {cache_file}")
+        return cached
+
+    content_hash = hash_file(ad_file)
+    ad_data, anomaly_count = parse_ad_file(ad_file)
+    _write_cache(cache_file, fingerprint_file(ad_file, content_hash), ad_data, anomaly_count)
+    log_verbose(f"Индекс AD сохранён в кэш {cache_file}")
+    return ad_data, anomaly_count
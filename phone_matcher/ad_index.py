@@ -0,0 +1,215 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from typing import Iterator, List, Optional, Tuple, Union
+
+Record = Tuple[str, str, str]
+
+
+class AdIndex(Mapping):
+    """Компактный индекс AD: номер -> список (ФИО, email, Enabled).
+
+    Ведёт себя как словарь {номер: [(ФИО, email, Enabled), ...]}, но хранит
+    данные без объектов на каждую запись:
+
+    - ФИО и email записи идут подряд в общем буфере UTF-8, запись —
+      это её номер: границы строк берутся из массива смещений;
+    - запись строки AD с несколькими номерами хранится один раз;
+    - значение Enabled кодируется номером в маленькой таблице (для
+      True/False — один бит информации, байт на запись);
+    - номеру с одной записью соответствует целое число, с несколькими —
+      кортеж чисел, без списка.
+
+    Списки кортежей создаются только при обращении к номеру.
+
+    Индекс из нескольких выгрузок AD (доменов) собирается методом merge:
+    записи каждого домена занимают непрерывный диапазон номеров записей,
+    поэтому домен записи определяется по началам диапазонов, без поля
+    на каждую запись.
+    """
+    __slots__ = ('_phones', '_blob', '_offsets', '_enabled', '_enabled_values', '_shard_starts', '_shard_domains',
+                 '_last')
+
+    def __init__(self, domain: str = ''):
+        """Создаёт пустой индекс.
+
+        Args:
+            domain: Домен (источник) записей индекса, обычно имя AD-файла.
+        """
+        self._phones = {}
+        self._blob = bytearray()
+        self._offsets = array('Q', [0])  # Запись N: ФИО — [2N, 2N+1], email — [2N+1, 2N+2]
+        self._enabled = array('B')
+        self._enabled_values = []
+        self._shard_starts = [0]  # Номер первой записи каждого домена
+        self._shard_domains = [domain]
+        self._last = None
+
+    def _enabled_code(self, value: str) -> int:
+        try:
+            return self._enabled_values.index(value)
+        except ValueError:
+            self._enabled_values.append(value)
+            if len(self._enabled_values) > 256 and self._enabled.typecode == 'B':
+                self._enabled = array('I', self._enabled)
+            return len(self._enabled_values) - 1
+
+    def _record(self, record_id: int) -> Record:
+        blob = self._blob
+        offsets = self._offsets
+        start = record_id * 2
+        middle = offsets[start + 1]
+        return (blob[offsets[start]:middle].decode('utf-8'), blob[middle:offsets[start + 2]].decode('utf-8'),
+                self._enabled_values[self._enabled[record_id]])
+
+    def add(self, phone: str, display_name: str, email: str, enabled: str) -> None:
+        """Добавляет запись для номера (в конец списка его записей).
+
+        Запись, совпадающая с предыдущей добавленной (несколько номеров
+        в одной строке AD), повторно не сохраняется.
+
+        Args:
+            phone: Нормализованный номер.
+            display_name: ФИО.
+            email: Email.
+            enabled: Значение Enabled.
+        """
+        record = (display_name, email, enabled)
+        if self._last is not None and self._last[0] == record:
+            record_id = self._last[1]
+        else:
+            record_id = len(self._enabled)
+            self._blob += display_name.encode('utf-8')
+            self._offsets.append(len(self._blob))
+            self._blob += email.encode('utf-8')
+            self._offsets.append(len(self._blob))
+            self._enabled.append(self._enabled_code(enabled))
+            self._last = (record, record_id)
+
+        current = self._phones.get(phone)
+        if current is None:
+            self._phones[phone] = record_id
+        elif isinstance(current, int):
+            self._phones[phone] = (current, record_id)
+        else:
+            self._phones[phone] = current + (record_id,)
+
+    def merge(self, other: 'AdIndex') -> int:
+        """Добавляет записи другого индекса (домена) после своих.
+
+        Записи номера, который есть в обоих индексах, идут в порядке
+        индексов, как при разборе выгрузок AD одна за другой.
+
+        Args:
+            other: Индекс, записи которого добавляются.
+
+        Returns:
+            Количество номеров other, которые уже были в индексе.
+        """
+        base = len(self._enabled)
+        if not base:
+            self._shard_starts, self._shard_domains = [], []
+        self._shard_starts.extend(start + base for start in other._shard_starts)
+        self._shard_domains.extend(other._shard_domains)
+
+        blob_base = len(self._blob)
+        self._blob += other._blob
+        self._offsets.extend(offset + blob_base for offset in other._offsets[1:])
+        codes = [self._enabled_code(value) for value in other._enabled_values]
+        if codes == list(range(len(codes))) and self._enabled.typecode == other._enabled.typecode:
+            self._enabled.extend(other._enabled)
+        else:
+            self._enabled.extend(codes[code] for code in other._enabled)
+
+        phones = self._phones
+        shared = 0
+        for phone, ids in other._phones.items():
+            ids = ids + base if ids.__class__ is int else tuple(record_id + base for record_id in ids)
+            current = phones.get(phone)
+            if current is None:
+                phones[phone] = ids
+                continue
+            shared += 1
+            current = (current,) if current.__class__ is int else current
+            phones[phone] = current + ((ids,) if ids.__class__ is int else ids)
+        self._last = None
+        return shared
+
+    @property
+    def domains(self) -> List[str]:
+        """Домены индекса в порядке добавления."""
+        return list(self._shard_domains)
+
+    def record_domains(self, phone: str) -> List[str]:
+        """Возвращает домены записей номера в том же порядке, что и get().
+
+        Args:
+            phone: Нормализованный номер.
+
+        Returns:
+            Список доменов (пустой, если номера нет).
+        """
+        current = self._phones.get(phone)
+        if current is None:
+            return []
+        ids = (current,) if current.__class__ is int else current
+        return [self._shard_domains[bisect_right(self._shard_starts, record_id) - 1] for record_id in ids]
+
+    def record_count(self, phone: str) -> int:
+        """Возвращает количество записей для номера (0, если номера нет)."""
+        current = self._phones.get(phone)
+        if current is None:
+            return 0
+        return 1 if isinstance(current, int) else len(current)
+
+    def get(self, phone: str, default: Optional[List[Record]] = None) -> Optional[List[Record]]:
+        current = self._phones.get(phone)
+        if current is None:
+            return default
+        if current.__class__ is int:
+            return [self._record(current)]
+        return [self._record(record_id) for record_id in current]
+
+    def __getitem__(self, phone: str) -> List[Record]:
+        records = self.get(phone)
+        if records is None:
+            raise KeyError(phone)
+        return records
+
+    def __contains__(self, phone) -> bool:
+        return phone in self._phones
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._phones)
+
+    def __len__(self) -> int:
+        return len(self._phones)
+
+    def __repr__(self) -> str:
+        return (f"AdIndex({len(self._phones)} номеров, {len(self._enabled)} записей, "
+                f"{len(self._shard_domains)} доменов)")
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_last'}
+
+    def __setstate__(self, state: dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._last = None
+
+
+def record_counts(ad_data: Union[AdIndex, Mapping]) -> Iterator[Tuple[str, int]]:
+    """Выдаёт (номер, количество записей) без построения списков записей.
+
+    Args:
+        ad_data: Индекс AD или словарь {номер: [(ФИО, email, Enabled), ...]}.
+
+    Yields:
+        Кортежи (номер, количество записей).
+    """
+    if isinstance(ad_data, AdIndex):
+        for phone in ad_data:
+            yield phone, ad_data.record_count(phone)
+        return
+    for phone, records in ad_data.items():
+        yield phone, len(records)
@@ -0,0 +1,146 @@
+import errno
+import gzip
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from typing import Optional
+
+from . import config
+from .utils import ensure_dir, log_error, log_info, split_compression
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    next INTEGER NOT NULL
+) WITHOUT ROWID
+'''
+
+
+def numbered_name(base_name: str, counter: int) -> str:
+    """Возвращает имя файла с номером перед расширениями: calls.csv.gz -> calls_1.csv.gz."""
+    if not counter:
+        return base_name
+    name, compressed = split_compression(base_name)
+    name, ext = os.path.splitext(name)
+    return f"{name}_{counter}{ext}{compressed}"
+
+
+class ArchiveIndex:
+    """Индекс занятых имён архива (SQLite в папке архива).
+
+    Для каждого имени файла в архиве (с подпапкой даты) хранится
+    следующий свободный номер, поэтому имя выбирается одним запросом, а не
+    перебором os.path.exists по всем номерам. Номер резервируется в
+    транзакции BEGIN IMMEDIATE: одновременные процессы получают разные имена.
+    """
+    def __init__(self, archive_dir: str):
+        ensure_dir(archive_dir)
+        self.archive_dir = archive_dir
+        self._conn = sqlite3.connect(os.path.join(archive_dir, config.ARCHIVE_INDEX_FILE), isolation_level=None)
+        self._conn.execute(_SCHEMA)
+
+    def __enter__(self) -> 'ArchiveIndex':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def reserve(self, name: str) -> str:
+        """Резервирует свободное имя в архиве.
+
+        Файлы, попавшие в архив без индекса (например, до его появления),
+        пропускаются проверкой существования зарезервированного имени.
+
+        Args:
+            name: Путь файла относительно папки архива.
+
+        Returns:
+            Путь относительно папки архива: name, затем name_1, name_2, ...
+        """
+        directory, base_name = os.path.split(name)
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._conn.execute('SELECT next FROM names WHERE name = ?', (name,)).fetchone()
+            counter = row[0] if row else 0
+            while os.path.exists(os.path.join(self.archive_dir, directory, numbered_name(base_name, counter))):
+                counter += 1
+            self._conn.execute('INSERT OR REPLACE INTO names VALUES (?, ?)', (name, counter + 1))
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        return os.path.join(directory, numbered_name(base_name, counter))
+
+    def close(self) -> None:
+        """Закрывает индекс."""
+        self._conn.close()
+
+
+def _copy_file(source_path: str, dest_path: str, compress: bool) -> None:
+    """Потоково копирует файл (при compress — со сжатием gzip) и атомарно переименовывает копию."""
+    temp_path = f"{dest_path}.tmp"
+    try:
+        with open(source_path, 'rb') as source, open(temp_path, 'wb') as target:
+            if compress:
+                with gzip.GzipFile(filename=os.path.basename(source_path), fileobj=target, mode='wb',
+                                   compresslevel=config.ARCHIVE_COMPRESSION_LEVEL) as gzip_file:
+                    shutil.copyfileobj(source, gzip_file, config.ARCHIVE_BUFFER_SIZE)
+            else:
+                shutil.copyfileobj(source, target, config.ARCHIVE_BUFFER_SIZE)
+        shutil.copystat(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def archive_file(
+    file_path: str, archive_dir: str, compress: Optional[bool] = None, partition_format: Optional[str] = None
+) -> Optional[str]:
+    """Перемещает файл в архив под уникальным именем.
+
+    Файл кладётся в подпапку даты архивирования и получает номер, если имя
+    в ней занято (см. ArchiveIndex). В пределах файловой системы файл
+    переименовывается; между файловыми системами и при сжатии копируется
+    потоково через временный файл, исходный файл удаляется после копирования.
+
+    Args:
+        file_path: Путь к файлу.
+        archive_dir: Папка архива.
+        compress: Сжимать файл gzip; уже сжатые файлы не сжимаются.
+            По умолчанию config.ARCHIVE_COMPRESS.
+        partition_format: Формат strftime подпапки даты, '' — без подпапок.
+            По умолчанию config.ARCHIVE_PARTITION_FORMAT.
+
+    Returns:
+        Путь к файлу в архиве или None при ошибке.
+    """
+    compress = config.ARCHIVE_COMPRESS if compress is None else compress
+    partition_format = config.ARCHIVE_PARTITION_FORMAT if partition_format is None else partition_format
+    base_name = os.path.basename(file_path)
+    compress = compress and not split_compression(base_name)[1]
+    if compress:
+        base_name += '.gz'
+    partition = datetime.now().strftime(partition_format) if partition_format else ''
+    try:
+        with ArchiveIndex(archive_dir) as index:
+            dest_path = os.path.join(archive_dir, index.reserve(os.path.join(partition, base_name)))
+        ensure_dir(os.path.dirname(dest_path))
+        if compress:
+            _copy_file(file_path, dest_path, compress=True)
+            os.remove(file_path)
+        else:
+            try:
+                os.rename(file_path, dest_path)
+            except OSError as exc:
+                if exc.errno != errno.EXDEV:
+                    raise
+                _copy_file(file_path, dest_path, compress=False)
+                os.remove(file_path)
+        log_info(f"Файл перемещён в архив: {file_path}")
+        return dest_path
+    except (OSError, sqlite3.Error) as exc:
+        log_error(f"Ошибка перемещения файла {file_path} в архив: {exc}")
+        return None
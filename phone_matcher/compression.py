@@ -0,0 +1,61 @@
+import bz2
+import gzip
+import lzma
+import os
+import zipfile
+import zlib
+from typing import BinaryIO, Iterator, Tuple
+
+from . import config
+from .utils import log_verbose, split_compression
+
+_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+# Ошибки повреждённых архивов, которые не являются OSError
+COMPRESSION_ERRORS = (zipfile.BadZipFile, lzma.LZMAError, zlib.error, EOFError)
+
+
+def upload_format(name: str) -> str:
+    """Возвращает расширение содержимого выгрузки без расширения сжатия (".csv", ".txt")."""
+    return os.path.splitext(split_compression(name)[0])[1]
+
+
+def iter_upload_streams(file_path: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """Открывает файл выгрузки, в том числе сжатый, без распаковки на диск.
+
+    Файлы .gz, .bz2 и .xz распаковываются потоково. Из архива .zip по
+    очереди выдаются все файлы с расширениями config.UPLOAD_EXTENSIONS,
+    остальные пропускаются. Каждый поток закрывается после того, как
+    потребитель переходит к следующему.
+
+    Args:
+        file_path: Путь к файлу выгрузки.
+
+    Yields:
+        Кортежи (имя содержимого, бинарный поток). Имя — путь к файлу,
+        для файлов архива .zip — "путь_к_архиву:имя_в_архиве".
+
+    Raises:
+        ValueError: Если файл архива .zip зашифрован или сжат неподдерживаемым методом.
+    """
+    _, compressed = split_compression(file_path)
+    if compressed != '.zip':
+        opener = _OPENERS.get(compressed, open)
+        with opener(file_path, 'rb') as file_:
+            yield file_path, file_
+        return
+
+    with zipfile.ZipFile(file_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if os.path.splitext(info.filename)[1] not in config.UPLOAD_EXTENSIONS:
+                log_verbose(f"Пропущен файл {info.filename} в архиве {file_path}")
+                continue
+            try:
+                member = archive.open(info)
+            except (RuntimeError, NotImplementedError) as exc:
+                # Зашифрованный файл или неподдерживаемый метод сжатия
+                raise ValueError(f"Не удалось открыть {info.filename} в архиве {file_path}: {exc}") from exc
+            with member:
+                yield f"{file_path}:{info.filename}", member
@@ -3,6 +3,8 @@ from datetime import datetime
 
 # Кодировки
 ENCODINGS = ['utf-8-sig', 'utf-8', 'windows-1251']
+DECODE_CHUNK_SIZE = 1024 * 1024  # Размер блока (байт) для подбора кодировки и декодирования
+MMAP_UPLOADS = True  # Разбирать несжатые выгрузки через mmap на уровне байтов (результат тот же)
 
 # Разделители
 AD_DELIMITER = ';'  # Разделитель полей в AD-файле
@@ -17,11 +19,19 @@ AD_FIELDS = {
     'email': 'mail',
     'enabled': 'Enabled'
 }
+RANGE_FIELD = 'range'  # Столбец с диапазоном номеров в файле диапазонов (--ranges)
+UPLOAD_EXTENSIONS = ['.csv', '.txt']  # Расширения файлов выгрузки
+# Сжатые выгрузки (.csv.gz, .txt.xz, .zip) читаются без распаковки
+COMPRESSED_EXTENSIONS = ['.gz', '.bz2', '.xz', '.zip']
 UPLOAD_PHONE_FIELDS = ['number', 'phone', 'f_extension']  # Возможные имена столбцов с номерами в выгрузках
 OUTPUT_FIELDS = ['Номер', 'ФИО', 'email', 'Активный']  # Имена полей в выходном CSV
+COUNTED_OUTPUT_FIELDS = OUTPUT_FIELDS + ['Количество', 'Файлы']  # Поля выходного CSV в режиме --dedupe
+MATCH_RULE_FIELDS = ['Правило', 'Номер AD']  # Дополнительные поля выходного CSV в режиме --suffix-match
 
 # Символы для нормализации
 NORMALIZE_CHARS = set('+-() " ')  # Удаляемые символы при нормализации
+NORMALIZE_CACHE_SIZE = 65536  # Размер LRU-кэша нормализованных номеров
+NORMALIZE_BATCH_SIZE = 4096  # Количество строк, нормализуемых за один вызов
 
 # Длина валидного номера телефона
 VALID_PHONE_NUMBER_LENGTH = 6
@@ -32,16 +42,47 @@ INPUT_DIR = os.path.join(BASE_DIR, 'data', 'ad_input')
 UPLOADS_DIR = os.path.join(BASE_DIR, 'data', 'phone_data')
 RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'results')
 ARCHIVE_DIR = os.path.join(BASE_DIR, 'data', 'archive')
+AD_CACHE_DIR = os.path.join(BASE_DIR, 'data', 'ad_cache')  # Кэш скомпилированного индекса AD
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
-EXCLUDE_DIRS = [RESULTS_DIR, ARCHIVE_DIR]  # Исключаемые папки при поиске выгрузок
+HISTORY_DB = os.path.join(BASE_DIR, 'data', 'history', 'seen_numbers.sqlite3')  # История номеров (--history)
+JOURNAL_DIR = os.path.join(BASE_DIR, 'data', 'journal')  # Журналы прогонов для --resume
+HISTORY_BATCH_SIZE = 500  # Номеров в одном запросе к истории
+UPLOAD_MANIFEST_DB = os.path.join(BASE_DIR, 'data', 'upload_manifest', 'manifest.sqlite3')  # Манифест (--manifest)
+UPLOAD_CACHE_DIR = os.path.join(BASE_DIR, 'data', 'upload_manifest', 'numbers')  # Номера выгрузок из манифеста
+UPLOAD_MANIFEST_MAX_AGE_DAYS = 30  # Забывать содержимое выгрузок, не встречавшееся N дней
+UPLOAD_MANIFEST_PRUNE_INTERVAL = 3600  # Период (секунды) очистки манифеста в долгоживущем процессе (--watch)
+UPLOAD_MANIFEST_ORPHAN_AGE = 86400  # Удалять номера без записи манифеста старше N секунд (моложе — идущий прогон)
+UPLOAD_RECURSIVE = True  # Искать выгрузки и в подпапках папки выгрузок
+UPLOAD_MIN_AGE = 0.0  # Пропускать выгрузки, изменённые менее N секунд назад (ещё записываются)
+ARCHIVE_INDEX_FILE = '.archive_index.sqlite3'  # Индекс имён архива (в папке архива)
+ARCHIVE_PARTITION_FORMAT = '%Y-%m-%d'  # Подпапки архива по дате архивирования ('' — без подпапок)
+ARCHIVE_COMPRESS = False  # Сжимать выгрузки gzip при архивировании (сжатые файлы не пересжимаются)
+ARCHIVE_COMPRESSION_LEVEL = 6  # Уровень сжатия gzip в архиве
+ARCHIVE_BUFFER_SIZE = 1024 * 1024  # Размер блока (байт) при копировании и сжатии в архив
+# Исключаемые папки при поиске выгрузок: служебные папки data/ с файлами .csv/.txt (на случай --uploads-dir data)
+EXCLUDE_DIRS = [RESULTS_DIR, ARCHIVE_DIR, INPUT_DIR, AD_CACHE_DIR, JOURNAL_DIR, os.path.dirname(HISTORY_DB),
+                os.path.dirname(UPLOAD_MANIFEST_DB)]
+SERVER_HOST = '127.0.0.1'  # Адрес сервиса поиска (--serve)
+SERVER_PORT = 8765  # Порт сервиса поиска
+SERVER_MAX_BATCH = 10000  # Максимум номеров в одном запросе
+SERVER_MAX_BODY_SIZE = 4 * 1024 * 1024  # Максимальный размер тела запроса, байт
+WATCH_POLL_INTERVAL = 2.0  # Интервал опроса папки выгрузок в режиме --watch, секунды
 
 # Логи
 LOG_FILE = os.path.join(LOGS_DIR, f"matcher_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log")
 LOG_FORMAT = '[%(asctime)s] %(message)s'
 LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 MAX_LOGS = 5   # Максимальное количество логов в папке logs
+LOG_ROW_SAMPLES = 5  # Примеров на категорию построчных событий в режиме --async-log
+LOG_ROW_FLUSH_INTERVAL = 10  # Период (секунды) записи счётчиков построчных событий
+LOG_ROW_FLUSH_CHECK_EVERY = 4096  # Проверять период записи раз в N событий категории (без вызова часов на строку)
 
 # Выходной файл
 OUTPUT_FILE_PREFIX = 'output'
 DATE_FORMAT = '%Y-%m-%d_%H-%M-%S'
 FILE_PERMISSIONS = 0o666  # Права на выходной CSV
+OUTPUT_FORMATS = ['csv', 'csv.gz', 'jsonl', 'jsonl.gz']  # Форматы результата (--output-format)
+OUTPUT_BUFFER_SIZE = 1024 * 1024  # Буфер записи результата, байт
+OUTPUT_COMPRESSION_LEVEL = 6  # Уровень сжатия gzip для результата
+SORT_BUFFER_ROWS = 1000000  # Строк в памяти при сортировке, сверх этого — сброс фрагментов на диск
+STREAM_FILE_BUFFER_ROWS = 1000000  # Номеров файла в памяти в режиме --stream, сверх этого — во временный файл
@@ -0,0 +1,78 @@
+import io
+from typing import BinaryIO, Iterator, Tuple
+
+from . import config
+from .utils import log_verbose
+
+
+def _read_chunk(binary_file: BinaryIO) -> bytes:
+    """Читает блок байтов, дочитывая его до конца строки.
+
+    Блок всегда заканчивается на b'\\n' (кроме последнего), поэтому
+    многобайтовые символы и строки не разрываются между блоками.
+    """
+    chunk = binary_file.read(config.DECODE_CHUNK_SIZE)
+    if chunk and not chunk.endswith(b'\n'):
+        chunk += binary_file.readline()
+    return chunk
+
+
+def decode_chunk(chunk: bytes, start: int, source: str, is_first: bool = False) -> Tuple[str, int]:
+    """Декодирует блок первой подходящей кодировкой из config.ENCODINGS.
+
+    Args:
+        chunk: Блок байтов.
+        start: Индекс первой проверяемой кодировки.
+        source: Имя источника для логов.
+        is_first: Блок в начале файла (только там снимается BOM).
+
+    Returns:
+        Кортеж: (текст, индекс выбранной кодировки).
+
+    Raises:
+        UnicodeDecodeError: Если блок не декодируется ни в одной кодировке.
+    """
+    error = None
+    for index in range(start, len(config.ENCODINGS)):
+        encoding = config.ENCODINGS[index]
+        codec = 'utf-8' if encoding == 'utf-8-sig' and not is_first else encoding
+        try:
+            return chunk.decode(codec), index
+        except UnicodeDecodeError as exc:
+            log_verbose(f"Ошибка кодировки {encoding} в {source}, пробую следующую")
+            error = exc
+    raise error
+
+
+def iter_decoded_lines(binary_file: BinaryIO, source: str) -> Iterator[str]:
+    """Декодирует бинарный поток в строки за один проход.
+
+    Кодировка подбирается по первому блоку файла. Если в одном из следующих
+    блоков встречается недопустимый байт, заново декодируется только этот
+    блок следующей подходящей кодировкой из config.ENCODINGS, и она
+    используется до конца файла. Уже выданные строки не перечитываются.
+    Строки разделяются так же, как в open(..., newline=''): по '\\n',
+    '\\r\\n' и '\\r', окончания строк сохраняются.
+
+    Args:
+        binary_file: Файл, открытый в бинарном режиме.
+        source: Имя источника для логов.
+
+    Yields:
+        Декодированные строки.
+
+    Raises:
+        UnicodeDecodeError: Если блок не декодируется ни в одной кодировке.
+    """
+    chunk = _read_chunk(binary_file)
+    if not chunk:
+        return
+
+    text, index = decode_chunk(chunk, 0, source, is_first=True)
+    log_verbose(f"Кодировка {source}: {config.ENCODINGS[index]}")
+    while True:
+        yield from io.StringIO(text, newline='')
+        chunk = _read_chunk(binary_file)
+        if not chunk:
+            return
+        text, index = decode_chunk(chunk, index, source)
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from . import config
+from .utils import ensure_dir, log_verbose
+
+Records = List[Tuple[str, str, str]]
+
+STATUS_NEW = 'new'
+STATUS_CHANGED = 'changed'
+STATUS_KNOWN = 'known'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS numbers (
+    phone TEXT PRIMARY KEY,
+    records TEXT NOT NULL,
+    ad_version TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+) WITHOUT ROWID
+'''
+
+
+def _dump_records(records: Records) -> str:
+    return json.dumps([list(record) for record in records], ensure_ascii=False, separators=(',', ':'))
+
+
+def _load_records(value: str) -> Records:
+    return [tuple(record) for record in json.loads(value)]
+
+
+def _lookup(phone: str, ad_data: Mapping[str, Records]) -> Records:
+    records = ad_data.get(phone)
+    return list(records) if records is not None else []
+
+
+class SeenNumberStore:
+    """Хранилище номеров, уже сопоставленных с AD в прошлых запусках (SQLite).
+
+    Для каждого номера хранятся записи AD (пустой список — не найден),
+    версия AD (хеш AD-файла), на которой они получены, и даты первого и
+    последнего появления. Изменения фиксируются только вызовом commit(),
+    поэтому при ошибке записи результата номера не считаются обработанными.
+    """
+    def __init__(self, db_path: str, run_timestamp: Optional[str] = None):
+        ensure_dir(os.path.dirname(db_path))
+        self.db_path = db_path
+        self.run_timestamp = run_timestamp or datetime.now().strftime(config.DATE_FORMAT)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self) -> 'SeenNumberStore':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM numbers').fetchone()[0]
+
+    def _fetch(self, phones: List[str]) -> dict:
+        placeholders = ','.join('?' * len(phones))
+        cursor = self._conn.execute(
+            f'SELECT phone, records, ad_version FROM numbers WHERE phone IN ({placeholders})', phones)
+        return {phone: (records, ad_version) for phone, records, ad_version in cursor}
+
+    def resolve(
+        self, phones: Iterable[str], ad_data: Mapping[str, Records], ad_version: str
+    ) -> Iterator[Tuple[str, Records, str]]:
+        """Сопоставляет номера с AD, пропуская уже известные.
+
+        Номер ищется в AD, только если его нет в хранилище или он был
+        сопоставлен с другой версией AD. Известные номера записи AD из
+        хранилища не получают: их результат не менялся.
+
+        Args:
+            phones: Уникальные нормализованные номера.
+            ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+            ad_version: Версия AD (хеш AD-файла).
+
+        Yields:
+            Кортежи (номер, записи AD, статус): STATUS_NEW — номер впервые,
+            STATUS_CHANGED — записи AD изменились, STATUS_KNOWN — без
+            изменений (записи — пустой список).
+        """
+        phones = iter(phones)
+        batch = list(islice(phones, config.HISTORY_BATCH_SIZE))
+        while batch:
+            stored = self._fetch(batch)
+            inserts, updates, touched = [], [], []
+            for phone in batch:
+                known = stored.get(phone)
+                if known is not None and known[1] == ad_version:
+                    touched.append((self.run_timestamp, phone))
+                    yield phone, [], STATUS_KNOWN
+                    continue
+                records = _lookup(phone, ad_data)
+                dumped = _dump_records(records)
+                if known is None:
+                    inserts.append((phone, dumped, ad_version, self.run_timestamp, self.run_timestamp))
+                    yield phone, records, STATUS_NEW
+                elif known[0] != dumped:
+                    updates.append((dumped, ad_version, self.run_timestamp, phone))
+                    yield phone, records, STATUS_CHANGED
+                else:
+                    updates.append((dumped, ad_version, self.run_timestamp, phone))
+                    yield phone, [], STATUS_KNOWN
+            self._conn.executemany('INSERT OR REPLACE INTO numbers VALUES (?, ?, ?, ?, ?)', inserts)
+            self._conn.executemany(
+                'UPDATE numbers SET records = ?, ad_version = ?, last_seen = ? WHERE phone = ?', updates)
+            self._conn.executemany('UPDATE numbers SET last_seen = ? WHERE phone = ?', touched)
+            batch = list(islice(phones, config.HISTORY_BATCH_SIZE))
+
+    def iter_all(self, ad_data: Mapping[str, Records], ad_version: str) -> Iterator[Tuple[str, Records]]:
+        """Выдаёт все номера хранилища с записями AD в порядке номеров.
+
+        Номера, сопоставленные с другой версией AD, сопоставляются заново,
+        и хранилище обновляется.
+
+        Args:
+            ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+            ad_version: Версия AD (хеш AD-файла).
+
+        Yields:
+            Кортежи (номер, записи AD).
+        """
+        stale = []
+        cursor = self._conn.execute('SELECT phone, records, ad_version FROM numbers ORDER BY phone')
+        for phone, records, version in cursor:
+            if version == ad_version:
+                yield phone, _load_records(records)
+                continue
+            current = _lookup(phone, ad_data)
+            stale.append((_dump_records(current), ad_version, phone))
+            yield phone, current
+        if stale:
+            log_verbose(f"Пересопоставлено номеров из истории после изменения AD: {len(stale)}")
+            self._conn.executemany('UPDATE numbers SET records = ?, ad_version = ? WHERE phone = ?', stale)
+
+    def commit(self) -> None:
+        """Фиксирует изменения хранилища."""
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Закрывает хранилище; незафиксированные изменения отменяются."""
+        self._conn.close()
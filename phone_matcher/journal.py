@@ -0,0 +1,204 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Set
+
+from . import config
+from .parse_phone import PhoneFileResult
+from .utils import ensure_dir, log_info, log_verbose
+
+
+def _file_signature(file_path: str) -> Optional[List[int]]:
+    """Возвращает [размер, время изменения в нс] файла или None, если файла нет."""
+    try:
+        info = os.stat(file_path)
+    except OSError:
+        return None
+    return [info.st_size, info.st_mtime_ns]
+
+
+class RunJournal:
+    """Журнал прогона (write-ahead log) для продолжения прерванной обработки.
+
+    Записи JSON Lines дописываются в файл config.JOURNAL_DIR/<режим>_<метка>.jsonl
+    с fsync до того, как действие считается выполненным: список файлов
+    выгрузки, разбор каждого файла (номера сохраняются рядом, в папке
+    с именем журнала), запись результата и архивирование каждого файла.
+    Прерванный прогон продолжается с --resume: разобранные и не изменившиеся
+    файлы не разбираются заново, а если результат уже записан, только
+    архивируются оставшиеся файлы. Завершённый журнал удаляется.
+
+    Журнал без пути (path=None) хранит состояние только в памяти.
+    """
+    def __init__(self, path: Optional[str], mode: str, timestamp: str):
+        self.path = path
+        self.spill_dir = os.path.splitext(path)[0] if path else None
+        self.mode = mode
+        self.timestamp = timestamp
+        self.files: Optional[List[str]] = None
+        self.parsed: Dict[str, dict] = {}
+        self.archived: Set[str] = set()
+        self.output_committed = False
+        self.output_file: Optional[str] = None
+        self._written = False
+
+    @classmethod
+    def start(cls, mode: str, timestamp: str, journal_dir: Optional[str] = None) -> 'RunJournal':
+        """Начинает новый журнал; незавершённые журналы режима удаляются.
+
+        Файл журнала создаётся при первой записи.
+
+        Args:
+            mode: Режим прогона (batch, dedupe, history, stream).
+            timestamp: Метка времени прогона (имя файла результата).
+            journal_dir: Папка журналов, по умолчанию config.JOURNAL_DIR.
+        """
+        journal_dir = journal_dir or config.JOURNAL_DIR
+        for stale in cls._find(mode, journal_dir):
+            log_info(f"Незавершённый прогон отброшен (для продолжения запустите с --resume): {stale}")
+            cls(stale, mode, '').discard()
+        return cls(os.path.join(journal_dir, f"{mode}_{timestamp}.jsonl"), mode, timestamp)
+
+    @classmethod
+    def resume(cls, mode: str, journal_dir: Optional[str] = None) -> Optional['RunJournal']:
+        """Загружает последний незавершённый журнал режима.
+
+        Returns:
+            Журнал или None, если незавершённых прогонов нет.
+        """
+        paths = cls._find(mode, journal_dir or config.JOURNAL_DIR)
+        if not paths:
+            return None
+        journal = cls(paths[-1], mode, '')
+        journal._replay()
+        return journal
+
+    @staticmethod
+    def _find(mode: str, journal_dir: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(journal_dir, f"{mode}_*.jsonl")))
+
+    def _replay(self) -> None:
+        valid_size = 0
+        with open(self.path, 'rb+') as file_:
+            for line in file_:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is None or not line.endswith(b'\n'):
+                    # Недописанная последняя запись при аварийном завершении:
+                    # отрезается, чтобы следующие записи начинались с новой строки
+                    log_verbose(f"Отброшена недописанная запись журнала {self.path}")
+                    file_.truncate(valid_size)
+                    break
+                valid_size += len(line)
+                event = record['event']
+                if event == 'start':
+                    self.timestamp = record['timestamp']
+                elif event == 'files':
+                    self.files = record['files']
+                elif event == 'parsed':
+                    self.parsed[record['file']] = record
+                elif event == 'output':
+                    self.output_committed = True
+                    self.output_file = record['output']
+                elif event == 'archived':
+                    self.archived.add(record['file'])
+        self._written = True
+
+    def _append(self, record: dict) -> None:
+        if self.path is None:
+            return
+        if not self._written:
+            ensure_dir(os.path.dirname(self.path))
+            self._written = True
+            self._append({'event': 'start', 'mode': self.mode, 'timestamp': self.timestamp})
+        with open(self.path, 'a', encoding='utf-8') as file_:
+            file_.write(json.dumps(record, ensure_ascii=False) + '\n')
+            file_.flush()
+            os.fsync(file_.fileno())
+
+    def record_files(self, files: List[str]) -> None:
+        """Записывает список файлов выгрузки прогона."""
+        self.files = list(files)
+        self._append({'event': 'files', 'files': self.files})
+
+    def record_parsed(self, phone_file: str, file_phones: Optional[PhoneFileResult] = None) -> None:
+        """Записывает успешный разбор файла выгрузки.
+
+        Args:
+            phone_file: Путь к файлу выгрузки.
+            file_phones: Номера файла — список (номер, файл) или словарь
+                {номер: количество}; сохраняются на диск, чтобы при
+                продолжении прогона файл не разбирался заново. None — не сохранять.
+        """
+        record = {'event': 'parsed', 'file': phone_file, 'signature': _file_signature(phone_file)}
+        if file_phones is not None and self.spill_dir is not None:
+            spill_name = hashlib.sha1(phone_file.encode('utf-8')).hexdigest()
+            record['spill'] = os.path.join(self.spill_dir, f"{spill_name}.txt")
+            record['counts'] = isinstance(file_phones, dict)
+            self._write_spill(record['spill'], file_phones)
+        self.parsed[phone_file] = record
+        self._append(record)
+
+    @staticmethod
+    def _write_spill(spill_path: str, file_phones: PhoneFileResult) -> None:
+        ensure_dir(os.path.dirname(spill_path))
+        temp_path = f"{spill_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8', buffering=config.OUTPUT_BUFFER_SIZE) as file_:
+            if isinstance(file_phones, dict):
+                file_.writelines(f"{phone}\t{count}\n" for phone, count in file_phones.items())
+            else:
+                file_.writelines(f"{phone}\n" for phone, _ in file_phones)
+            file_.flush()
+            os.fsync(file_.fileno())
+        os.replace(temp_path, spill_path)
+
+    def load_parsed(self, phone_file: str) -> Optional[PhoneFileResult]:
+        """Возвращает сохранённые номера файла, если он разобран и с тех пор не менялся.
+
+        Returns:
+            Номера в том же виде, в каком были записаны, или None.
+        """
+        record = self.parsed.get(phone_file)
+        if record is None or 'spill' not in record or record['signature'] != _file_signature(phone_file):
+            return None
+        try:
+            with open(record['spill'], 'r', encoding='utf-8') as file_:
+                lines = file_.read().splitlines()
+        except OSError:
+            return None
+        if record['counts']:
+            counts = {}
+            for line in lines:
+                phone, count = line.split('\t')
+                counts[phone] = int(count)
+            return counts
+        return [(phone, phone_file) for phone in lines]
+
+    @property
+    def parsed_files(self) -> List[str]:
+        """Успешно разобранные файлы в порядке разбора."""
+        return list(self.parsed)
+
+    def commit_output(self, output_file: Optional[str]) -> None:
+        """Записывает, что результат прогона сохранён (None — результат пуст)."""
+        self.output_committed = True
+        self.output_file = output_file
+        self._append({'event': 'output', 'output': output_file})
+
+    def record_archived(self, phone_file: str) -> None:
+        """Записывает перемещение файла выгрузки в архив."""
+        self.archived.add(phone_file)
+        self._append({'event': 'archived', 'file': phone_file})
+
+    def discard(self) -> None:
+        """Удаляет журнал и сохранённые номера."""
+        if self.path is None:
+            return
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        if os.path.isdir(self.spill_dir):
+            shutil.rmtree(self.spill_dir)
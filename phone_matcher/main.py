@@ -1,14 +1,49 @@
 import argparse
 import os
+import tempfile
 import time
 import sys
 from datetime import datetime
+from itertools import chain, repeat
+from typing import Iterator, List, Optional, Tuple, Union
 from . import config
-from .utils import setup_anomaly_logger, setup_logger, log_info, log_error, find_phone_files, move_file_to_archive
-from .parse_ad import parse_ad_file
-from .parse_phone import parse_phone_file
-from .match import match_phones
+from .utils import (setup_anomaly_logger, setup_logger, stop_logger, flush_row_events, log_info, log_error,
+                    log_verbose, ensure_dir, find_ad_files, find_phone_files)
+from .archive import archive_file
+from .ad_index import AdIndex
+from .parse_ad import ad_domain, parse_ad_file, parse_ad_files
+from .ad_cache import hash_files, load_ad_index
+from .history import SeenNumberStore, STATUS_CHANGED, STATUS_NEW
+from .journal import RunJournal
+from .upload_manifest import UploadManifest
+from .parse_phone import iter_phone_file, merge_phone_counts, parse_phone_files
+from .match import (RULE_RANGE, RULE_SUFFIX, RuleMatcher, iter_counted_matches, iter_matches, iter_rule_matches,
+                    log_multiple_records, match_phones)
+from .range_index import parse_ranges_file
+from .suffix_index import SuffixIndex
 from .output import write_output_file
+from .metrics import stage, timed_items, start_run_metrics, write_batch_metrics, write_run_metrics
+from .watch import UploadWatcher
+from .server import serve
+
+def positive_int(value: str) -> int:
+    """Проверяет, что аргумент командной строки — положительное целое число.
+
+    Raises:
+        argparse.ArgumentTypeError: Если значение некорректно.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"ожидается положительное целое число, получено: {value}")
+    return number
+
+def run_mode(args: argparse.Namespace) -> str:
+    """Возвращает режим работы по параметрам: serve, watch, history, dedupe, stream или batch."""
+    return "serve" if args.serve else "watch" if args.watch else "history" if args.history \
+        else "dedupe" if args.dedupe else "stream" if args.stream else "batch"
 
 def parse_arguments():
     """Парсит аргументы командной строки.
@@ -17,44 +52,160 @@ def parse_arguments():
         Объект аргументов.
     """
     parser = argparse.ArgumentParser(description="Сопоставление номеров телефонов с данными AD")
-    parser.add_argument("ad_file", help="Путь к файлу AD")
+    parser.add_argument("ad_file", nargs="+",
+                        help="Путь к файлу AD; несколько файлов или папок с *.csv объединяются в один индекс")
     parser.add_argument("-v", "--verbose", action="store_true", help="Подробный вывод")
     parser.add_argument("--uploads-dir", default=config.UPLOADS_DIR, help="Папка с файлами выгрузок")
-    return parser.parse_args()
+    parser.add_argument("--stream", action="store_true",
+                        help="Потоковый режим: номера сопоставляются и пишутся в результат построчно")
+    parser.add_argument("--workers", type=positive_int, default=1,
+                        help="Количество процессов для разбора файлов выгрузки и AD-файлов")
+    parser.add_argument("--watch", action="store_true",
+                        help="Режим наблюдения: индекс AD держится в памяти, новые выгрузки обрабатываются по мере появления")
+    parser.add_argument("--poll-interval", type=float, default=config.WATCH_POLL_INTERVAL,
+                        help="Интервал опроса папки выгрузок в режиме наблюдения, секунды")
+    parser.add_argument("--serve", action="store_true",
+                        help="Сервис поиска: индекс AD держится в памяти, номера ищутся по HTTP (GET/POST /lookup)")
+    parser.add_argument("--host", default=config.SERVER_HOST, help="Адрес сервиса поиска")
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT, help="Порт сервиса поиска")
+    parser.add_argument("--async-log", action="store_true",
+                        help="Фоновая запись логов, построчные события агрегируются в счётчики и примеры")
+    parser.add_argument("--ad-cache", action="store_true",
+                        help="Использовать кэш индекса AD (пересобирается при изменении AD-файла)")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Схлопывать повторы номеров: одна строка на номер со столбцами количества и файлов")
+    parser.add_argument("--history", action="store_true",
+                        help="Сопоставлять только номера, которых нет в истории прошлых запусков или у которых изменились данные AD")
+    parser.add_argument("--history-output", choices=["delta", "full"], default="delta",
+                        help="С --history: delta — только новые и изменившиеся номера, full — все номера истории")
+    parser.add_argument("--suffix-match", action="store_true",
+                        help="Искать номера, не найденные целиком, по самому длинному номеру AD, которым они заканчиваются")
+    parser.add_argument("--output-format", choices=config.OUTPUT_FORMATS, default="csv",
+                        help="Формат результата: CSV или JSON Lines, с суффиксом .gz — со сжатием gzip")
+    parser.add_argument("--ranges", metavar="FILE",
+                        help="Файл диапазонов номеров (блоков DID): номера, не найденные в AD, относятся к диапазону")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванный прогон по журналу: разобранные файлы не читаются заново")
+    parser.add_argument("--manifest", choices=["reuse", "skip"],
+                        help="Манифест обработанных выгрузок: файлы с уже обработанным содержимым не разбираются — "
+                             "reuse берёт их номера из манифеста, skip пропускает файл")
+    args = parser.parse_args()
+    if args.history and (args.suffix_match or args.ranges):
+        parser.error("--suffix-match и --ranges не поддерживаются вместе с --history")
+    if args.stream and (args.dedupe or args.history):
+        parser.error("--stream не поддерживается вместе с --dedupe и --history: "
+                     "эти режимы собирают все номера выгрузок перед сопоставлением")
+    mode = run_mode(args)
+    if args.resume and mode in ("watch", "serve"):
+        parser.error("--resume не поддерживается вместе с --watch и --serve")
+    if args.manifest and mode in ("stream", "serve"):
+        parser.error("--manifest не поддерживается в режимах --stream и --serve")
+    return args
 
-def process_ad_file(ad_file: str) -> dict:
-    """Обрабатывает AD-файл.
+def process_ad_file(ad_file: Union[str, List[str]], use_cache: bool = False, workers: int = 1) -> AdIndex:
+    """Обрабатывает AD-файл или несколько выгрузок AD (доменов).
+
+    Несколько файлов разбираются параллельно (при workers > 1) и
+    объединяются в один индекс в порядке файлов; домен каждой записи
+    сохраняется в индексе (AdIndex.record_domains). Домен — имя файла без
+    расширения, поэтому файлы с одинаковыми именами из разных папок не
+    принимаются.
 
     Args:
-        ad_file: Путь к файлу AD.
+        ad_file: Путь к файлу AD или список путей к файлам и папкам с AD-файлами.
+        use_cache: Загружать индекс каждого AD-файла из кэша config.AD_CACHE_DIR.
+        workers: Количество процессов для разбора AD-файлов.
 
     Returns:
-        Словарь данных AD.
+        Индекс данных AD (AdIndex).
 
     Raises:
         IOError, OSError: Если файл не удаётся прочитать.
+        ValueError: Если формат AD некорректен.
     """
-    ad_file_path = os.path.abspath(ad_file)
-    if not os.path.exists(ad_file_path):
-        log_error(f"Ошибка: входной файл {ad_file} не найден")
+    ad_paths = [ad_file] if isinstance(ad_file, str) else ad_file
+    ad_files = find_ad_files(ad_paths)
+    missing = [path for path in ad_files if not os.path.exists(os.path.abspath(path))]
+    if missing or not ad_files:
+        if missing:
+            log_error(f"Ошибка: входной файл {missing[0]} не найден")
+        else:
+            log_error(f"Ошибка: AD-файлы (*.csv) не найдены в {', '.join(ad_paths)}")
+        log_info("=== Работа завершена с ошибкой ===")
+        sys.exit(1)
+    domains = {}
+    for path in ad_files:
+        domains.setdefault(ad_domain(path), []).append(path)
+    duplicates = [paths for paths in domains.values() if len(paths) > 1]
+    if duplicates:
+        log_error(f"Ошибка: AD-файлы с одинаковым именем домена {ad_domain(duplicates[0][0])}: "
+                  f"{', '.join(duplicates[0])}; переименуйте файлы")
         log_info("=== Работа завершена с ошибкой ===")
         sys.exit(1)
 
-    log_info(f"Обработка AD файла: {ad_file}")
-    ad_data, anomaly_count = parse_ad_file(ad_file)
+    for path in ad_files:
+        log_info(f"Обработка AD файла: {path}")
+    loader = load_ad_index if use_cache else parse_ad_file
+    ad_data = None
+    anomaly_count = shared_count = 0
+    with stage("ad_load", file=os.path.abspath(ad_files[0]), files=len(ad_files), cached=use_cache) as record:
+        for path, file_data, file_anomalies, exc in parse_ad_files(ad_files, workers, loader):
+            flush_row_events()
+            if exc is not None:
+                raise exc
+            anomaly_count += file_anomalies
+            if len(ad_files) > 1:
+                log_info(f"Уникальных номеров в {path}: {len(file_data)}")
+            if ad_data is None:
+                ad_data = file_data
+            else:
+                shared_count += ad_data.merge(file_data)
+    record["rows"] = len(ad_data)
     log_info(f"Найдено уникальных номеров в AD: {len(ad_data)}")
+    if shared_count > 0:
+        log_info(f"Номеров, встречающихся в нескольких AD-файлах: {shared_count}")
     if anomaly_count > 0:
         log_info(f"Обнаружено аномалий в номерах AD: {anomaly_count}")
     return ad_data
 
-def process_phone_files(uploads_dir: str) -> list:
-    """Обрабатывает файлы выгрузки.
+def build_rule_matcher(ad_data, suffix_match: bool = False,
+                       ranges_file: Optional[str] = None) -> Optional[RuleMatcher]:
+    """Строит правила сопоставления для --suffix-match и --ranges.
+
+    Args:
+        ad_data: Данные AD.
+        suffix_match: Построить индекс окончаний номеров AD.
+        ranges_file: Путь к файлу диапазонов номеров.
+
+    Returns:
+        Правила сопоставления или None, если дополнительных правил нет.
+
+    Raises:
+        IOError, OSError, ValueError: Если файл диапазонов не удаётся прочитать.
+    """
+    if not suffix_match and not ranges_file:
+        return None
+    suffix_index = range_index = None
+    if suffix_match:
+        with stage("suffix_index") as record:
+            suffix_index = SuffixIndex(ad_data)
+        record["rows"] = len(suffix_index)
+        log_info(f"Построен индекс окончаний номеров AD: {len(suffix_index)} номеров")
+    if ranges_file:
+        with stage("range_index", file=ranges_file) as record:
+            range_index = parse_ranges_file(ranges_file)
+        record["rows"] = len(range_index)
+        log_info(f"Загружено диапазонов номеров: {len(range_index)} из {ranges_file}")
+    return RuleMatcher(ad_data, suffix_index, range_index)
+
+def find_upload_files(uploads_dir: str) -> list:
+    """Находит файлы выгрузки и завершает работу, если их нет.
 
     Args:
         uploads_dir: Папка с файлами выгрузки.
 
     Returns:
-        Список номеров телефонов.
+        Список путей к файлам выгрузки.
     """
     phone_files = find_phone_files(config.EXCLUDE_DIRS, uploads_dir)
     log_info(f"Найдено файлов с номерами: {len(phone_files)}")
@@ -62,44 +213,285 @@ def process_phone_files(uploads_dir: str) -> list:
         log_error(f"Файлы выгрузки не найдены в {uploads_dir}. Завершение работы.")
         log_info("=== Работа завершена ===")
         sys.exit(1)
+    return phone_files
 
-    phones = []
-    total_phone_lines = 0
-    for phone_file in phone_files:
+def journal_upload_files(uploads_dir: str, journal: Optional[RunJournal] = None) -> list:
+    """Находит файлы выгрузки или берёт их из журнала продолжаемого прогона.
+
+    Args:
+        uploads_dir: Папка с файлами выгрузки.
+        journal: Журнал прогона; найденные файлы записываются в него.
+
+    Returns:
+        Список путей к файлам выгрузки.
+    """
+    if journal is not None and journal.files is not None:
+        log_info(f"Файлов выгрузки в прерванном прогоне: {len(journal.files)}")
+        return journal.files
+    phone_files = find_upload_files(uploads_dir)
+    if journal is not None:
+        journal.record_files(phone_files)
+    return phone_files
+
+def process_phone_files(uploads_dir: str, workers: int = 1, dedupe: bool = False,
+                        journal: Optional[RunJournal] = None, manifest: Optional[UploadManifest] = None):
+    """Обрабатывает файлы выгрузки.
+
+    Args:
+        uploads_dir: Папка с файлами выгрузки.
+        workers: Количество процессов для разбора файлов.
+        dedupe: Вернуть уникальные номера со счётчиками вместо списка.
+        journal: Журнал прогона (см. parse_upload_files).
+        manifest: Манифест обработанных выгрузок (см. parse_upload_files).
+
+    Returns:
+        Список номеров телефонов или словарь {номер: [количество, [файлы]]}.
+    """
+    phone_files = journal_upload_files(uploads_dir, journal)
+    return parse_upload_files(phone_files, workers, dedupe, journal, manifest)
+
+def count_file_phones(file_phones) -> int:
+    """Возвращает количество номеров в результате разбора файла (списке или счётчиках)."""
+    if file_phones is None:
+        return 0
+    return sum(file_phones.values()) if isinstance(file_phones, dict) else len(file_phones)
+
+def describe_upload(result: tuple) -> dict:
+    """Возвращает поля записи метрик для результата разбора файла выгрузки."""
+    phone_file, file_phones, exc = result
+    record = {"file": phone_file, "rows": count_file_phones(file_phones)}
+    if exc is not None:
+        record["error"] = str(exc)
+    return record
+
+def archive_upload(phone_file: str) -> Optional[str]:
+    """Архивирует обработанный файл выгрузки с замером этапа."""
+    with stage("archive", file=phone_file):
+        return archive_file(phone_file, config.ARCHIVE_DIR)
+
+def commit_manifest(journal: RunJournal, manifest: Optional[UploadManifest]) -> None:
+    """Фиксирует разобранные файлы в манифесте, если результат прогона записан, иначе отменяет их."""
+    if manifest is None:
+        return
+    if journal.output_committed:
+        manifest.commit()
+    else:
+        manifest.rollback()
+
+def archive_uploads(journal: RunJournal) -> None:
+    """Архивирует разобранные файлы выгрузки, если результат записан, и удаляет журнал.
+
+    Пока результат не записан или не все файлы перемещены в архив, файлы
+    остаются в папке выгрузок, а журнал — для продолжения прогона с --resume.
+    """
+    if not journal.output_committed:
+        log_error("Результат не записан, файлы выгрузки оставлены в папке выгрузок")
+        return
+    failed = []
+    for phone_file in journal.parsed_files:
+        if phone_file in journal.archived:
+            continue
+        if archive_upload(phone_file) is None:
+            failed.append(phone_file)
+        else:
+            journal.record_archived(phone_file)
+    if failed:
+        retry = " Повторите архивирование запуском с --resume." if journal.path else ""
+        log_error(f"Файлы выгрузки не перемещены в архив и попадут в следующий результат: "
+                  f"{', '.join(failed)}.{retry}")
+        return
+    journal.discard()
+
+def duplicate_upload_result(phone_file: str, entry: dict, source_result: Optional[tuple], dedupe: bool,
+                            manifest: UploadManifest) -> tuple:
+    """Возвращает результат разбора файла, содержимое которого уже обработано, не разбирая файл.
+
+    Args:
+        phone_file: Путь к файлу выгрузки.
+        entry: Запись из UploadManifest.find_duplicates.
+        source_result: Результат разбора файла entry["source"] в этом же
+            прогоне (если entry["processed"] — None).
+        dedupe: Вернуть номера со счётчиками вместо списка.
+        manifest: Манифест обработанных выгрузок.
+
+    Returns:
+        Кортеж (файл, номера, исключение); при manifest.skip номеров нет.
+    """
+    source = entry["source"]
+    origin = f"обработанным {entry['processed']}" if entry["processed"] else "в этом же прогоне"
+    if entry["processed"] is None and (source_result is None or source_result[2] is not None):
+        return phone_file, None, ValueError(f"содержимое совпадает с {source}, который не удалось разобрать")
+    if manifest.skip:
+        log_info(f"Файл {phone_file} пропущен: содержимое совпадает с файлом {source}, {origin}")
+        return phone_file, ({} if dedupe else []), None
+    if entry["processed"] is None:
+        file_phones = source_result[1]
+        if not dedupe:
+            file_phones = [(phone, phone_file) for phone, _ in file_phones]
+    else:
         try:
-            file_phones = parse_phone_file(phone_file)
-            phones.extend(file_phones)
-            total_phone_lines += len(file_phones)
-            log_info(f"Извлечено {len(file_phones)} номеров из {phone_file}")
-            move_file_to_archive(phone_file, config.ARCHIVE_DIR)
-        except (IOError, OSError, ValueError) as exc:
+            file_phones = manifest.load_numbers(entry)
+        except (OSError, ValueError) as exc:
+            return phone_file, None, exc
+        if not dedupe:
+            occurrences = chain.from_iterable(repeat(phone, count) for phone, count in file_phones.items())
+            file_phones = list(zip(occurrences, repeat(phone_file)))
+    log_info(f"Номера {phone_file} взяты из манифеста: содержимое совпадает с файлом {source}, {origin}")
+    return phone_file, file_phones, None
+
+def iter_journaled_results(phone_files: list, workers: int, dedupe: bool, journal: Optional[RunJournal],
+                           manifest: Optional[UploadManifest] = None):
+    """Выдаёт результаты разбора файлов выгрузки, не разбирая заново уже известное содержимое.
+
+    Номера файла берутся из журнала, если файл разобран в прерванном
+    прогоне, а с манифестом — у файла с тем же содержимым, обработанного
+    раньше или в этом же прогоне (см. duplicate_upload_result).
+
+    Yields:
+        Кортежи (файл, номера, исключение) в порядке phone_files.
+    """
+    saved = {}
+    if journal is not None:
+        for phone_file in phone_files:
+            file_phones = journal.load_parsed(phone_file)
+            if file_phones is not None and isinstance(file_phones, dict) == dedupe:
+                saved[phone_file] = file_phones
+    duplicates = {}
+    if manifest is not None:
+        duplicates = manifest.find_duplicates([phone_file for phone_file in phone_files if phone_file not in saved])
+    sources = {entry["source"] for entry in duplicates.values() if entry["processed"] is None}
+    source_results = {}
+    pending = [phone_file for phone_file in phone_files if phone_file not in saved and phone_file not in duplicates]
+    results = timed_items(parse_phone_files(pending, workers, dedupe), "upload_file", describe_upload)
+    for phone_file in phone_files:
+        if phone_file in duplicates:
+            entry = duplicates[phone_file]
+            result = duplicate_upload_result(phone_file, entry, source_results.get(entry["source"]), dedupe, manifest)
+        elif phone_file in saved:
+            log_verbose(f"Номера {phone_file} взяты из журнала прогона")
+            result = phone_file, saved[phone_file], None
+        else:
+            result = next(results, None)
+            if result is None:
+                # Пул вернул меньше результатов, чем файлов: файл не разобран и не архивируется
+                result = phone_file, None, RuntimeError("нет результата разбора")
+        if result[2] is None:
+            if journal is not None and phone_file not in saved:
+                journal.record_parsed(phone_file, result[1])
+            if manifest is not None and phone_file not in duplicates:
+                manifest.record(phone_file, result[1])
+        if phone_file in sources:
+            source_results[phone_file] = result
+        yield result
+    if duplicates:
+        action = "пропущено" if manifest.skip else "номера взяты из манифеста"
+        log_info(f"Файлов с уже обработанным содержимым: {len(duplicates)} ({action})")
+
+def parse_upload_files(phone_files: list, workers: int = 1, dedupe: bool = False,
+                       journal: Optional[RunJournal] = None, manifest: Optional[UploadManifest] = None):
+    """Разбирает файлы выгрузки.
+
+    Файлы не архивируются: это делает archive_uploads после записи
+    результата. Успешно разобранные файлы и их номера записываются в журнал.
+
+    Args:
+        phone_files: Список путей к файлам выгрузки.
+        workers: Количество процессов для разбора файлов.
+        dedupe: Собирать уникальные номера со счётчиками вхождений и
+            файлами вместо списка всех вхождений.
+        journal: Журнал прогона; файлы, уже разобранные в прерванном
+            прогоне и не изменившиеся, не разбираются заново.
+        manifest: Манифест обработанных выгрузок; файлы с уже обработанным
+            содержимым не разбираются, разобранные файлы добавляются в
+            манифест (фиксируется после записи результата, см. commit_manifest).
+
+    Returns:
+        Список номеров телефонов или словарь {номер: [количество, [файлы]]}.
+    """
+    phones = {} if dedupe else []
+    total_phone_lines = 0
+    for phone_file, file_phones, exc in iter_journaled_results(phone_files, workers, dedupe, journal, manifest):
+        flush_row_events()
+        if exc is not None:
             log_error(f"Ошибка обработки {phone_file}: {exc}")
             continue
+        if dedupe:
+            merge_phone_counts(phones, file_phones, phone_file)
+        else:
+            phones.extend(file_phones)
+        file_count = count_file_phones(file_phones)
+        total_phone_lines += file_count
+        log_info(f"Извлечено {file_count} номеров из {phone_file}")
 
     log_info(f"Общее количество номеров в файлах выгрузки: {total_phone_lines}")
+    if dedupe:
+        log_info(f"Уникальных номеров в файлах выгрузки: {len(phones)}")
     return phones
 
-def write_results(phones: list, ad_data: dict, timestamp: str):
+def log_rule_matches(rules: dict) -> None:
+    """Логирует количество строк, найденных по окончанию номера и по диапазону.
+
+    Args:
+        rules: Счётчики строк по правилам.
+    """
+    log_info(f"Из них найдено по окончанию номера: {rules.get(RULE_SUFFIX, 0)}, "
+             f"по диапазону: {rules.get(RULE_RANGE, 0)}")
+
+def count_rules(matches: list) -> dict:
+    """Считает строки результата по правилу сопоставления (предпоследний столбец)."""
+    rules = {}
+    for match in matches:
+        rules[match[-2]] = rules.get(match[-2], 0) + 1
+    return rules
+
+def result_file(timestamp: str, output_format: str = "csv") -> str:
+    """Возвращает путь к файлу результата для метки времени и формата."""
+    return os.path.join(config.RESULTS_DIR, f"{timestamp}_{config.OUTPUT_FILE_PREFIX}.{output_format}")
+
+def commit_output(journal: Optional[RunJournal], output_file: Optional[str]) -> None:
+    """Отмечает в журнале прогона, что результат записан (None — номеров нет, результат пуст)."""
+    if journal is not None:
+        journal.commit_output(output_file)
+
+def write_results(phones: list, ad_data: dict, timestamp: str, matcher: Optional[RuleMatcher] = None,
+                  output_format: str = "csv", journal: Optional[RunJournal] = None):
     """Сопоставляет номера, записывает результаты и логирует статистику.
 
     Args:
         phones: Список номеров.
         ad_data: Данные AD.
         timestamp: Метка времени для имени файла.
+        matcher: Правила сопоставления (--suffix-match, --ranges); если
+            заданы, в результат добавляются столбцы правила и номера AD.
+        output_format: Формат результата из config.OUTPUT_FORMATS.
+        journal: Журнал прогона; после записи результата в нём отмечается commit_output.
     """
     if not phones:
         log_error("Не найдено номеров в выгрузках")
+        commit_output(journal, None)
         return
 
-    matches = match_phones(phones, ad_data)
+    with stage("match") as record:
+        if matcher is None:
+            matches = match_phones(phones, ad_data)
+        else:
+            log_multiple_records(ad_data)
+            matches = list(iter_rule_matches(phones, matcher))
+    record["rows"] = len(matches)
+    flush_row_events()
     matched_count = sum(1 for m in matches if m[1] or m[2] or m[3])
     unmatched_count = len(matches) - matched_count
     log_info(f"Найдено совпадений с номерами AD: {matched_count}")
+    if matcher is not None:
+        log_rule_matches(count_rules(matches))
     log_info(f"Номеров без совпадений в AD: {unmatched_count}")
 
-    output_file = os.path.join(config.RESULTS_DIR, f"{timestamp}_{config.OUTPUT_FILE_PREFIX}.csv")
+    output_file = result_file(timestamp, output_format)
     try:
-        count = write_output_file(matches, output_file)
+        if matcher is None:
+            count = write_output_file(matches, output_file)
+        else:
+            count = write_output_file(matches, output_file, header=config.OUTPUT_FIELDS + config.MATCH_RULE_FIELDS)
         unique_phones = len(set(phone for phone, _ in phones))
         extra_rows = count - unique_phones
         log_msg = f"Количество строк в итоговом файле: {count}"
@@ -109,28 +501,437 @@ def write_results(phones: list, ad_data: dict, timestamp: str):
         log_info(f"Результат сохранён в {output_file}")
     except (IOError, PermissionError) as exc:
         log_error(f"Ошибка записи результата: {exc}")
+        return
+    commit_output(journal, output_file)
+
+def write_counted_results(occurrences: dict, ad_data: dict, timestamp: str,
+                          matcher: Optional[RuleMatcher] = None, output_format: str = "csv",
+                          journal: Optional[RunJournal] = None, uploads_dir: Optional[str] = None):
+    """Сопоставляет уникальные номера и записывает результат со счётчиками.
+
+    Каждый номер ищется в AD один раз; в результате одна строка на номер
+    (на запись AD при дубликатах) со столбцами количества вхождений и файлов.
+
+    Args:
+        occurrences: Словарь {номер: [количество, [файлы]]}.
+        ad_data: Данные AD.
+        timestamp: Метка времени для имени файла.
+        matcher: Правила сопоставления (--suffix-match, --ranges).
+        output_format: Формат результата из config.OUTPUT_FORMATS.
+        journal: Журнал прогона (см. write_results).
+        uploads_dir: Папка выгрузок; в столбце файлов пути указываются относительно неё.
+    """
+    if not occurrences:
+        log_error("Не найдено номеров в выгрузках")
+        commit_output(journal, None)
+        return
+
+    log_multiple_records(ad_data)
+    with stage("match") as record:
+        matches = list(iter_counted_matches(occurrences, ad_data, matcher, uploads_dir))
+    record["rows"] = len(occurrences)
+    flush_row_events()
+    matched = set(match[0] for match in matches if match[1] or match[2] or match[3])
+    log_info(f"Найдено совпадений с номерами AD: {len(matched)} уникальных номеров, "
+             f"{sum(occurrences[phone][0] for phone in matched)} вхождений")
+    if matcher is not None:
+        log_rule_matches(count_rules(matches))
+    log_info(f"Номеров без совпадений в AD: {len(occurrences) - len(matched)} уникальных")
+
+    output_file = result_file(timestamp, output_format)
+    header = config.COUNTED_OUTPUT_FIELDS + (config.MATCH_RULE_FIELDS if matcher is not None else [])
+    try:
+        count = write_output_file(matches, output_file, header=header)
+        log_info(f"Количество строк в итоговом файле: {count}")
+        log_info(f"Результат сохранён в {output_file}")
+    except (IOError, PermissionError) as exc:
+        log_error(f"Ошибка записи результата: {exc}")
+        return
+    commit_output(journal, output_file)
+
+def history_rows(phones_records) -> Iterator[Tuple[str, str, str, str]]:
+    """Превращает (номер, записи AD) в строки результата, ненайденные — ",,,"."""
+    for phone, records in phones_records:
+        if not records:
+            yield phone, "", "", ""
+        for display_name, email, enabled in records:
+            yield phone, display_name, email, enabled
+
+def write_history_results(phones: dict, ad_data: dict, ad_version: str, timestamp: str, full: bool = False,
+                          db_path: Optional[str] = None, output_format: str = "csv",
+                          journal: Optional[RunJournal] = None):
+    """Сопоставляет номера с учётом истории прошлых запусков и пишет результат.
+
+    С AD сопоставляются только номера, которых нет в истории или которые
+    были сопоставлены с другой версией AD. История фиксируется только после
+    успешной записи результата и отметки в журнале: при сбое между ними
+    прогон с --resume не перезапишет результат пустой дельтой.
+
+    Args:
+        phones: Уникальные номера выгрузок (ключи словаря).
+        ad_data: Данные AD.
+        ad_version: Версия AD (хеш AD-файла).
+        timestamp: Метка времени для имени файла.
+        full: Записать все номера истории, а не только новые и изменившиеся.
+        db_path: Путь к базе истории, по умолчанию config.HISTORY_DB.
+        output_format: Формат результата из config.OUTPUT_FORMATS.
+        journal: Журнал прогона (см. write_results).
+    """
+    if not phones:
+        log_error("Не найдено номеров в выгрузках")
+        commit_output(journal, None)
+        return
+
+    with SeenNumberStore(db_path or config.HISTORY_DB, timestamp) as store:
+        delta = []
+        stats = {STATUS_NEW: 0, STATUS_CHANGED: 0}
+        with stage("match") as record:
+            for phone, records, status in store.resolve(phones, ad_data, ad_version):
+                if status in stats:
+                    stats[status] += 1
+                    delta.append((phone, records))
+        record["rows"] = len(phones)
+        log_info(f"Новых номеров: {stats[STATUS_NEW]}, с изменившимися данными AD: {stats[STATUS_CHANGED]}, "
+                 f"уже обработанных: {len(phones) - len(delta)}")
+
+        output_file = result_file(timestamp, output_format)
+        try:
+            if full:
+                count = write_output_file(history_rows(store.iter_all(ad_data, ad_version)), output_file,
+                                          sort_rows=False)
+            else:
+                count = write_output_file(history_rows(delta), output_file)
+        except (IOError, PermissionError) as exc:
+            log_error(f"Ошибка записи результата, история не обновлена: {exc}")
+            return
+        commit_output(journal, output_file)
+        store.commit()
+        log_info(f"Количество строк в итоговом файле: {count}")
+        log_info(f"Результат сохранён в {output_file}")
+        log_info(f"Номеров в истории: {len(store)}")
+
+def _iter_spooled(phone_file: str, phones: list, spill) -> Iterator[Tuple[str, str]]:
+    """Выдаёт номера файла из временного файла spill (если есть), затем из списка phones."""
+    if spill is not None:
+        with spill:
+            spill.seek(0)
+            for line in spill:
+                yield line.rstrip("\n"), phone_file
+    for phone in phones:
+        yield phone, phone_file
+
+def spool_phone_file(phone_file: str, temp_dir: str,
+                     buffer_rows: Optional[int] = None) -> Tuple[int, Iterator[Tuple[str, str]]]:
+    """Читает файл выгрузки до конца и возвращает его номера для потоковой выдачи.
+
+    Номера файла не передаются дальше, пока файл не прочитан без ошибок:
+    иначе строки файла, сбойного в середине, попали бы в результат, а сам
+    файл остался бы в выгрузках и при следующем прогоне дал бы их повторно.
+    Сверх buffer_rows номера сбрасываются во временный файл.
+
+    Args:
+        phone_file: Путь к файлу выгрузки.
+        temp_dir: Папка для временного файла.
+        buffer_rows: Номеров в памяти, по умолчанию config.STREAM_FILE_BUFFER_ROWS.
+
+    Returns:
+        Кортеж (количество номеров, итератор кортежей (номер, имя_файла)).
+
+    Raises:
+        OSError, ValueError: Если файл не удалось прочитать (см. iter_phone_file).
+    """
+    buffer_rows = buffer_rows or config.STREAM_FILE_BUFFER_ROWS
+    phones = []
+    spill = None
+    count = 0
+    try:
+        for phone, _ in iter_phone_file(phone_file):
+            phones.append(phone)
+            if len(phones) >= buffer_rows:
+                if spill is None:
+                    ensure_dir(temp_dir)
+                    spill = tempfile.TemporaryFile("w+", encoding="utf-8", prefix=".stream_", dir=temp_dir)
+                spill.writelines(f"{phone}\n" for phone in phones)
+                count += len(phones)
+                phones = []
+    except BaseException:
+        if spill is not None:
+            spill.close()
+        raise
+    return count + len(phones), _iter_spooled(phone_file, phones, spill)
+
+def iter_phone_files(
+    phone_files: list, stats: dict, journal: RunJournal, workers: int = 1, temp_dir: Optional[str] = None
+) -> Iterator[Tuple[str, str]]:
+    """Выдаёт номера из файлов выгрузки, отмечая прочитанные файлы в журнале.
+
+    Номера файла выдаются только после того, как он прочитан целиком без
+    ошибок (см. spool_phone_file), поэтому в результат не попадают строки
+    файла, который не будет архивирован.
+
+    Args:
+        phone_files: Список путей к файлам выгрузки.
+        stats: Счётчики прогона, ключ "phones" увеличивается на каждый номер.
+        journal: Журнал прогона. Номера в нём не сохраняются: результат
+            пишется потоково, поэтому прерванный прогон читает файлы заново.
+        workers: Количество процессов; при workers > 1 файлы разбираются
+            в пуле целиком и выдаются по одному в исходном порядке.
+        temp_dir: Папка для временных файлов номеров, по умолчанию config.RESULTS_DIR.
+
+    Yields:
+        Кортежи (номер, имя_файла).
+    """
+    if workers > 1:
+        results = timed_items(parse_phone_files(phone_files, workers), "upload_file", describe_upload)
+        for phone_file, file_phones, exc in results:
+            flush_row_events()
+            if exc is not None:
+                log_error(f"Ошибка обработки {phone_file}: {exc}")
+                continue
+            yield from file_phones
+            stats["phones"] += len(file_phones)
+            log_info(f"Извлечено {len(file_phones)} номеров из {phone_file}")
+            journal.record_parsed(phone_file)
+        return
+
+    for phone_file in phone_files:
+        try:
+            with stage("upload_file", file=phone_file) as record:
+                file_count, file_phones = spool_phone_file(phone_file, temp_dir or config.RESULTS_DIR)
+            record["rows"] = file_count
+        except (IOError, OSError, ValueError) as exc:
+            flush_row_events()
+            log_error(f"Ошибка обработки {phone_file}: {exc}")
+            continue
+        flush_row_events()
+        yield from file_phones
+        stats["phones"] += file_count
+        log_info(f"Извлечено {file_count} номеров из {phone_file}")
+        journal.record_parsed(phone_file)
+
+def stream_results(uploads_dir: str, ad_data: dict, timestamp: str, workers: int = 1,
+                   matcher: Optional[RuleMatcher] = None, output_format: str = "csv",
+                   journal: Optional[RunJournal] = None):
+    """Потоково сопоставляет номера из выгрузок и пишет результат.
+
+    Номера не накапливаются в памяти для всех файлов сразу: номера
+    каждого файла после его успешного чтения сопоставляются с AD и
+    передаются на запись в итоговый файл. Прочитанные файлы архивируются
+    после записи результата.
+
+    Args:
+        uploads_dir: Папка с файлами выгрузки.
+        ad_data: Данные AD.
+        timestamp: Метка времени для имени файла.
+        workers: Количество процессов для разбора файлов.
+        matcher: Правила сопоставления (--suffix-match, --ranges).
+        output_format: Формат результата из config.OUTPUT_FORMATS.
+        journal: Журнал прогона; по умолчанию — в памяти, без продолжения.
+    """
+    journal = journal or RunJournal(None, "stream", timestamp)
+    phone_files = journal_upload_files(uploads_dir, journal)
+    stats = {"phones": 0, "matched": 0, "unmatched": 0}
+    rules = {}
+
+    def counted(matches):
+        for match in matches:
+            if match[1] or match[2] or match[3]:
+                stats["matched"] += 1
+                if matcher is not None:
+                    rules[match[-2]] = rules.get(match[-2], 0) + 1
+            else:
+                stats["unmatched"] += 1
+            yield match
+
+    log_multiple_records(ad_data)
+    output_file = result_file(timestamp, output_format)
+    phones = iter_phone_files(phone_files, stats, journal, workers, os.path.dirname(output_file))
+    try:
+        if matcher is None:
+            count = write_output_file(counted(iter_matches(phones, ad_data)), output_file)
+        else:
+            count = write_output_file(counted(iter_rule_matches(phones, matcher)), output_file,
+                                      header=config.OUTPUT_FIELDS + config.MATCH_RULE_FIELDS)
+    except (IOError, PermissionError) as exc:
+        log_error(f"Ошибка записи результата: {exc}")
+        return
+
+    flush_row_events()
+    log_info(f"Общее количество номеров в файлах выгрузки: {stats['phones']}")
+    if not stats["phones"]:
+        log_error("Не найдено номеров в выгрузках")
+    log_info(f"Найдено совпадений с номерами AD: {stats['matched']}")
+    if matcher is not None:
+        log_rule_matches(rules)
+    log_info(f"Номеров без совпадений в AD: {stats['unmatched']}")
+    extra_rows = count - stats["phones"]
+    log_msg = f"Количество строк в итоговом файле: {count}"
+    if extra_rows > 0:
+        log_msg += f" (включая {extra_rows} дополнительные строки из-за дубликатов в AD)"
+    log_info(log_msg)
+    log_info(f"Результат сохранён в {output_file}")
+    commit_output(journal, output_file)
+    archive_uploads(journal)
+
+def batch_timestamp(output_format: str = "csv") -> str:
+    """Возвращает метку времени, для которой ещё нет файла результата."""
+    timestamp = datetime.now().strftime(config.DATE_FORMAT)
+    candidate = timestamp
+    counter = 1
+    while os.path.exists(result_file(candidate, output_format)):
+        candidate = f"{timestamp}_{counter}"
+        counter += 1
+    return candidate
+
+def metrics_file(timestamp: str) -> str:
+    """Возвращает путь к файлу метрик прогона или партии с меткой времени."""
+    return os.path.join(config.LOGS_DIR, f"metrics_{timestamp}.json")
+
+def watch_uploads(ad_file: Union[str, List[str]], uploads_dir: str, poll_interval: float, use_cache: bool = False,
+                  workers: int = 1, max_cycles: Optional[int] = None, dedupe: bool = False,
+                  suffix_match: bool = False, ranges_file: Optional[str] = None, output_format: str = "csv",
+                  manifest: Optional[UploadManifest] = None):
+    """Постоянно следит за папкой выгрузок и обрабатывает новые файлы.
+
+    Индекс AD загружается один раз и перезагружается только при изменении
+    AD-файла. Каждый новый файл обрабатывается, как только перестаёт
+    меняться между опросами; результат пишется в отдельный файл на каждую
+    партию, обработанные файлы архивируются после записи результата.
+    Метрики каждой партии пишутся в отдельный файл metrics_<метка результата>_batch.json.
+
+    Args:
+        ad_file: Путь к файлу AD или список путей к файлам и папкам с AD-файлами.
+        uploads_dir: Папка с файлами выгрузки.
+        poll_interval: Интервал опроса в секундах.
+        use_cache: Загружать индекс AD из кэша.
+        workers: Количество процессов для разбора файлов выгрузки и AD.
+        max_cycles: Количество опросов; None — до прерывания (Ctrl+C).
+        dedupe: Схлопывать повторы номеров в каждой партии (см. write_counted_results).
+        suffix_match: Искать номера по окончанию (индекс перестраивается вместе с AD).
+        ranges_file: Файл диапазонов номеров (перечитывается вместе с AD).
+        output_format: Формат результата из config.OUTPUT_FORMATS.
+        manifest: Манифест обработанных выгрузок (см. parse_upload_files).
+    """
+    watcher = UploadWatcher(ad_file, uploads_dir)
+    ad_data = None
+    matcher = None
+    cycles = 0
+    log_info(f"Режим наблюдения за {uploads_dir}, интервал опроса {poll_interval} с")
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            if watcher.ad_changed():
+                try:
+                    ad_data = process_ad_file(ad_file, use_cache, workers)
+                    matcher = build_rule_matcher(ad_data, suffix_match, ranges_file)
+                except (IOError, OSError, ValueError) as exc:
+                    if ad_data is None:
+                        raise
+                    log_error(f"Ошибка перезагрузки AD, используется прежний индекс: {exc}")
+
+            ready_files = watcher.poll()
+            if ready_files:
+                log_info(f"Новых файлов выгрузки: {len(ready_files)}")
+                timestamp = batch_timestamp(output_format)
+                journal = RunJournal(None, "watch", timestamp)
+                phones = parse_upload_files(ready_files, workers, dedupe, journal, manifest)
+                if dedupe:
+                    write_counted_results(phones, ad_data, timestamp, matcher, output_format, journal, uploads_dir)
+                else:
+                    write_results(phones, ad_data, timestamp, matcher, output_format, journal)
+                commit_manifest(journal, manifest)
+                archive_uploads(journal)
+                write_batch_metrics(metrics_file(f"{timestamp}_batch"))
+
+            cycles += 1
+            if max_cycles is None or cycles < max_cycles:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        log_info("Режим наблюдения остановлен")
+
+def open_run_journal(mode: str, resume: bool) -> RunJournal:
+    """Продолжает последний прерванный прогон режима (при resume) или начинает новый."""
+    journal = RunJournal.resume(mode) if resume else None
+    if journal is not None:
+        log_info(f"Продолжение прерванного прогона {journal.timestamp}")
+        return journal
+    if resume:
+        log_info("Прерванный прогон не найден, начинается новый")
+    return RunJournal.start(mode, datetime.now().strftime(config.DATE_FORMAT))
+
+def open_manifest(args: argparse.Namespace) -> Optional[UploadManifest]:
+    """Открывает манифест обработанных выгрузок, если он включён параметром --manifest."""
+    return UploadManifest(skip=args.manifest == "skip") if args.manifest else None
+
+def run_journaled(args: argparse.Namespace, mode: str, journal: RunJournal,
+                  manifest: Optional[UploadManifest] = None) -> None:
+    """Выполняет пакетный прогон (batch, dedupe, history, stream) с журналом.
+
+    Файлы выгрузки архивируются только после записи результата; если
+    результат прерванного прогона уже записан, выполняется только архивирование.
+    """
+    if journal.output_committed:
+        log_info(f"Результат прогона уже записан: {journal.output_file}")
+    elif mode == "history":
+        phones = process_phone_files(args.uploads_dir, args.workers, dedupe=True, journal=journal, manifest=manifest)
+        ad_data = process_ad_file(args.ad_file, args.ad_cache, args.workers)
+        write_history_results(phones, ad_data, hash_files(find_ad_files(args.ad_file)), journal.timestamp,
+                              full=args.history_output == "full", output_format=args.output_format,
+                              journal=journal)
+    elif mode == "dedupe":
+        occurrences = process_phone_files(args.uploads_dir, args.workers, dedupe=True, journal=journal,
+                                          manifest=manifest)
+        ad_data = process_ad_file(args.ad_file, args.ad_cache, args.workers)
+        matcher = build_rule_matcher(ad_data, args.suffix_match, args.ranges)
+        write_counted_results(occurrences, ad_data, journal.timestamp, matcher, args.output_format, journal,
+                              args.uploads_dir)
+    elif mode == "stream":
+        ad_data = process_ad_file(args.ad_file, args.ad_cache, args.workers)
+        matcher = build_rule_matcher(ad_data, args.suffix_match, args.ranges)
+        stream_results(args.uploads_dir, ad_data, journal.timestamp, args.workers, matcher, args.output_format,
+                       journal)
+    else:
+        phones = process_phone_files(args.uploads_dir, args.workers, journal=journal, manifest=manifest)
+        ad_data = process_ad_file(args.ad_file, args.ad_cache, args.workers)
+        matcher = build_rule_matcher(ad_data, args.suffix_match, args.ranges)
+        write_results(phones, ad_data, journal.timestamp, matcher, args.output_format, journal)
+    commit_manifest(journal, manifest)
+    archive_uploads(journal)
 
 def main():
     """Основная функция скрипта."""
-    start_time = time.time()
+    start_time = time.perf_counter()
     args = parse_arguments()
-    setup_logger(args.verbose)
+    setup_logger(args.verbose, args.async_log)
     setup_anomaly_logger()
     log_info("=== Начало работы ===")
+    mode = run_mode(args)
+    start_run_metrics(mode)
+    run_metrics_file = metrics_file(datetime.now().strftime(config.DATE_FORMAT))
 
+    manifest = None
     try:
-        phones = process_phone_files(args.uploads_dir)
-        ad_data = process_ad_file(args.ad_file)
-        timestamp = datetime.now().strftime(config.DATE_FORMAT)
-        write_results(phones, ad_data, timestamp)
+        manifest = open_manifest(args)
+        if args.serve:
+            serve(process_ad_file(args.ad_file, args.ad_cache, args.workers), args.host, args.port)
+        elif args.watch:
+            watch_uploads(args.ad_file, args.uploads_dir, args.poll_interval, args.ad_cache, args.workers,
+                          dedupe=args.dedupe, suffix_match=args.suffix_match, ranges_file=args.ranges,
+                          output_format=args.output_format, manifest=manifest)
+        else:
+            run_journaled(args, mode, open_run_journal(mode, args.resume), manifest)
     except (IOError, OSError) as exc:
         log_error(f"Ошибка обработки: {exc}")
         log_info("=== Работа завершена с ошибкой ===")
         sys.exit(1)
+    finally:
+        if manifest is not None:
+            manifest.close()
+        write_run_metrics(run_metrics_file)
 
-    execution_time = int(time.time() - start_time)
-    log_info(f"Общее время выполнения: {execution_time} секунд")
+    execution_time = time.perf_counter() - start_time
+    log_info(f"Общее время выполнения: {execution_time:.3f} секунд")
     log_info("=== Работа завершена ===")
+    stop_logger()
 
 if __name__ == "__main__":
     main()
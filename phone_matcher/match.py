@@ -1,35 +1,215 @@
-from typing import Dict, List, Tuple
+import os
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
 
-from .utils import log_verbose
+from .ad_index import record_counts
+from .normalize import normalize_phone_cached
+from .range_index import RangeIndex
+from .suffix_index import SuffixIndex
+from .utils import log_row_event, log_verbose
 
+RULE_EXACT = 'exact'  # Номер найден в AD целиком
+RULE_SUFFIX = 'suffix'  # Номер заканчивается номером AD (--suffix-match)
+RULE_RANGE = 'range'  # Номер попадает в диапазон (--ranges)
 
-def match_phones(
-    phones: List[Tuple[str, str]],
-    ad_data: Dict[str, List[Tuple[str, str, str]]]
-) -> List[Tuple[str, str, str, str]]:
-    """Сопоставляет номера с данными AD.
+
+def log_multiple_records(ad_data: Mapping[str, List[Tuple[str, str, str]]]) -> None:
+    """Логирует номера AD, которым соответствует несколько записей.
 
     Args:
-        phones: Список (номер, имя_файла).
         ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
-
-    Returns:
-        Список (номер, ФИО, email, Активный), где ненайденные — ",,,".
     """
-    matches = []
-    multiple_records = {phone: len(records) for phone, records in ad_data.items() if len(records) > 1}
+    multiple_records = {phone: count for phone, count in record_counts(ad_data) if count > 1}
     if multiple_records:
         num_duplicates = len(multiple_records)
         max_records = max(multiple_records.values())
         examples = ", ".join(f"{phone}: {count}" for phone, count in list(multiple_records.items())[:3])
         log_verbose(f"Найдено {num_duplicates} номеров с множественными записями в AD, максимум {max_records} записей, примеры: {examples}")
 
+
+def iter_matches(
+    phones: Iterable[Tuple[str, str]],
+    ad_data: Mapping[str, List[Tuple[str, str, str]]]
+) -> Iterator[Tuple[str, str, str, str]]:
+    """Построчно сопоставляет номера с данными AD.
+
+    Args:
+        phones: Итерируемый набор (номер, имя_файла).
+        ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+
+    Yields:
+        Кортежи (номер, ФИО, email, Активный), где ненайденные — ",,,".
+    """
     for phone, source_file in phones:
-        if phone in ad_data:
-            for display_name, email, enabled in ad_data[phone]:
-                matches.append((phone, display_name, email, enabled))
-                log_verbose(f"Добавлен номер {phone} с данными ({display_name}, {email}, {enabled})")
+        records = ad_data.get(phone)
+        if records is not None:
+            for display_name, email, enabled in records:
+                yield phone, display_name, email, enabled
+                log_row_event("Найдено в AD", "Добавлен номер %s с данными (%s, %s, %s)",
+                              phone, display_name, email, enabled)
         else:
-            matches.append((phone, "", "", ""))
-            log_verbose(f"Номер {phone} из {source_file} не найден в AD")
-    return matches
+            yield phone, "", "", ""
+            log_row_event("Не найдено в AD", "Номер %s из %s не найден в AD", phone, source_file)
+
+
+class RuleMatcher:
+    """Сопоставляет номер с AD по правилам: целиком, по окончанию, по диапазону.
+
+    Правила применяются по порядку: точное совпадение с номером AD, самый
+    длинный номер AD, которым заканчивается номер (если задан suffix_index),
+    самый узкий диапазон номеров (если задан range_index).
+    """
+    def __init__(
+        self,
+        ad_data: Mapping[str, List[Tuple[str, str, str]]],
+        suffix_index: Optional[SuffixIndex] = None,
+        range_index: Optional[RangeIndex] = None
+    ):
+        self.ad_data = ad_data
+        self.suffix_index = suffix_index
+        self.range_index = range_index
+
+    def resolve(self, phone: str) -> Tuple[Optional[List[Tuple[str, str, str]]], str, str]:
+        """Ищет записи для номера.
+
+        Args:
+            phone: Нормализованный номер.
+
+        Returns:
+            Кортеж: (записи или None, правило RULE_* или "", совпавший номер
+            AD или диапазон либо "").
+        """
+        records = self.ad_data.get(phone)
+        if records is not None:
+            return records, RULE_EXACT, phone
+        if self.suffix_index is not None:
+            ad_phone = self.suffix_index.find(phone)
+            if ad_phone is not None:
+                return self.ad_data[ad_phone], RULE_SUFFIX, ad_phone
+        if self.range_index is not None:
+            found = self.range_index.find(phone)
+            if found is not None:
+                return found[1], RULE_RANGE, found[0]
+        return None, "", ""
+
+
+def iter_rule_matches(
+    phones: Iterable[Tuple[str, str]],
+    matcher: RuleMatcher
+) -> Iterator[Tuple[str, str, str, str, str, str]]:
+    """Построчно сопоставляет номера по правилам RuleMatcher.
+
+    Args:
+        phones: Итерируемый набор (номер, имя_файла).
+        matcher: Правила сопоставления.
+
+    Yields:
+        Кортежи (номер, ФИО, email, Активный, правило, номер AD или
+        диапазон), где у ненайденных остальные поля пустые.
+    """
+    for phone, source_file in phones:
+        records, rule, matched = matcher.resolve(phone)
+        if records is None:
+            yield phone, "", "", "", "", ""
+            log_row_event("Не найдено в AD", "Номер %s из %s не найден в AD", phone, source_file)
+            continue
+        for display_name, email, enabled in records:
+            yield phone, display_name, email, enabled, rule, matched
+        if rule == RULE_SUFFIX:
+            log_row_event("Найдено по окончанию номера", "Номер %s найден в AD как %s", phone, matched)
+        elif rule == RULE_RANGE:
+            log_row_event("Найдено по диапазону", "Номер %s попадает в диапазон %s", phone, matched)
+        else:
+            log_row_event("Найдено в AD", "Добавлен номер %s из %s", phone, source_file)
+
+
+def upload_name(phone_file: str, uploads_dir: Optional[str] = None) -> str:
+    """Возвращает имя файла выгрузки для результата: путь относительно папки выгрузок или имя файла."""
+    if uploads_dir is None:
+        return os.path.basename(phone_file)
+    return os.path.relpath(phone_file, uploads_dir)
+
+
+def iter_counted_matches(
+    occurrences: Mapping[str, list],
+    ad_data: Mapping[str, List[Tuple[str, str, str]]],
+    matcher: Optional[RuleMatcher] = None,
+    uploads_dir: Optional[str] = None
+) -> Iterator[tuple]:
+    """Сопоставляет с данными AD уникальные номера со счётчиками вхождений.
+
+    Каждый номер ищется в AD один раз, сколько бы раз он ни встречался
+    в выгрузках.
+
+    Args:
+        occurrences: Словарь {номер: [количество, [файлы]]} (merge_phone_counts).
+        ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+        matcher: Правила сопоставления; если заданы, к строкам добавляются
+            правило и номер AD или диапазон (см. iter_rule_matches).
+        uploads_dir: Папка выгрузок; файлы указываются относительно неё
+            (site1/calls.csv), без неё — только имя файла.
+
+    Yields:
+        Кортежи (номер, ФИО, email, Активный, количество, файлы через ";"[,
+        правило, номер AD или диапазон]), где у ненайденных пустые ФИО,
+        email и Активный.
+    """
+    extra = ()
+    names = {}
+    for phone, (count, phone_files) in occurrences.items():
+        for phone_file in phone_files:
+            if phone_file not in names:
+                names[phone_file] = upload_name(phone_file, uploads_dir)
+        source_files = ";".join(names[phone_file] for phone_file in phone_files)
+        if matcher is None:
+            records = ad_data.get(phone)
+        else:
+            records, rule, matched = matcher.resolve(phone)
+            extra = (rule, matched)
+        if records is not None:
+            for display_name, email, enabled in records:
+                yield (phone, display_name, email, enabled, count, source_files) + extra
+                log_row_event("Найдено в AD", "Добавлен номер %s с данными (%s, %s, %s)",
+                              phone, display_name, email, enabled)
+        else:
+            yield (phone, "", "", "", count, source_files) + extra
+            log_row_event("Не найдено в AD", "Номер %s из %s не найден в AD", phone, source_files)
+
+
+def lookup_phone(
+    phone: str,
+    ad_data: Mapping[str, List[Tuple[str, str, str]]]
+) -> Tuple[Optional[str], List[Tuple[str, str, str]]]:
+    """Ищет один номер в исходном виде.
+
+    Номер нормализуется так же, как в выгрузках, а при дубликатах в AD
+    возвращаются все записи, как в match_phones.
+
+    Args:
+        phone: Номер в исходном виде.
+        ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+
+    Returns:
+        Кортеж: (нормализованный номер или None, список (ФИО, email, Enabled)).
+    """
+    norm_phone = normalize_phone_cached(phone)
+    records = ad_data.get(norm_phone) if norm_phone else None
+    if records is None:
+        return norm_phone, []
+    return norm_phone, list(records)
+
+
+def match_phones(
+    phones: List[Tuple[str, str]],
+    ad_data: Mapping[str, List[Tuple[str, str, str]]]
+) -> List[Tuple[str, str, str, str]]:
+    """Сопоставляет номера с данными AD.
+
+    Args:
+        phones: Список (номер, имя_файла).
+        ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+
+    Returns:
+        Список (номер, ФИО, email, Активный), где ненайденные — ",,,".
+    """
+    log_multiple_records(ad_data)
+    return list(iter_matches(phones, ad_data))
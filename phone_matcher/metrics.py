@@ -0,0 +1,207 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+from . import config
+from .utils import log_error, log_info, manage_log_files
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+T = TypeVar('T')
+
+_run = None
+
+
+def peak_rss_kb(children: bool = False) -> Optional[int]:
+    """Возвращает пиковый объём резидентной памяти процесса в КБ.
+
+    Args:
+        children: Пик по завершённым дочерним процессам (воркерам пула).
+
+    Returns:
+        Объём в КБ или None, если платформа не поддерживает resource.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # На macOS ru_maxrss в байтах, на Linux — в килобайтах
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+
+def start_run_metrics(mode: str) -> None:
+    """Начинает сбор метрик прогона; этапы до вызова не записываются.
+
+    Args:
+        mode: Режим работы (batch, stream, watch, serve).
+    """
+    global _run  # pylint: disable=global-statement
+    _run = {
+        'mode': mode,
+        'started': datetime.now().strftime(config.LOG_DATE_FORMAT),
+        'wall': time.perf_counter(),
+        'cpu': time.process_time(),
+        'stages': [],
+    }
+
+
+def _add_stage(name: str, wall: float, cpu: float, rss_before: Optional[int], record: dict) -> None:
+    """Добавляет этап в прогон.
+
+    ru_maxrss — пик за всё время процесса, поэтому пик самого этапа по нему
+    не определить. В записи два поля: max_rss_so_far_kb — пик процесса на
+    конец этапа, max_rss_growth_kb — насколько этап поднял этот пик (0, если
+    этап уложился в память, занятую раньше).
+    """
+    record['stage'] = name
+    record['wall_s'] = round(wall, 6)
+    record['cpu_s'] = round(cpu, 6)
+    record['max_rss_so_far_kb'] = peak_rss_kb()
+    record['max_rss_growth_kb'] = None if rss_before is None else record['max_rss_so_far_kb'] - rss_before
+    if _run is not None:
+        _run['stages'].append(record)
+
+
+@contextmanager
+def stage(name: str, **details) -> Iterator[dict]:
+    """Замеряет этап: время (реальное и CPU) и рост пиковой памяти процесса (см. _add_stage).
+
+    Количество строк этапа задаётся через record["rows"] внутри блока
+    или после него.
+
+    Args:
+        name: Имя этапа (ad_load, upload_file, match, sort, write, archive).
+        **details: Дополнительные поля записи (файл и т.п.).
+
+    Yields:
+        Запись этапа.
+    """
+    record = dict(details)
+    rss = peak_rss_kb()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield record
+    finally:
+        _add_stage(name, time.perf_counter() - wall, time.process_time() - cpu, rss, record)
+
+
+def timed_items(items: Iterable[T], name: str, describe: Callable[[T], dict]) -> Iterator[T]:
+    """Замеряет получение каждого элемента итератора как отдельный этап.
+
+    Учитывается только время внутри next(): обработка элемента вызывающим
+    кодом в этап не входит.
+
+    Args:
+        items: Итерируемый набор.
+        name: Имя этапа.
+        describe: Функция, возвращающая поля записи для элемента (file, rows).
+
+    Yields:
+        Элементы items.
+    """
+    iterator = iter(items)
+    while True:
+        rss = peak_rss_kb()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        _add_stage(name, time.perf_counter() - wall, time.process_time() - cpu, rss, describe(item))
+        yield item
+
+
+def _summarize(stages: list) -> dict:
+    """Суммирует этапы по имени."""
+    totals = {}
+    for record in stages:
+        total = totals.setdefault(record['stage'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0})
+        total['count'] += 1
+        total['wall_s'] += record['wall_s']
+        total['cpu_s'] += record['cpu_s']
+        total['rows'] += record.get('rows') or 0
+    for total in totals.values():
+        total['wall_s'] = round(total['wall_s'], 6)
+        total['cpu_s'] = round(total['cpu_s'], 6)
+    return totals
+
+
+def _with_rate(record: dict) -> dict:
+    if record.get('rows') is not None:
+        record['rows_per_s'] = round(record['rows'] / record['wall_s'], 1) if record['wall_s'] > 0 else None
+    return record
+
+
+def run_metrics_report() -> Optional[dict]:
+    """Возвращает отчёт по текущему прогону или None, если сбор не начат.
+
+    Returns:
+        Словарь: режим, общее время, пиковая память процесса и воркеров,
+        этапы по порядку и итоги по имени этапа (с rows_per_s).
+    """
+    if _run is None:
+        return None
+    return {
+        'mode': _run['mode'],
+        'started': _run['started'],
+        'wall_s': round(time.perf_counter() - _run['wall'], 6),
+        'cpu_s': round(time.process_time() - _run['cpu'], 6),
+        'peak_rss_kb': peak_rss_kb(),
+        'peak_rss_children_kb': peak_rss_kb(children=True),
+        'stages': [_with_rate(dict(record)) for record in _run['stages']],
+        'totals': {name: _with_rate(total) for name, total in _summarize(_run['stages']).items()},
+    }
+
+
+def write_run_metrics(metrics_file: str) -> Optional[dict]:
+    """Записывает отчёт по прогону в JSON и завершает сбор метрик.
+
+    Старые файлы метрик удаляются так же, как логи (config.MAX_LOGS).
+
+    Args:
+        metrics_file: Путь к файлу метрик.
+
+    Returns:
+        Записанный отчёт или None, если сбор не начат.
+    """
+    global _run  # pylint: disable=global-statement
+    report = run_metrics_report()
+    _run = None
+    if report is None:
+        return None
+    try:
+        manage_log_files(os.path.dirname(metrics_file), metrics_file, "metrics_*.json")
+        with open(metrics_file, 'w', encoding='utf-8') as file_:
+            json.dump(report, file_, ensure_ascii=False, indent=2)
+        log_info(f"Метрики прогона сохранены в {metrics_file}")
+    except OSError as exc:
+        log_error(f"Ошибка записи метрик {metrics_file}: {exc}")
+    return report
+
+
+def write_batch_metrics(metrics_file: str) -> Optional[dict]:
+    """Записывает метрики партии долгоживущего процесса (--watch) и начинает сбор заново.
+
+    Этапы не накапливаются между партиями, поэтому память процесса не растёт
+    с количеством обработанных файлов.
+
+    Args:
+        metrics_file: Путь к файлу метрик партии.
+
+    Returns:
+        Записанный отчёт или None, если сбор не начат.
+    """
+    if _run is None:
+        return None
+    mode = _run['mode']
+    report = write_run_metrics(metrics_file)
+    start_run_metrics(mode)
+    return report
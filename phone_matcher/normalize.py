@@ -1,4 +1,14 @@
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+from . import config
+
+# Таблицы удаления для bytes.translate: все байты, кроме цифр ASCII
+_NON_DIGITS = bytes(code for code in range(256) if not 0x30 <= code <= 0x39)
+_BATCH_SEPARATOR = '\x00'
+_NON_DIGITS_KEEP_SEPARATOR = _NON_DIGITS.replace(_BATCH_SEPARATOR.encode('ascii'), b'')
+# Для разбора блоков байтов: удаляет всё, кроме цифр и разделителя значений b'\n'
+NON_DIGITS_KEEP_NEWLINE = _NON_DIGITS.replace(b'\n', b'')
 
 
 def normalize_phone(phone: str) -> Optional[str]:
@@ -12,6 +22,33 @@ def normalize_phone(phone: str) -> Optional[str]:
     """
     if not phone:
         return None
-    cleaned = phone.strip()
-    digits = ''.join(c for c in cleaned if c.isdigit())
+    if phone.isascii():
+        digits = phone.encode('ascii').translate(None, _NON_DIGITS).decode('ascii')
+    else:
+        digits = ''.join(c for c in phone if c.isdigit())
     return digits if digits else None
+
+
+normalize_phone_cached = lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)(normalize_phone)
+normalize_phone_cached.__doc__ = """Нормализует номер с LRU-кэшем для повторяющихся строк."""
+
+
+def normalize_phones(phones: Iterable[str]) -> List[Optional[str]]:
+    """Нормализует набор номеров за один вызов.
+
+    Если все номера в ASCII, столбец склеивается в одну строку и очищается
+    одним вызовом bytes.translate. Иначе номера нормализуются по одному
+    через LRU-кэш. Результат для каждого элемента совпадает с normalize_phone.
+
+    Args:
+        phones: Итерируемый набор номеров.
+
+    Returns:
+        Список нормализованных номеров (None для некорректных).
+    """
+    phones = list(phones)
+    joined = _BATCH_SEPARATOR.join(phones)
+    if phones and joined.isascii() and joined.count(_BATCH_SEPARATOR) == len(phones) - 1:
+        digits = joined.encode('ascii').translate(None, _NON_DIGITS_KEEP_SEPARATOR).decode('ascii')
+        return [phone or None for phone in digits.split(_BATCH_SEPARATOR)]
+    return list(map(normalize_phone_cached, phones))
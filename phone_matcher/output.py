@@ -1,17 +1,166 @@
 import csv
+import gzip
+import heapq
+import io
 import os
-from typing import List, Tuple
+import tempfile
+from contextlib import contextmanager
+from itertools import count as count_from
+from json.encoder import encode_basestring
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Sequence, TextIO
 from . import config
-from .utils import log_error, ensure_dir
+from .metrics import stage
+from .utils import log_error, log_verbose, ensure_dir
+
+_sort_key = itemgetter(0)
+
+def detect_output_format(file_path: str) -> str:
+    """Определяет формат результата по расширению файла (см. config.OUTPUT_FORMATS).
+
+    Args:
+        file_path: Путь к файлу.
+
+    Returns:
+        Формат: "csv", "csv.gz", "jsonl" или "jsonl.gz"; для неизвестного
+        расширения — "csv".
+    """
+    for output_format in sorted(config.OUTPUT_FORMATS, key=len, reverse=True):
+        if file_path.endswith(f".{output_format}"):
+            return output_format
+    return 'csv'
+
+@contextmanager
+def _open_text(file_path: str, compressed: bool) -> Iterator[TextIO]:
+    """Открывает файл на запись в UTF-8 с большим буфером, при compressed — со сжатием gzip.
+
+    Перед сжатием данные собираются в буфер config.OUTPUT_BUFFER_SIZE,
+    чтобы zlib получал крупные блоки, а не отдельные строки.
+    """
+    if not compressed:
+        with open(file_path, 'w', newline='', encoding='utf-8', buffering=config.OUTPUT_BUFFER_SIZE) as file_:
+            yield file_
+        return
+    with open(file_path, 'wb') as raw, \
+            gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=config.OUTPUT_COMPRESSION_LEVEL) as gzip_file, \
+            io.TextIOWrapper(io.BufferedWriter(gzip_file, config.OUTPUT_BUFFER_SIZE), encoding='utf-8',
+                             newline='') as file_:
+        yield file_
+
+def _counted(rows: Iterable[Sequence[str]], counter) -> Iterator[Sequence[str]]:
+    """Выдаёт строки; после исчерпания next(counter) равно их количеству."""
+    # zip берёт значение счётчика только после очередной строки
+    return (row for row, _ in zip(rows, counter))
+
+def _write_rows(
+    rows: Iterable[Sequence[str]], file_path: str, header: Optional[List[str]] = None, output_format: str = 'csv'
+) -> int:
+    """Пишет строки в файл результата.
+
+    CSV пишется через csv.writer, JSON Lines — по объекту на строку
+    с ключами из заголовка и строковыми значениями, как в CSV. Строки
+    пишутся пакетно (writerows/writelines) в буфер config.OUTPUT_BUFFER_SIZE.
+
+    Args:
+        rows: Итерируемый набор строк.
+        file_path: Путь к файлу.
+        header: Заголовок; None — без заголовка (для JSON Lines обязателен).
+        output_format: Формат из config.OUTPUT_FORMATS.
+
+    Returns:
+        Количество записанных строк (без заголовка).
+    """
+    counter = count_from()
+    base_format, _, compression = output_format.partition('.')
+    with _open_text(file_path, compression == 'gz') as file_:
+        if base_format == 'jsonl':
+            # Ключи объекта одинаковы во всех строках: кодируются один раз в шаблон
+            template = '{' + ','.join(encode_basestring(field).replace('%', '%%') + ':%s' for field in header) + '}\n'
+            file_.writelines(template % tuple(map(encode_basestring, map(str, row)))
+                             for row in _counted(rows, counter))
+        else:
+            writer = csv.writer(file_, delimiter=config.OUTPUT_DELIMITER, quoting=csv.QUOTE_MINIMAL)
+            if header is not None:
+                writer.writerow(header)
+            writer.writerows(_counted(rows, counter))
+    return next(counter)
+
+def _read_run(run_file: str) -> Iterator[List[str]]:
+    """Читает отсортированный фрагмент, сброшенный на диск."""
+    with open(run_file, newline='', encoding='utf-8') as file_:
+        yield from csv.reader(file_, delimiter=config.OUTPUT_DELIMITER, quoting=csv.QUOTE_MINIMAL)
+
+def _spill_run(rows: list, directory: str) -> str:
+    """Сортирует фрагмент и сбрасывает его во временный файл.
+
+    Args:
+        rows: Строки фрагмента (сортируются на месте).
+        directory: Папка для временного файла.
+
+    Returns:
+        Путь к временному файлу.
+    """
+    rows.sort(key=_sort_key)
+    fd, run_file = tempfile.mkstemp(prefix='.sort_', suffix='.csv', dir=directory)
+    os.close(fd)
+    _write_rows(rows, run_file)
+    return run_file
+
+def sort_rows_external(
+    rows: Iterable[Sequence[str]], temp_dir: str, run_files: List[str], buffer_rows: Optional[int] = None
+) -> Iterator[Sequence[str]]:
+    """Сортирует строки по номеру с ограниченным потреблением памяти.
+
+    Пока строки помещаются в буфер, сортировка идёт в памяти. При
+    переполнении буфера отсортированный фрагмент сбрасывается во временный
+    файл, а в конце фрагменты сливаются. Сортировка устойчивая: строки
+    с одинаковым номером сохраняют исходный порядок.
+
+    Args:
+        rows: Итерируемый набор строк.
+        temp_dir: Папка для временных файлов.
+        run_files: Список, в который добавляются пути временных файлов
+            (удалить их должен вызывающий код).
+        buffer_rows: Размер буфера в строках, по умолчанию config.SORT_BUFFER_ROWS.
+
+    Returns:
+        Итератор отсортированных строк.
+    """
+    if buffer_rows is None:
+        buffer_rows = config.SORT_BUFFER_ROWS
+
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= buffer_rows:
+            run_files.append(_spill_run(buffer, temp_dir))
+            buffer = []
+
+    if not run_files:
+        buffer.sort(key=_sort_key)
+        return iter(buffer)
+
+    if buffer:
+        run_files.append(_spill_run(buffer, temp_dir))
+    log_verbose(f"Внешняя сортировка: слияние {len(run_files)} фрагментов")
+    return heapq.merge(*(_read_run(run_file) for run_file in run_files), key=_sort_key)
 
 def write_output_file(
-    matches: List[Tuple[str, str, str, str]], output_file: str
+    matches: Iterable[Sequence[str]], output_file: str, sort_rows: bool = True,
+    header: Optional[List[str]] = None
 ) -> int:
-    """Записывает итоговый CSV-файл с сортировкой.
+    """Записывает итоговый файл с сортировкой.
+
+    Файл сначала пишется во временный, затем атомарно переименовывается.
+    Формат определяется по расширению output_file (detect_output_format):
+    CSV или JSON Lines, оба — с необязательным сжатием gzip.
 
     Args:
-        matches: Список (номер, ФИО, email, Активный).
-        output_file: Путь к итоговому файлу.
+        matches: Итерируемый набор (номер, ФИО, email, Активный).
+        output_file: Путь к итоговому файлу (.csv, .csv.gz, .jsonl, .jsonl.gz).
+        sort_rows: Сортировать строки по номеру. Без сортировки строки
+            пишутся в файл в порядке поступления.
+        header: Заголовок, по умолчанию config.OUTPUT_FIELDS.
 
     Returns:
         Количество строк в файле (без заголовка).
@@ -19,24 +168,32 @@ def write_output_file(
     Raises:
         OSError: Если ошибка записи.
     """
-    ensure_dir(os.path.dirname(output_file))
+    output_dir = os.path.dirname(output_file)
+    ensure_dir(output_dir)
     temp_file = output_file + ".tmp"
+    run_files = []
 
     try:
-        with open(temp_file, 'w', newline='', encoding='utf-8') as file_:
-            writer = csv.writer(file_, delimiter=config.OUTPUT_DELIMITER, quoting=csv.QUOTE_MINIMAL)
-            writer.writerow(config.OUTPUT_FIELDS)
-            writer.writerows(matches)
-
-        sorted_matches = sorted(matches, key=lambda x: x[0])
-        with open(output_file, 'w', newline='', encoding='utf-8') as file_:
-            writer = csv.writer(file_, delimiter=config.OUTPUT_DELIMITER, quoting=csv.QUOTE_MINIMAL)
-            writer.writerow(config.OUTPUT_FIELDS)
-            writer.writerows(sorted_matches)
-
-        os.remove(temp_file)
-        os.chmod(output_file, config.FILE_PERMISSIONS)
-        return len(matches)
+        rows = matches
+        if sort_rows:
+            with stage("sort") as sort_record:
+                rows = sort_rows_external(matches, output_dir, run_files)
+        with stage("write", file=output_file) as write_record:
+            count = _write_rows(rows, temp_file, header or config.OUTPUT_FIELDS, detect_output_format(output_file))
+            os.replace(temp_file, output_file)
+            os.chmod(output_file, config.FILE_PERMISSIONS)
+        write_record["rows"] = count
+        if sort_rows:
+            # Слияние сброшенных фрагментов идёт при записи и входит во время этапа write
+            sort_record["rows"] = count
+            sort_record["spilled_runs"] = write_record["merged_runs"] = len(run_files)
+        return count
     except Exception as exc:
         log_error(f"Ошибка записи {output_file}: {exc}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
         raise
+    finally:
+        for run_file in run_files:
+            if os.path.exists(run_file):
+                os.remove(run_file)
@@ -1,9 +1,15 @@
 import csv
-from typing import Dict, List, Tuple
+import os
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import Callable, Iterator, List, Optional, Tuple
 
 from . import config
+from .ad_index import AdIndex
 from .normalize import normalize_phone
-from .utils import log_error, log_verbose, log_anomaly
+from .encoding import iter_decoded_lines
+from .utils import (capture_worker_logs, drain_worker_logs, is_row_event_aggregation_enabled, replay_log_records,
+                    log_error, log_verbose, log_anomaly, log_row_event)
 
 
 def validate_header(header: List[str], ad_file: str) -> List[str]:
@@ -39,28 +45,43 @@ def validate_header(header: List[str], ad_file: str) -> List[str]:
     return header
 
 
-def process_row(row: List[str], header: List[str]) -> Tuple[List[Tuple[str, str, str, str]], int]:
-    """Обрабатывает строку CSV и возвращает данные и количество аномалий.
+def build_row_getter(header: List[str]) -> Callable[[List[str]], Tuple[str, str, str, str]]:
+    """Вычисляет позиции нужных столбцов один раз для всего файла.
+
+    Args:
+        header: Проверенный заголовок CSV.
+
+    Returns:
+        Функция, извлекающая из строки (ФИО, номера, email, enabled).
+    """
+    return itemgetter(
+        header.index(config.AD_FIELDS['display_name']),
+        header.index(config.AD_FIELDS['phone']),
+        header.index(config.AD_FIELDS['email']),
+        header.index(config.AD_FIELDS['enabled']),
+    )
+
+
+def decode_row(
+    row: List[str], get_fields: Callable[[List[str]], Tuple[str, str, str, str]]
+) -> Tuple[List[Tuple[str, str, str, str]], int]:
+    """Извлекает номера из строки AD по заранее вычисленным позициям столбцов.
+
+    Строка для лога аномалий формируется, только если аномалия найдена.
 
     Args:
         row: Строка CSV.
-        header: Заголовок CSV.
+        get_fields: Функция из build_row_getter.
 
     Returns:
         Кортеж: (список кортежей (номер, ФИО, email, enabled), количество аномалий).
     """
     anomaly_count = 0
     if len(row) < len(config.AD_FIELDS):
-        log_verbose(f"Пропущена строка в AD: {row}")
+        log_row_event("Пропущенные строки AD", "Пропущена строка в AD: %s", row)
         return [], anomaly_count
 
-    display_name = row[header.index(config.AD_FIELDS['display_name'])]
-    phones = row[header.index(config.AD_FIELDS['phone'])]
-    email = row[header.index(config.AD_FIELDS['email'])]
-    enabled = row[header.index(config.AD_FIELDS['enabled'])]
-
-    row_str = f'"{display_name}";"{phones}";"{email}";"{enabled}"'
-
+    display_name, phones, email, enabled = get_fields(row)
     if not phones:
         return [], anomaly_count
 
@@ -72,59 +93,130 @@ def process_row(row: List[str], header: List[str]) -> Tuple[List[Tuple[str, str,
 
     result = []
     for phone in phone_list:
-        if not phone.strip():
-            log_verbose(f"Пустой номер в AD: {row}")
-            continue
         norm_phone = normalize_phone(phone)
-        if not norm_phone or len(norm_phone) < config.VALID_PHONE_NUMBER_LENGTH:
-            log_anomaly(row_str)
-            anomaly_count += 1
+        if norm_phone and len(norm_phone) >= config.VALID_PHONE_NUMBER_LENGTH:
+            result.append((norm_phone, display_name, email, enabled))
+            continue
+        if not phone.strip():
+            log_row_event("Пустые номера в AD", "Пустой номер в AD: %s", row)
             continue
-        result.append((norm_phone, display_name, email, enabled))
+        log_anomaly(f'"{display_name}";"{phones}";"{email}";"{enabled}"')
+        anomaly_count += 1
 
     return result, anomaly_count
 
 
-def parse_ad_file(ad_file: str) -> Tuple[Dict[str, List[Tuple[str, str, str]]], int]:
-    """Читает файл AD и создаёт словарь номеров с количеством аномалий.
+def process_row(row: List[str], header: List[str]) -> Tuple[List[Tuple[str, str, str, str]], int]:
+    """Обрабатывает строку CSV и возвращает данные и количество аномалий.
+
+    Args:
+        row: Строка CSV.
+        header: Заголовок CSV.
+
+    Returns:
+        Кортеж: (список кортежей (номер, ФИО, email, enabled), количество аномалий).
+    """
+    return decode_row(row, build_row_getter(header))
+
+
+def ad_domain(ad_file: str) -> str:
+    """Возвращает домен записей AD-файла — имя файла без расширения."""
+    return os.path.splitext(os.path.basename(ad_file))[0]
+
+
+def parse_ad_file(ad_file: str) -> Tuple[AdIndex, int]:
+    """Читает файл AD и создаёт индекс номеров с количеством аномалий.
 
     Args:
         ad_file: Путь к файлу AD.
 
     Returns:
-        Кортеж: (словарь {номер: [(ФИО, email, Enabled), ...]}, общее количество аномалий).
+        Кортеж: (индекс AdIndex {номер: [(ФИО, email, Enabled), ...]}, общее количество аномалий).
 
     Raises:
         FileNotFoundError: Если файл AD не найден.
         ValueError: Если формат AD некорректен.
     """
-    ad_data = {}
+    ad_data = AdIndex(ad_domain(ad_file))
     total_anomaly_count = 0
 
-    for encoding in config.ENCODINGS:
-        try:
-            with open(ad_file, newline='', encoding=encoding) as file_handle:
-                reader = csv.reader(file_handle, delimiter=config.AD_DELIMITER, quoting=csv.QUOTE_ALL)
-                header = validate_header(next(reader, None), ad_file)
-
-                for row in reader:
-                    row_data, anomaly_count = process_row(row, header)
-                    total_anomaly_count += anomaly_count
-                    for norm_phone, display_name, email, enabled in row_data:
-                        if norm_phone not in ad_data:
-                            ad_data[norm_phone] = []
-                        ad_data[norm_phone].append((display_name, email, enabled))
-
-                return ad_data, total_anomaly_count
-        except UnicodeDecodeError:
-            log_verbose(f"Ошибка кодировки {encoding} в {ad_file}, пробую следующую")
-            continue
-        except FileNotFoundError:
-            log_error(f"Файл AD не найден: {ad_file}")
-            raise
-        except Exception as exc:
-            log_error(f"Ошибка чтения AD {ad_file}: {exc}")
-            raise
-
-    log_error(f"Не удалось прочитать {ad_file} ни в одной кодировке")
-    raise ValueError("Невозможно декодировать файл AD")
+    try:
+        with open(ad_file, 'rb') as file_handle:
+            lines = iter_decoded_lines(file_handle, ad_file)
+            reader = csv.reader(lines, delimiter=config.AD_DELIMITER, quoting=csv.QUOTE_ALL)
+            header = validate_header(next(reader, None), ad_file)
+            get_fields = build_row_getter(header)
+
+            for row in reader:
+                row_data, anomaly_count = decode_row(row, get_fields)
+                total_anomaly_count += anomaly_count
+                for norm_phone, display_name, email, enabled in row_data:
+                    ad_data.add(norm_phone, display_name, email, enabled)
+
+            return ad_data, total_anomaly_count
+    except UnicodeDecodeError as exc:
+        log_error(f"Не удалось прочитать {ad_file} ни в одной кодировке")
+        raise ValueError("Невозможно декодировать файл AD") from exc
+    except FileNotFoundError:
+        log_error(f"Файл AD не найден: {ad_file}")
+        raise
+    except Exception as exc:
+        log_error(f"Ошибка чтения AD {ad_file}: {exc}")
+        raise
+
+
+AdLoader = Callable[[str], Tuple[AdIndex, int]]
+
+
+def _parse_ad_file_job(
+    ad_file: str, loader: AdLoader
+) -> Tuple[Optional[AdIndex], int, list, Optional[Exception]]:
+    """Разбирает AD-файл в процессе-воркере.
+
+    Args:
+        ad_file: Путь к файлу AD.
+        loader: Функция загрузки индекса (parse_ad_file или load_ad_index).
+
+    Returns:
+        Кортеж: (индекс или None, количество аномалий, записи лога, ошибка или None).
+    """
+    try:
+        ad_data, anomaly_count = loader(ad_file)
+        return ad_data, anomaly_count, drain_worker_logs(), None
+    except (OSError, ValueError) as exc:
+        return None, 0, drain_worker_logs(), exc
+
+
+def parse_ad_files(
+    ad_files: List[str], workers: int = 1, loader: AdLoader = parse_ad_file
+) -> Iterator[Tuple[str, Optional[AdIndex], int, Optional[Exception]]]:
+    """Разбирает несколько AD-файлов, при workers > 1 — в пуле процессов.
+
+    AD-файлов немного, поэтому в пул передаются сразу все: общее время
+    близко ко времени самого большого файла. Результаты и логи каждого
+    файла выдаются строго в порядке ad_files.
+
+    Args:
+        ad_files: Список путей к файлам AD.
+        workers: Количество процессов.
+        loader: Функция загрузки индекса одного файла.
+
+    Yields:
+        Кортежи (путь, индекс или None, количество аномалий, ошибка или None).
+    """
+    if workers <= 1 or len(ad_files) <= 1:
+        for ad_file in ad_files:
+            try:
+                ad_data, anomaly_count = loader(ad_file)
+                yield ad_file, ad_data, anomaly_count, None
+            except (OSError, ValueError) as exc:
+                yield ad_file, None, 0, exc
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ad_files)), initializer=capture_worker_logs,
+                             initargs=(is_row_event_aggregation_enabled(),)) as executor:
+        futures = [(ad_file, executor.submit(_parse_ad_file_job, ad_file, loader)) for ad_file in ad_files]
+        for ad_file, future in futures:
+            ad_data, anomaly_count, records, exc = future.result()
+            replay_log_records(records)
+            yield ad_file, ad_data, anomaly_count, exc
@@ -1,8 +1,275 @@
+import codecs
 import csv
-from typing import List, Tuple
+import io
+import mmap
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from . import config
-from .utils import log_error, log_verbose
-from .normalize import normalize_phone
+from .utils import (capture_worker_logs, drain_worker_logs, is_row_event_aggregation_enabled,
+                    replay_log_records, log_error, log_row_event, log_verbose, split_compression)
+from .normalize import NON_DIGITS_KEEP_NEWLINE, normalize_phone, normalize_phone_cached, normalize_phones
+from .encoding import decode_chunk, iter_decoded_lines
+from .compression import COMPRESSION_ERRORS, iter_upload_streams, upload_format
+
+_NEWLINE = ord('\n')
+
+def _iter_phones(file_, phone_file: str, name: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Извлекает номера из открытого файла выгрузки.
+
+    Args:
+        file_: Итерируемый набор строк файла.
+        phone_file: Путь к файлу выгрузки.
+        name: Имя содержимого (файл в архиве), по которому определяется
+            формат; по умолчанию phone_file.
+
+    Yields:
+        Кортежи (номер, имя_файла).
+    """
+    name = name or phone_file
+    if upload_format(name) == '.txt':
+        lines = iter(file_)
+        batch = list(islice(lines, config.NORMALIZE_BATCH_SIZE))
+        while batch:
+            for line, norm_phone in zip(batch, normalize_phones(batch)):
+                if norm_phone:
+                    yield norm_phone, phone_file
+                    continue
+                phone = line.strip()
+                if not phone:
+                    log_row_event("Пустые строки в выгрузках", "Пустая строка в %s", name)
+                else:
+                    log_row_event("Некорректные номера в выгрузках", "Некорректный номер в %s: %s", name, phone)
+            batch = list(islice(lines, config.NORMALIZE_BATCH_SIZE))
+        return
+
+    reader = csv.reader(file_, delimiter=config.UPLOAD_DELIMITER, quoting=csv.QUOTE_MINIMAL)
+    header = next(reader, None)
+    if header is None:
+        log_verbose(f"Файл выгрузки пуст: {name}")
+        return
+    yield from _iter_csv_rows(reader, _phone_column(header, name), phone_file, name)
+
+def _phone_column(header: List[str], name: str) -> int:
+    """Возвращает индекс столбца с номерами по заголовку CSV (по умолчанию первый)."""
+    for idx, field in enumerate(header):
+        if field.lower() in [f.lower() for f in config.UPLOAD_PHONE_FIELDS]:
+            return idx
+    log_verbose(f"Столбец с номерами не найден в {name}, читаем первый столбец")
+    return 0
+
+def _iter_csv_rows(
+    rows: Iterable[List[str]], phone_col_idx: int, phone_file: str, name: str
+) -> Iterator[Tuple[str, str]]:
+    """Извлекает номера из строк CSV после заголовка.
+
+    Args:
+        rows: Строки CSV.
+        phone_col_idx: Индекс столбца с номерами.
+        phone_file: Путь к файлу выгрузки.
+        name: Имя содержимого для логов.
+
+    Yields:
+        Кортежи (номер, имя_файла).
+    """
+    for row in rows:
+        if not row or not row[phone_col_idx]:
+            log_row_event("Пустые строки в выгрузках", "Пустая строка в %s", name)
+            continue
+        norm_phone = normalize_phone_cached(row[phone_col_idx])
+        if not norm_phone:
+            log_row_event("Некорректные номера в выгрузках", "Некорректный номер в %s: %s",
+                          name, row[phone_col_idx].strip())
+            continue
+        yield norm_phone, phone_file
+
+def _iter_blocks(mapped: mmap.mmap) -> Iterator[bytes]:
+    """Делит отображённый в память файл на блоки по тем же границам, что и iter_decoded_lines.
+
+    Блок — config.DECODE_CHUNK_SIZE байт, дочитанные до конца строки.
+    """
+    size = len(mapped)
+    start = 0
+    while start < size:
+        end = start + config.DECODE_CHUNK_SIZE
+        if end < size and mapped[end - 1] != _NEWLINE:
+            newline = mapped.find(b'\n', end)
+            end = size if newline < 0 else newline + 1
+        yield mapped[start:end]
+        start = end
+
+def _iter_decoded_blocks(block: bytes, blocks: Iterator[bytes], codec: str, index: int,
+                         source: str) -> Iterator[str]:
+    """Декодирует текущий и оставшиеся блоки в строки, как iter_decoded_lines."""
+    yield from io.StringIO(block.decode(codec), newline='')
+    for block in blocks:  # pylint: disable=redefined-argument-from-local
+        text, index = decode_chunk(block, index, source)
+        yield from io.StringIO(text, newline='')
+
+def _column_digits(values: List[bytes]) -> List[str]:
+    """Оставляет в каждом значении только цифры ASCII одним вызовом bytes.translate.
+
+    Значения не содержат концов строк, поэтому склеиваются через b'\\n'.
+    """
+    if not values:
+        return []
+    return b'\n'.join(values).translate(None, NON_DIGITS_KEEP_NEWLINE).decode('ascii').split('\n')
+
+def _map_txt_block(block: bytes, codec: str, phone_file: str) -> Iterator[Tuple[str, str]]:
+    """Извлекает номера из блока .txt без построчного декодирования."""
+    lines = block.splitlines()
+    numbers = _column_digits(lines)
+    if block.isascii() and all(numbers):
+        yield from zip(numbers, repeat(phone_file))
+        return
+    for line, number in zip(lines, numbers):
+        if not line.isascii():
+            number = normalize_phone(line.decode(codec))
+        if number:
+            yield number, phone_file
+            continue
+        phone = line.decode(codec).strip()
+        if not phone:
+            log_row_event("Пустые строки в выгрузках", "Пустая строка в %s", phone_file)
+        else:
+            log_row_event("Некорректные номера в выгрузках", "Некорректный номер в %s: %s", phone_file, phone)
+
+def _map_csv_block(lines: List[bytes], block_is_ascii: bool, phone_col_idx: int, codec: str,
+                   phone_file: str) -> Iterator[Tuple[str, str]]:
+    """Извлекает номера из строк блока CSV без кавычек, разделяя строки по байтам."""
+    delimiter = config.UPLOAD_DELIMITER.encode('ascii')
+    try:
+        values = [line.split(delimiter, phone_col_idx + 1)[phone_col_idx] if line else b'' for line in lines]
+    except IndexError:
+        # Короткая строка: строки до неё выдаются, затем ошибка, как у csv.reader
+        rows = ([] if not line else [field.decode(codec) for field in line.split(delimiter)] for line in lines)
+        yield from _iter_csv_rows(rows, phone_col_idx, phone_file, phone_file)
+        return
+    numbers = _column_digits(values)
+    if block_is_ascii and all(numbers):
+        yield from zip(numbers, repeat(phone_file))
+        return
+    for value, number in zip(values, numbers):
+        if not value:
+            log_row_event("Пустые строки в выгрузках", "Пустая строка в %s", phone_file)
+            continue
+        if not value.isascii():
+            number = normalize_phone_cached(value.decode(codec))
+        if not number:
+            log_row_event("Некорректные номера в выгрузках", "Некорректный номер в %s: %s",
+                          phone_file, value.decode(codec).strip())
+            continue
+        yield number, phone_file
+
+def _iter_mapped_phones(mapped: mmap.mmap, phone_file: str) -> Iterator[Tuple[str, str]]:
+    """Извлекает номера из отображённого в память файла выгрузки на уровне байтов.
+
+    Результат и логи совпадают с разбором декодированных строк (_iter_phones):
+
+    - блоки и порядок подбора кодировки те же, что в iter_decoded_lines,
+      но блок только из ASCII не декодируется: в любой кодировке из
+      config.ENCODINGS он декодируется одинаково;
+    - строки делятся по b'\\n', b'\\r\\n' и b'\\r', как при newline='';
+    - номера очищаются одним bytes.translate на блок (.txt) или на
+      столбец блока (.csv); строки с не-ASCII байтами нормализуются
+      по одной после декодирования, чтобы учесть цифры Unicode;
+    - блок CSV с кавычками или NUL и все блоки после него разбираются
+      через csv.reader: до такого блока поля не могут быть незакрыты.
+
+    Args:
+        mapped: Отображённый в память файл.
+        phone_file: Путь к файлу выгрузки.
+
+    Yields:
+        Кортежи (номер, имя_файла).
+
+    Raises:
+        UnicodeDecodeError: Если блок не декодируется ни в одной кодировке.
+    """
+    is_txt = upload_format(phone_file) == '.txt'
+    blocks = _iter_blocks(mapped)
+    index = None
+    phone_col_idx = None
+    for block in blocks:
+        if index is None:
+            index = 0 if block.isascii() else decode_chunk(block, 0, phone_file, is_first=True)[1]
+            log_verbose(f"Кодировка {phone_file}: {config.ENCODINGS[index]}")
+            if config.ENCODINGS[index] == 'utf-8-sig' and block.startswith(codecs.BOM_UTF8):
+                block = block[len(codecs.BOM_UTF8):]
+        elif not block.isascii():
+            index = decode_chunk(block, index, phone_file)[1]
+        codec = 'utf-8' if config.ENCODINGS[index] == 'utf-8-sig' else config.ENCODINGS[index]
+
+        if is_txt:
+            yield from _map_txt_block(block, codec, phone_file)
+            continue
+
+        lines = block.splitlines()
+        if b'"' in block or b'\x00' in block or max(map(len, lines), default=0) > csv.field_size_limit():
+            lines = _iter_decoded_blocks(block, blocks, codec, index, phone_file)
+            if phone_col_idx is None:
+                yield from _iter_phones(lines, phone_file)
+            else:
+                reader = csv.reader(lines, delimiter=config.UPLOAD_DELIMITER, quoting=csv.QUOTE_MINIMAL)
+                yield from _iter_csv_rows(reader, phone_col_idx, phone_file, phone_file)
+            return
+        if phone_col_idx is None:
+            if not lines:
+                log_verbose(f"Файл выгрузки пуст: {phone_file}")
+                return
+            header = [field.decode(codec) for field in lines[0].split(config.UPLOAD_DELIMITER.encode('ascii'))]
+            phone_col_idx = _phone_column(header if lines[0] else [], phone_file)
+            lines = lines[1:]
+        yield from _map_csv_block(lines, block.isascii(), phone_col_idx, codec, phone_file)
+
+def _iter_mapped_file(phone_file: str) -> Iterator[Tuple[str, str]]:
+    """Отображает несжатый файл выгрузки в память и извлекает номера (_iter_mapped_phones)."""
+    with open(phone_file, 'rb') as file_:
+        if os.fstat(file_.fileno()).st_size == 0:
+            # mmap не отображает пустые файлы
+            yield from _iter_phones([], phone_file)
+            return
+        with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from _iter_mapped_phones(mapped, phone_file)
+
+def iter_phone_file(phone_file: str) -> Iterator[Tuple[str, str]]:
+    """Построчно читает файл выгрузки, не загружая его в память целиком.
+
+    Кодировка подбирается за один проход (см. iter_decoded_lines).
+    Несжатые файлы при config.MMAP_UPLOADS разбираются через mmap на
+    уровне байтов (см. _iter_mapped_phones) с тем же результатом.
+    Сжатые выгрузки и архивы .zip распаковываются потоково (см.
+    iter_upload_streams); номера файлов архива выдаются с путём архива.
+
+    Args:
+        phone_file: Путь к файлу выгрузки.
+
+    Yields:
+        Кортежи (номер, имя_файла).
+
+    Raises:
+        FileNotFoundError: Если файл не найден.
+        ValueError: Если сжатый файл повреждён.
+    """
+    try:
+        if config.MMAP_UPLOADS and not split_compression(phone_file)[1]:
+            yield from _iter_mapped_file(phone_file)
+            return
+        for name, stream in iter_upload_streams(phone_file):
+            yield from _iter_phones(iter_decoded_lines(stream, name), phone_file, name)
+    except UnicodeDecodeError:
+        log_error(f"Не удалось прочитать {phone_file} ни в одной кодировке")
+    except FileNotFoundError:
+        log_error(f"Файл выгрузки не найден: {phone_file}")
+        raise
+    except COMPRESSION_ERRORS as exc:
+        log_error(f"Повреждённый сжатый файл {phone_file}: {exc}")
+        raise ValueError(f"Повреждённый сжатый файл: {phone_file}") from exc
+    except Exception as exc:
+        log_error(f"Ошибка чтения {phone_file}: {exc}")
+        raise
 
 def parse_phone_file(phone_file: str) -> List[Tuple[str, str]]:
     """Читает файл выгрузки и извлекает номера.
@@ -16,63 +283,98 @@ def parse_phone_file(phone_file: str) -> List[Tuple[str, str]]:
     Raises:
         FileNotFoundError: Если файл не найден.
     """
-    phones = []
-
-    for encoding in config.ENCODINGS:
-        try:
-            with open(phone_file, newline='', encoding=encoding) as file_:
-                if phone_file.endswith('.txt'):
-                    lines = file_.readlines()
-                    for line in lines:
-                        phone = line.strip()
-                        if not phone:
-                            log_verbose(f"Пустая строка в {phone_file}")
-                            continue
-                        norm_phone = normalize_phone(phone)
-                        if not norm_phone:
-                            log_verbose(f"Некорректный номер в {phone_file}: {phone}")
-                            continue
-                        phones.append((norm_phone, phone_file))
-                    return phones
-
-                reader = csv.reader(file_, delimiter=config.UPLOAD_DELIMITER, quoting=csv.QUOTE_MINIMAL)
-                header = next(reader, None)
-                if header is None:
-                    log_verbose(f"Файл выгрузки пуст: {phone_file}")
-                    return phones
-
-                phone_col_idx = None
-                for idx, field in enumerate(header):
-                    if field.lower() in [f.lower() for f in config.UPLOAD_PHONE_FIELDS]:
-                        phone_col_idx = idx
-                        break
-
-                if phone_col_idx is None:
-                    log_verbose(f"Столбец с номерами не найден в {phone_file}, читаем первый столбец")
-                    file_.seek(0)
-                    reader = csv.reader(file_, delimiter=config.UPLOAD_DELIMITER, quoting=csv.QUOTE_MINIMAL)
-                    next(reader, None)
-                    phone_col_idx = 0
-
-                for row in reader:
-                    if not row or not row[phone_col_idx]:
-                        log_verbose(f"Пустая строка в {phone_file}")
-                        continue
-                    phone = row[phone_col_idx].strip()
-                    norm_phone = normalize_phone(phone)
-                    if not norm_phone:
-                        log_verbose(f"Некорректный номер в {phone_file}: {phone}")
-                        continue
-                    phones.append((norm_phone, phone_file))
-                return phones
-        except UnicodeDecodeError:
-            log_verbose(f"Ошибка кодировки {encoding} в {phone_file}, пробую следующую")
-            continue
-        except FileNotFoundError:
-            log_error(f"Файл выгрузки не найден: {phone_file}")
-            raise
-        except Exception as exc:
-            log_error(f"Ошибка чтения {phone_file}: {exc}")
-            raise
-    log_error(f"Не удалось прочитать {phone_file} ни в одной кодировке")
-    return phones
+    return list(iter_phone_file(phone_file))
+
+def count_phone_file(phone_file: str) -> Dict[str, int]:
+    """Читает файл выгрузки и считает вхождения каждого номера.
+
+    Args:
+        phone_file: Путь к файлу выгрузки.
+
+    Returns:
+        Словарь {номер: количество вхождений} в порядке первого появления.
+
+    Raises:
+        FileNotFoundError: Если файл не найден.
+    """
+    return Counter(phone for phone, _ in iter_phone_file(phone_file))
+
+def merge_phone_counts(occurrences: Dict[str, list], counts: Dict[str, int], phone_file: str) -> None:
+    """Добавляет счётчики номеров файла к общим.
+
+    Args:
+        occurrences: Общий словарь {номер: [количество, [файлы]]}, дополняется на месте.
+        counts: Словарь {номер: количество} из count_phone_file.
+        phone_file: Путь к файлу выгрузки.
+    """
+    for phone, count in counts.items():
+        entry = occurrences.get(phone)
+        if entry is None:
+            occurrences[phone] = [count, [phone_file]]
+        else:
+            entry[0] += count
+            entry[1].append(phone_file)
+
+PhoneFileResult = Union[List[Tuple[str, str]], Dict[str, int]]
+
+def _parse_phone_file_job(
+    phone_file: str, counted: bool = False
+) -> Tuple[Optional[PhoneFileResult], list, Optional[Exception]]:
+    """Разбирает файл выгрузки в процессе-воркере.
+
+    Args:
+        phone_file: Путь к файлу выгрузки.
+        counted: Вернуть счётчики номеров вместо списка.
+
+    Returns:
+        Кортеж: (список номеров или счётчики, либо None; записи лога; ошибка или None).
+    """
+    try:
+        phones = count_phone_file(phone_file) if counted else parse_phone_file(phone_file)
+        return phones, drain_worker_logs(), None
+    except (OSError, ValueError) as exc:
+        return None, drain_worker_logs(), exc
+
+def parse_phone_files(
+    phone_files: List[str], workers: int = 1, counted: bool = False
+) -> Iterator[Tuple[str, Optional[PhoneFileResult], Optional[Exception]]]:
+    """Разбирает файлы выгрузки, при workers > 1 — в пуле процессов.
+
+    Результаты и логи каждого файла выдаются строго в порядке phone_files.
+    В пуле одновременно находится не более 2 * workers файлов, поэтому
+    разобранные, но ещё не обработанные номера не накапливаются.
+
+    Args:
+        phone_files: Список путей к файлам выгрузки.
+        workers: Количество процессов.
+        counted: Выдавать счётчики {номер: количество} (count_phone_file)
+            вместо списков номеров; из воркеров передаются только
+            уникальные номера.
+
+    Yields:
+        Кортежи (путь, список номеров или счётчики либо None, ошибка или None).
+    """
+    parse = count_phone_file if counted else parse_phone_file
+    if workers <= 1:
+        for phone_file in phone_files:
+            try:
+                yield phone_file, parse(phone_file), None
+            except (OSError, ValueError) as exc:
+                yield phone_file, None, exc
+        return
+
+    files = iter(phone_files)
+    with ProcessPoolExecutor(max_workers=workers, initializer=capture_worker_logs,
+                             initargs=(is_row_event_aggregation_enabled(),)) as executor:
+        pending = deque(
+            (phone_file, executor.submit(_parse_phone_file_job, phone_file, counted))
+            for phone_file in islice(files, workers * 2)
+        )
+        while pending:
+            phone_file, future = pending.popleft()
+            phones, records, exc = future.result()
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append((next_file, executor.submit(_parse_phone_file_job, next_file, counted)))
+            replay_log_records(records)
+            yield phone_file, phones, exc
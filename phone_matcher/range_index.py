@@ -0,0 +1,160 @@
+import csv
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+from . import config
+from .encoding import iter_decoded_lines
+from .utils import log_error, log_verbose
+
+RANGE_WILDCARDS = 'xX*'
+
+Record = Tuple[str, str, str]
+
+
+def parse_range(spec: str) -> Tuple[int, int, int]:
+    """Разбирает диапазон номеров.
+
+    Поддерживаются блоки с подстановочными знаками в конце ("495123xxxx")
+    и явные границы одинаковой длины ("4951230000-4951239999").
+
+    Args:
+        spec: Описание диапазона.
+
+    Returns:
+        Кортеж: (длина номера, начало, конец).
+
+    Raises:
+        ValueError: Если диапазон некорректен.
+    """
+    spec = spec.strip()
+    if any(char in spec for char in RANGE_WILDCARDS):
+        prefix = spec.rstrip(RANGE_WILDCARDS)
+        wildcards = len(spec) - len(prefix)
+        if any(char in prefix for char in RANGE_WILDCARDS) or prefix and not prefix.isdigit():
+            raise ValueError(f"подстановочные знаки допустимы только в конце: {spec}")
+        first, last = prefix + '0' * wildcards, prefix + '9' * wildcards
+    else:
+        first, _, last = spec.partition('-')
+        first, last = first.strip(), last.strip() or first.strip()
+    if not (first.isdigit() and last.isdigit()) or len(first) != len(last):
+        raise ValueError(f"границы диапазона должны быть цифрами одинаковой длины: {spec}")
+    if len(first) < config.VALID_PHONE_NUMBER_LENGTH:
+        raise ValueError(f"диапазон короче {config.VALID_PHONE_NUMBER_LENGTH} цифр: {spec}")
+    start, end = int(first), int(last)
+    if start > end:
+        raise ValueError(f"начало диапазона больше конца: {spec}")
+    return len(first), start, end
+
+
+class RangeIndex:
+    """Индекс диапазонов номеров (блоков DID) с поиском двоичным поиском.
+
+    Диапазоны хранятся отсортированными по (длина, начало); вложенные
+    диапазоны допускаются, и номер относится к самому узкому из них.
+    Частично пересекающиеся диапазоны отклоняются при добавлении.
+    """
+    def __init__(self, entries: List[Tuple[str, Record]]):
+        """Строит индекс.
+
+        Args:
+            entries: Список (описание диапазона, (ФИО, email, Enabled)).
+                Записи с одинаковым диапазоном объединяются.
+        """
+        by_range = {}
+        for spec, record in entries:
+            try:
+                key = parse_range(spec)
+            except ValueError as exc:
+                log_error(f"Пропущен диапазон: {exc}")
+                continue
+            by_range.setdefault(key, (spec.strip(), []))[1].append(record)
+
+        self._starts = []
+        self._ends = []
+        self._specs = []
+        self._records = []
+        self._parents = []
+        stack = []
+        for length, start, end in sorted(by_range, key=lambda key: (key[0], key[1], -key[2])):
+            while stack and (self._starts[stack[-1]][0] != length or self._ends[stack[-1]] < start):
+                stack.pop()
+            parent = stack[-1] if stack else -1
+            if parent >= 0 and self._ends[parent] < end:
+                log_error(f"Пропущен диапазон {by_range[(length, start, end)][0]}: "
+                          f"пересекается с {self._specs[parent]}")
+                continue
+            spec, records = by_range[(length, start, end)]
+            stack.append(len(self._starts))
+            self._starts.append((length, start))
+            self._ends.append(end)
+            self._specs.append(spec)
+            self._records.append(records)
+            self._parents.append(parent)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def find(self, phone: str) -> Optional[Tuple[str, List[Record]]]:
+        """Ищет самый узкий диапазон, в который попадает номер.
+
+        Args:
+            phone: Нормализованный номер.
+
+        Returns:
+            Кортеж (описание диапазона, записи) или None.
+        """
+        length, value = len(phone), int(phone)
+        position = bisect_right(self._starts, (length, value)) - 1
+        if position < 0 or self._starts[position][0] != length:
+            return None
+        # Диапазоны, содержащие номер, — это найденный диапазон и его предки
+        while position >= 0 and self._ends[position] < value:
+            position = self._parents[position]
+        if position < 0:
+            return None
+        return self._specs[position], self._records[position]
+
+
+def parse_ranges_file(ranges_file: str) -> RangeIndex:
+    """Читает файл диапазонов и строит индекс.
+
+    Формат как у AD-файла (разделитель config.AD_DELIMITER): столбец
+    config.RANGE_FIELD с диапазоном и столбцы ФИО, email и Enabled из
+    config.AD_FIELDS.
+
+    Args:
+        ranges_file: Путь к файлу диапазонов.
+
+    Returns:
+        Индекс диапазонов.
+
+    Raises:
+        FileNotFoundError: Если файл не найден.
+        ValueError: Если заголовок некорректен или файл не декодируется.
+    """
+    fields = [config.RANGE_FIELD, config.AD_FIELDS['display_name'], config.AD_FIELDS['email'],
+              config.AD_FIELDS['enabled']]
+    try:
+        with open(ranges_file, 'rb') as file_:
+            reader = csv.reader(iter_decoded_lines(file_, ranges_file), delimiter=config.AD_DELIMITER)
+            header = [field.strip().strip('\ufeff').strip('"') for field in next(reader, [])]
+            if not all(field in header for field in fields):
+                log_error(f"Некорректный заголовок в файле диапазонов: {ranges_file}, ожидалось: {fields}")
+                raise ValueError("Некорректный формат файла диапазонов")
+            positions = [header.index(field) for field in fields]
+            min_length = max(positions) + 1
+            entries = []
+            for row in reader:
+                if len(row) < min_length:
+                    if row:
+                        log_verbose(f"Пропущена строка в файле диапазонов: {row}")
+                    continue
+                spec, display_name, email, enabled = (row[position] for position in positions)
+                entries.append((spec, (display_name, email, enabled)))
+    except UnicodeDecodeError as exc:
+        log_error(f"Не удалось прочитать {ranges_file} ни в одной кодировке")
+        raise ValueError("Невозможно декодировать файл диапазонов") from exc
+    except FileNotFoundError:
+        log_error(f"Файл диапазонов не найден: {ranges_file}")
+        raise
+    return RangeIndex(entries)
@@ -0,0 +1,136 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Mapping, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from . import config
+from .ad_index import AdIndex
+from .match import lookup_phone
+from .utils import log_error, log_info, log_verbose
+
+
+def lookup_result(query: str, ad_data: Mapping[str, List[Tuple[str, str, str]]]) -> dict:
+    """Формирует ответ на поиск одного номера.
+
+    Args:
+        query: Номер в исходном виде.
+        ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+
+    Returns:
+        Словарь {"query", "phone", "found", "records"}; phone = None для
+        некорректного номера. Если индекс собран из нескольких AD-файлов,
+        у каждой записи есть поле "domain".
+    """
+    phone, records = lookup_phone(query, ad_data)
+    result = {
+        'query': query,
+        'phone': phone,
+        'found': bool(records),
+        'records': [
+            {'name': display_name, 'email': email, 'enabled': enabled}
+            for display_name, email, enabled in records
+        ],
+    }
+    if records and isinstance(ad_data, AdIndex) and len(ad_data.domains) > 1:
+        for record, domain in zip(result['records'], ad_data.record_domains(phone)):
+            record['domain'] = domain
+    return result
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """Обрабатывает запросы поиска номеров.
+
+    GET /lookup?phone=...&phone=... — поиск одного или нескольких номеров.
+    POST /lookup с JSON {"phones": [...]} — пакетный поиск.
+    GET /health — состояние сервиса.
+    """
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ADPhoneMatcher'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            self._send_json(200, {'status': 'ok', 'phones': len(self.server.ad_data)})
+        elif url.path == '/lookup':
+            self._send_lookup(parse_qs(url.query).get('phone', []))
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        if urlsplit(self.path).path != '/lookup':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= config.SERVER_MAX_BODY_SIZE:
+            self.close_connection = True
+            self._send_json(413, {'error': 'invalid or too large request body'})
+            return
+        try:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+            phones = body['phones']
+            if not isinstance(phones, list) or not all(isinstance(phone, str) for phone in phones):
+                raise TypeError("phones должен быть списком строк")
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send_json(400, {'error': f'invalid request: {exc}'})
+            return
+        self._send_lookup(phones)
+
+    def _send_lookup(self, phones: List[str]):
+        if not phones:
+            self._send_json(400, {'error': 'no phones given'})
+            return
+        if len(phones) > config.SERVER_MAX_BATCH:
+            self._send_json(413, {'error': f'too many phones, limit {config.SERVER_MAX_BATCH}'})
+            return
+        ad_data = self.server.ad_data
+        self._send_json(200, {'results': [lookup_result(phone, ad_data) for phone in phones]})
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        # Запросы обрабатываются в отдельных потоках, поэтому пишутся в лог
+        # сразу, а не через агрегацию построчных событий (log_row_event)
+        log_verbose(f"{self.address_string()} {format % args}")
+
+
+class LookupServer(ThreadingHTTPServer):
+    """HTTP-сервер поиска номеров по индексу AD в памяти."""
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], ad_data: Mapping[str, List[Tuple[str, str, str]]]):
+        super().__init__(address, LookupRequestHandler)
+        self.ad_data = ad_data
+
+
+def serve(ad_data: Mapping[str, List[Tuple[str, str, str]]], host: str, port: int) -> None:
+    """Запускает сервис поиска и обслуживает запросы до прерывания (Ctrl+C).
+
+    Args:
+        ad_data: Словарь {номер: [(ФИО, email, Enabled), ...]}.
+        host: Адрес для прослушивания.
+        port: Порт.
+
+    Raises:
+        OSError: Если не удаётся занять адрес.
+    """
+    try:
+        server = LookupServer((host, port), ad_data)
+    except OSError as exc:
+        log_error(f"Не удалось запустить сервис поиска на {host}:{port}: {exc}")
+        raise
+    log_info(f"Сервис поиска запущен на http://{server.server_address[0]}:{server.server_address[1]}/lookup")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log_info("Сервис поиска остановлен")
+    finally:
+        server.server_close()
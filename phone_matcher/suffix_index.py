@@ -0,0 +1,44 @@
+from bisect import bisect_right
+from os.path import commonprefix
+from typing import Iterable, Optional
+
+
+class SuffixIndex:
+    """Индекс поиска номеров AD, которыми заканчивается номер выгрузки.
+
+    Номера AD хранятся развёрнутыми в отсортированном списке: номер AD
+    является окончанием номера выгрузки, если его развёрнутая запись —
+    префикс развёрнутого номера выгрузки. Самый длинный такой номер
+    находится двоичным поиском; каждый следующий шаг поиска укорачивает
+    искомый префикс, поэтому шагов не больше, чем цифр в номере.
+    """
+    __slots__ = ('_keys',)
+
+    def __init__(self, phones: Iterable[str]):
+        self._keys = sorted(phone[::-1] for phone in phones)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def find(self, phone: str) -> Optional[str]:
+        """Ищет самый длинный номер AD, которым заканчивается phone.
+
+        Args:
+            phone: Нормализованный номер выгрузки.
+
+        Returns:
+            Номер AD (может совпадать с phone) или None.
+        """
+        keys = self._keys
+        key = phone[::-1]
+        while key:
+            position = bisect_right(keys, key) - 1
+            if position < 0:
+                return None
+            candidate = keys[position]
+            if key.startswith(candidate):
+                return candidate[::-1]
+            # Более длинные подходящие номера были бы больше candidate,
+            # поэтому ответ — префикс общей части candidate и key
+            key = key[:len(commonprefix((candidate, key)))]
+        return None
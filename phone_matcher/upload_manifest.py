@@ -0,0 +1,261 @@
+import os
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from . import config
+from .ad_cache import hash_file
+from .parse_phone import PhoneFileResult
+from .utils import ensure_dir, log_error, log_verbose
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    phones INTEGER NOT NULL
+) WITHOUT ROWID
+'''
+_SIZE_INDEX = 'CREATE INDEX IF NOT EXISTS uploads_size ON uploads (size)'
+_FILES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+) WITHOUT ROWID
+'''
+_PENDING_SUFFIX = '.pending'
+
+
+class UploadManifest:
+    """Манифест обработанных выгрузок: отпечаток содержимого и сохранённые номера (SQLite).
+
+    Для каждого обработанного содержимого хранятся размер и хеш файла,
+    путь первого файла с этим содержимым, даты первой и последней встречи
+    и файл с нормализованными номерами и количеством их вхождений
+    в config.UPLOAD_CACHE_DIR. Хеш файла выгрузки считается, только если
+    в манифесте или в том же прогоне есть файл того же размера. Посчитанные
+    хеши сохраняются в таблице files с размером и временем изменения файла
+    и не пересчитываются, пока они не изменились.
+
+    record() и load_numbers() только накапливают изменения: они попадают
+    в манифест с датой вызова commit() после записи результата, а
+    rollback() их отменяет. Поэтому файлы прогона, не дошедшего до
+    результата, не считаются обработанными, а их номера не остаются на диске.
+    """
+    def __init__(self, skip: bool = False, db_path: Optional[str] = None, cache_dir: Optional[str] = None):
+        """Открывает манифест, удаляет устаревшие записи и номера без записей.
+
+        Args:
+            skip: Пропускать файлы с уже обработанным содержимым, а не
+                брать их номера из манифеста.
+            db_path: Путь к базе манифеста, по умолчанию config.UPLOAD_MANIFEST_DB.
+            cache_dir: Папка номеров, по умолчанию config.UPLOAD_CACHE_DIR.
+        """
+        db_path = db_path or config.UPLOAD_MANIFEST_DB
+        ensure_dir(os.path.dirname(db_path))
+        self.skip = skip
+        self.cache_dir = cache_dir or config.UPLOAD_CACHE_DIR
+        self._hashes = {}
+        self._recorded = {}
+        self._seen = set()
+        self._pruned_at = 0.0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_SIZE_INDEX)
+        self._conn.execute(_FILES_SCHEMA)
+        self._conn.commit()
+        self._prune()
+        self._remove_orphans()
+
+    def __enter__(self) -> 'UploadManifest':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM uploads').fetchone()[0]
+
+    def _prune(self) -> None:
+        """Удаляет записи о содержимом и хеши файлов, не встречавшиеся config.UPLOAD_MANIFEST_MAX_AGE_DAYS дней."""
+        self._pruned_at = time.monotonic()
+        cutoff = (datetime.now() - timedelta(days=config.UPLOAD_MANIFEST_MAX_AGE_DAYS)).strftime(config.DATE_FORMAT)
+        stale = [row[0] for row in self._conn.execute('SELECT hash FROM uploads WHERE last_seen < ?', (cutoff,))]
+        self._conn.execute('DELETE FROM files WHERE last_seen < ?', (cutoff,))
+        self._conn.executemany('DELETE FROM uploads WHERE hash = ?', [(digest,) for digest in stale])
+        self._conn.commit()
+        if not stale:
+            return
+        for digest in stale:
+            if os.path.exists(self._numbers_path(digest)):
+                os.remove(self._numbers_path(digest))
+        log_verbose(f"Удалено устаревших записей манифеста выгрузок: {len(stale)}")
+
+    def _remove_orphans(self) -> None:
+        """Удаляет номера без записи в манифесте, оставшиеся после аварийного завершения.
+
+        Файлы моложе config.UPLOAD_MANIFEST_ORPHAN_AGE секунд не удаляются:
+        это могут быть ещё не зафиксированные номера другого процесса,
+        работающего с тем же манифестом (--watch или параллельный прогон).
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        known = {row[0] for row in self._conn.execute('SELECT hash FROM uploads')}
+        cutoff = time.time() - config.UPLOAD_MANIFEST_ORPHAN_AGE
+        orphans = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.split('.', 1)[0] in known:
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    orphans.append(entry.name)
+            except FileNotFoundError:
+                continue
+        if orphans:
+            log_verbose(f"Удалено файлов номеров без записей манифеста выгрузок: {len(orphans)}")
+
+    def _numbers_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.txt")
+
+    def _digest(self, file_path: str, stat: os.stat_result) -> str:
+        """Возвращает хеш содержимого файла, не пересчитывая его для неизменившегося файла.
+
+        Хеш ищется среди посчитанных в этом прогоне, затем в таблице files;
+        новые хеши сохраняются в ней при commit().
+        """
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._hashes.get(file_path)
+        if cached is None:
+            cached = self._conn.execute('SELECT size, mtime_ns, hash FROM files WHERE path = ?',
+                                        (file_path,)).fetchone()
+        if cached is not None and tuple(cached[:2]) == signature:
+            digest = cached[2]
+        else:
+            digest = hash_file(file_path)
+        self._hashes[file_path] = signature + (digest,)
+        return digest
+
+    def find_duplicates(self, phone_files: List[str]) -> Dict[str, dict]:
+        """Ищет файлы, содержимое которых уже обработано или повторяет более ранний файл списка.
+
+        Args:
+            phone_files: Пути к файлам выгрузки в порядке обработки.
+
+        Returns:
+            Словарь {файл: {"hash", "source", "processed"}}: source — файл
+            с тем же содержимым, processed — дата его обработки или None,
+            если это более ранний файл того же списка.
+        """
+        stats = {}
+        sizes = Counter()
+        for phone_file in phone_files:
+            try:
+                stats[phone_file] = os.stat(phone_file)
+            except OSError:
+                continue
+            sizes[stats[phone_file].st_size] += 1
+
+        duplicates = {}
+        first_files = {}
+        for phone_file, stat in stats.items():
+            known = self._conn.execute('SELECT hash, source, first_seen FROM uploads WHERE size = ?',
+                                       (stat.st_size,)).fetchall()
+            if not known and sizes[stat.st_size] == 1:
+                continue
+            try:
+                digest = self._digest(phone_file, stat)
+            except OSError:
+                continue
+            match = next((row for row in known if row[0] == digest), None)
+            if match is not None and os.path.exists(self._numbers_path(digest)):
+                duplicates[phone_file] = {'hash': digest, 'source': match[1], 'processed': match[2]}
+            elif digest in first_files:
+                duplicates[phone_file] = {'hash': digest, 'source': first_files[digest], 'processed': None}
+            else:
+                first_files[digest] = phone_file
+        return duplicates
+
+    def load_numbers(self, entry: dict) -> Dict[str, int]:
+        """Читает сохранённые номера обработанного содержимого; встреча отмечается в commit().
+
+        Args:
+            entry: Запись из find_duplicates с processed.
+
+        Returns:
+            Словарь {номер: количество вхождений}.
+        """
+        with open(self._numbers_path(entry['hash']), 'r', encoding='utf-8') as file_:
+            fields = file_.read().split()
+        self._seen.add(entry['hash'])
+        return dict(zip(fields[::2], map(int, fields[1::2])))
+
+    def record(self, phone_file: str, file_phones: PhoneFileResult) -> None:
+        """Добавляет разобранный файл в манифест при следующем commit().
+
+        Номера записываются во временный файл, который переименовывается
+        в commit() и удаляется в rollback().
+
+        Args:
+            phone_file: Путь к файлу выгрузки.
+            file_phones: Номера файла — список (номер, файл) или словарь {номер: количество}.
+        """
+        stat = os.stat(phone_file)
+        digest = self._digest(phone_file, stat)
+        counts = file_phones if isinstance(file_phones, dict) else Counter(phone for phone, _ in file_phones)
+        ensure_dir(self.cache_dir)
+        with open(self._numbers_path(digest) + _PENDING_SUFFIX, 'w', encoding='utf-8',
+                  buffering=config.OUTPUT_BUFFER_SIZE) as file_:
+            file_.writelines(f"{phone}\t{count}\n" for phone, count in counts.items())
+        self._recorded[digest] = (stat.st_size, phone_file, len(counts))
+
+    def commit(self, timestamp: Optional[str] = None) -> None:
+        """Фиксирует накопленные изменения манифеста.
+
+        Args:
+            timestamp: Дата встречи содержимого, по умолчанию — текущее время.
+        """
+        timestamp = timestamp or datetime.now().strftime(config.DATE_FORMAT)
+        recorded = []
+        for digest, (size, source, phones) in self._recorded.items():
+            try:
+                os.replace(self._numbers_path(digest) + _PENDING_SUFFIX, self._numbers_path(digest))
+            except FileNotFoundError:
+                log_error(f"Номера {source} не добавлены в манифест выгрузок: временный файл номеров удалён")
+                continue
+            recorded.append((digest, size, source, timestamp, timestamp, phones))
+        self._conn.executemany('INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)', recorded)
+        self._conn.executemany('UPDATE uploads SET last_seen = ? WHERE hash = ?',
+                               [(timestamp, digest) for digest in self._seen])
+        self._conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                               [(path, size, mtime_ns, digest, timestamp)
+                                for path, (size, mtime_ns, digest) in self._hashes.items()])
+        self._conn.commit()
+        self._reset()
+        if time.monotonic() - self._pruned_at >= config.UPLOAD_MANIFEST_PRUNE_INTERVAL:
+            self._prune()
+
+    def rollback(self) -> None:
+        """Отменяет накопленные изменения манифеста и удаляет их временные файлы номеров."""
+        for digest in self._recorded:
+            pending_path = self._numbers_path(digest) + _PENDING_SUFFIX
+            if os.path.exists(pending_path):
+                os.remove(pending_path)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._recorded.clear()
+        self._seen.clear()
+        self._hashes.clear()
+
+    def close(self) -> None:
+        """Закрывает манифест; незафиксированные изменения отменяются."""
+        self.rollback()
+        self._conn.close()
@@ -1,27 +1,39 @@
+import atexit
 import logging
+import logging.handlers
 import os
 import glob
-import shutil
+import queue
+import time
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 from . import config
 
 class RelativePathFormatter(logging.Formatter):
-    """Форматирует сообщения, заменяя абсолютные пути на относительные для консоли."""
+    """Форматирует сообщения, заменяя абсолютные пути на относительные для консоли.
+
+    Пути ищутся в сообщении после подстановки аргументов (record.getMessage()),
+    поэтому заменяются и пути, переданные аргументами %-шаблона.
+    """
     def format(self, record):
-        message = record.msg
-        base_dir = config.BASE_DIR
-        for word in message.split():
-            if os.path.isabs(word):
-                rel_path = os.path.relpath(word, base_dir)
-                message = message.replace(word, f"./{rel_path}")
-        record.msg = message
+        message = record.getMessage()
+        # Сообщения без разделителя пути не разбиваются на слова
+        if os.sep in message:
+            base_dir = config.BASE_DIR
+            for word in message.split():
+                if word[0] == os.sep and os.path.isabs(word):
+                    rel_path = os.path.relpath(word, base_dir)
+                    message = message.replace(word, f"./{rel_path}")
+            # Запись общая для всех обработчиков: изменяется копия
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = message
+            record.args = None
         return super().format(record)
 
-def manage_log_files(logs_dir: str, log_file: str) -> None:
-    """Удаляет самые старые лог-файлы, чтобы осталось не более config.MAX_LOGS."""
+def manage_log_files(logs_dir: str, log_file: str, pattern: str = "matcher_*.log") -> None:
+    """Удаляет самые старые файлы по шаблону, чтобы осталось не более config.MAX_LOGS."""
     os.makedirs(logs_dir, exist_ok=True)
-    log_files = sorted(glob.glob(os.path.join(logs_dir, "matcher_*.log")), key=os.path.getmtime)
+    log_files = sorted(glob.glob(os.path.join(logs_dir, pattern)), key=os.path.getmtime)
     if log_file not in log_files:
         log_files.append(log_file)
     if len(log_files) >= config.MAX_LOGS:
@@ -32,8 +44,20 @@ def manage_log_files(logs_dir: str, log_file: str) -> None:
             except (OSError, PermissionError) as exc:
                 logging.getLogger().error("Ошибка удаления старого лога %s: %s", old_log, exc)
 
-def setup_logger(verbose: bool) -> None:
-    """Настраивает логгер для вывода в консоль и файл."""
+_log_listener = None
+_row_events = None
+_row_events_flushed_at = 0.0
+
+def setup_logger(verbose: bool, queued: bool = False) -> None:
+    """Настраивает логгер для вывода в консоль и файл.
+
+    Args:
+        verbose: Выводить DEBUG-сообщения в консоль.
+        queued: Фоновый режим: записи передаются через очередь в отдельный
+            поток, который пишет их в файл и консоль, а построчные
+            DEBUG-события агрегируются (см. log_row_event).
+    """
+    stop_logger()
     logs_dir = config.LOGS_DIR
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_file = os.path.join(logs_dir, f"matcher_{timestamp}.log")
@@ -57,6 +81,84 @@ def setup_logger(verbose: bool) -> None:
     console_handler.setFormatter(console_formatter)
     logger.addHandler(console_handler)
 
+    if queued:
+        start_queued_logging(logger)
+        set_row_event_aggregation(True)
+
+def start_queued_logging(logger: logging.Logger) -> None:
+    """Переносит обработчики логгера в фоновый поток через очередь.
+
+    Args:
+        logger: Логгер, обработчики которого переносятся.
+    """
+    global _log_listener  # pylint: disable=global-statement
+    log_queue = queue.Queue()
+    _log_listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _log_listener.start()
+    atexit.register(stop_logger)
+
+def stop_logger() -> None:
+    """Сбрасывает агрегированные события и останавливает фоновый поток логов.
+
+    Обработчики файла и консоли возвращаются корневому логгеру.
+    """
+    global _log_listener  # pylint: disable=global-statement
+    flush_row_events()
+    if _log_listener is not None:
+        _log_listener.stop()
+        logging.getLogger().handlers = list(_log_listener.handlers)
+        _log_listener = None
+    set_row_event_aggregation(False)
+
+def set_row_event_aggregation(enabled: bool) -> None:
+    """Включает или выключает агрегацию построчных DEBUG-событий."""
+    global _row_events, _row_events_flushed_at  # pylint: disable=global-statement
+    _row_events = {} if enabled else None
+    _row_events_flushed_at = time.monotonic()
+
+def is_row_event_aggregation_enabled() -> bool:
+    """Возвращает True, если построчные события агрегируются."""
+    return _row_events is not None
+
+def log_row_event(category: str, message: str, *args) -> None:
+    """Логирует построчное DEBUG-событие (номер найден, пустая строка и т.п.).
+
+    По умолчанию событие сразу пишется в лог. В агрегированном режиме
+    сообщение не форматируется: считается количество событий по категории
+    и сохраняются первые config.LOG_ROW_SAMPLES примеров, а итог пишется
+    в лог раз в config.LOG_ROW_FLUSH_INTERVAL секунд и в flush_row_events.
+    Агрегация не потокобезопасна: события вызываются из основного потока
+    процесса (и процессов-воркеров пула).
+
+    Args:
+        category: Описание категории событий для итоговой записи.
+        message: Шаблон сообщения в стиле %.
+        *args: Аргументы шаблона.
+    """
+    if _row_events is None:
+        logging.getLogger().debug(message, *args)
+        return
+    entry = _row_events.get(category)
+    if entry is None:
+        entry = _row_events[category] = [0, []]
+    entry[0] += 1
+    if len(entry[1]) < config.LOG_ROW_SAMPLES:
+        entry[1].append(message % args)
+    elif (entry[0] % config.LOG_ROW_FLUSH_CHECK_EVERY == 0
+          and time.monotonic() - _row_events_flushed_at >= config.LOG_ROW_FLUSH_INTERVAL):
+        flush_row_events()
+
+def flush_row_events() -> None:
+    """Пишет в лог счётчики и примеры накопленных построчных событий."""
+    global _row_events_flushed_at  # pylint: disable=global-statement
+    if not _row_events:
+        return
+    for category, (count, samples) in _row_events.items():
+        logging.getLogger().debug("%s: %d, примеры: %s", category, count, "; ".join(samples))
+    _row_events.clear()
+    _row_events_flushed_at = time.monotonic()
+
 def setup_anomaly_logger() -> None:
     """Настраивает логгер для аномалий."""
     logger = logging.getLogger("anomaly")
@@ -84,6 +186,53 @@ def setup_anomaly_logger() -> None:
 
     os.chmod(log_file, config.FILE_PERMISSIONS)
 
+class RecordBufferHandler(logging.Handler):
+    """Накапливает записи лога в памяти для передачи из процесса-воркера."""
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+_worker_log_buffer = None
+
+def capture_worker_logs(aggregate_rows: bool = False) -> None:
+    """Перенаправляет логи процесса-воркера в буфер вместо файлов и консоли.
+
+    Используется как initializer пула процессов: записи затем передаются
+    в основной процесс и воспроизводятся в исходном порядке.
+
+    Args:
+        aggregate_rows: Агрегировать построчные события, как в основном процессе.
+    """
+    global _worker_log_buffer  # pylint: disable=global-statement
+    set_row_event_aggregation(aggregate_rows)
+    _worker_log_buffer = RecordBufferHandler()
+    for name in (None, "anomaly"):
+        logger = logging.getLogger(name)
+        logger.handlers = [_worker_log_buffer]
+    logging.getLogger().setLevel(logging.DEBUG)
+    logging.getLogger("anomaly").propagate = False
+
+def drain_worker_logs() -> list:
+    """Возвращает накопленные в воркере записи лога и очищает буфер."""
+    flush_row_events()
+    if _worker_log_buffer is None:
+        return []
+    records = _worker_log_buffer.records
+    _worker_log_buffer.records = []
+    return records
+
+def replay_log_records(records: list) -> None:
+    """Передаёт записи лога из воркера обработчикам основного процесса."""
+    for record in records:
+        logger = logging.getLogger() if record.name == "root" else logging.getLogger(record.name)
+        logger.handle(record)
+
 def ensure_dir(directory: str) -> None:
     """Создаёт директорию, если она не существует."""
     os.makedirs(directory, exist_ok=True)
@@ -104,28 +253,97 @@ def log_anomaly(message: str) -> None:
     """Логирует аномалию."""
     logging.getLogger("anomaly").info(message)
 
-def find_phone_files(exclude_dirs: List[str], uploads_dir: str) -> List[str]:
-    """Находит файлы .csv и .txt в uploads_dir, исключая exclude_dirs."""
-    phone_files = []
-    for ext in ["*.csv", "*.txt"]:
-        files = glob.glob(os.path.join(uploads_dir, ext))
-        for file in files:
-            if not any(os.path.abspath(file).startswith(os.path.abspath(d)) for d in exclude_dirs):
-                phone_files.append(os.path.abspath(file))
-    return phone_files
+def split_compression(file_path: str) -> Tuple[str, str]:
+    """Отделяет расширение сжатия: "calls.csv.gz" -> ("calls.csv", ".gz").
+
+    Для несжатого файла возвращает (file_path, "").
+    """
+    base, ext = os.path.splitext(file_path)
+    if ext in config.COMPRESSED_EXTENSIONS:
+        return base, ext
+    return file_path, ''
+
+def is_upload_file(name: str) -> bool:
+    """Проверяет имя файла выгрузки: .csv, .txt, их сжатые варианты и .zip."""
+    base, compressed = split_compression(name)
+    return compressed == '.zip' or os.path.splitext(base)[1] in config.UPLOAD_EXTENSIONS
+
+def find_phone_files(exclude_dirs: List[str], uploads_dir: str, min_age: Optional[float] = None) -> List[str]:
+    """Находит файлы выгрузки в uploads_dir и её подпапках за один проход os.scandir.
+
+    Папки из exclude_dirs отсекаются до обхода по устройству и inode,
+    поэтому исключаются и ссылки на них; каждая папка обходится один раз.
+    Имена фильтруются по расширению (см. is_upload_file) без системных
+    вызовов, stat выполняется только для подходящих файлов.
+
+    Args:
+        exclude_dirs: Исключаемые папки.
+        uploads_dir: Папка с файлами выгрузки.
+        min_age: Пропускать файлы, изменённые менее min_age секунд назад
+            (возможно, ещё записываются); 0 — не проверять время изменения,
+            в том числе будущее (расхождение часов, rsync -t).
+            По умолчанию config.UPLOAD_MIN_AGE.
+
+    Returns:
+        Абсолютные пути от больших файлов к меньшим (при равном размере —
+        по пути), чтобы крупные файлы раньше попадали в пул процессов.
+    """
+    min_age = config.UPLOAD_MIN_AGE if min_age is None else min_age
+    seen = set()
+    for directory in [uploads_dir] + list(exclude_dirs):
+        try:
+            info = os.stat(directory)
+        except OSError:
+            continue
+        seen.add((info.st_dev, info.st_ino))
+    newest = time.time() - min_age if min_age > 0 else None
+    found = []
+    young = []
+    pending = [os.path.abspath(uploads_dir)]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not config.UPLOAD_RECURSIVE:
+                                continue
+                            info = entry.stat()
+                            if (info.st_dev, info.st_ino) not in seen:
+                                seen.add((info.st_dev, info.st_ino))
+                                pending.append(entry.path)
+                        elif is_upload_file(entry.name) and entry.is_file():
+                            info = entry.stat()
+                            if newest is not None and info.st_mtime > newest:
+                                young.append(entry.path)
+                            else:
+                                found.append((-info.st_size, entry.path))
+                    except OSError:
+                        # Файл удалён или недоступен во время обхода
+                        continue
+        except OSError as exc:
+            log_verbose(f"Папка выгрузок недоступна: {directory}: {exc}")
+    if young:
+        log_info(f"Пропущены файлы выгрузки, изменённые менее {min_age} с назад: {', '.join(sorted(young))}")
+    found.sort()
+    return [path for _, path in found]
+
+def find_ad_files(ad_paths: List[str]) -> List[str]:
+    """Раскрывает пути к AD: файлы остаются как есть, из папок берутся *.csv по имени.
+
+    Несуществующие пути возвращаются без изменений, чтобы ошибка была
+    обработана при чтении.
+    """
+    ad_files = []
+    for path in ad_paths:
+        if os.path.isdir(path):
+            ad_files.extend(sorted(glob.glob(os.path.join(path, "*.csv"))))
+        else:
+            ad_files.append(path)
+    return ad_files
 
 def move_file_to_archive(file_path: str, archive_dir: str) -> None:
-    """Перемещает файл в архив с уникальным именем."""
-    os.makedirs(archive_dir, exist_ok=True)
-    base_name = os.path.basename(file_path)
-    dest_path = os.path.join(archive_dir, base_name)
-    counter = 1
-    while os.path.exists(dest_path):
-        name, ext = os.path.splitext(base_name)
-        dest_path = os.path.join(archive_dir, f"{name}_{counter}{ext}")
-        counter += 1
-    try:
-        shutil.move(file_path, dest_path)
-        log_info(f"Файл перемещён в архив: {file_path}")
-    except (OSError, PermissionError) as exc:
-        log_error(f"Ошибка перемещения файла {file_path} в архив: {exc}")
+    """Перемещает файл в архив с уникальным именем (см. archive.archive_file)."""
+    from .archive import archive_file  # pylint: disable=import-outside-toplevel,cyclic-import
+    archive_file(file_path, archive_dir)
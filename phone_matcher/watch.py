@@ -0,0 +1,87 @@
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+from . import config
+from .utils import find_ad_files, find_phone_files
+
+FileSignature = Tuple[int, int]
+
+
+def file_signature(file_path: str) -> Optional[FileSignature]:
+    """Возвращает (размер, время изменения в нс) файла или None, если файла нет."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def files_signature(file_paths: List[str]) -> Optional[tuple]:
+    """Возвращает подписи набора файлов или None, если какого-то файла нет."""
+    signatures = tuple((file_path, file_signature(file_path)) for file_path in file_paths)
+    if not signatures or any(signature is None for _, signature in signatures):
+        return None
+    return signatures
+
+
+class UploadWatcher:
+    """Отслеживает новые файлы выгрузки и изменения AD-файла между опросами.
+
+    Файл считается полностью записанным, когда его размер и время изменения
+    не меняются между двумя опросами подряд. AD может состоять из
+    нескольких файлов и папок: индекс перезагружается, когда меняется,
+    появляется или пропадает любой из AD-файлов.
+    """
+    def __init__(self, ad_file: Union[str, List[str]], uploads_dir: str):
+        self.ad_file = ad_file
+        self.uploads_dir = uploads_dir
+        self._uploads: Dict[str, FileSignature] = {}
+        self._returned: Dict[str, FileSignature] = {}
+        self._ad_loaded: Optional[tuple] = None
+        self._ad_observed: Optional[tuple] = None
+
+    def ad_changed(self) -> bool:
+        """Проверяет, нужно ли перезагрузить индекс AD.
+
+        Returns:
+            True при первом вызове и когда AD-файл изменился и перестал
+            меняться с прошлого опроса.
+        """
+        ad_paths = [self.ad_file] if isinstance(self.ad_file, str) else self.ad_file
+        signature = files_signature(find_ad_files(ad_paths))
+        if self._ad_loaded is None:
+            self._ad_loaded = self._ad_observed = signature
+            return True
+        stable = signature is not None and signature == self._ad_observed
+        self._ad_observed = signature
+        if stable and signature != self._ad_loaded:
+            self._ad_loaded = signature
+            return True
+        return False
+
+    def poll(self) -> List[str]:
+        """Возвращает файлы выгрузки, которые не менялись с прошлого опроса.
+
+        Returns:
+            Список путей в порядке поиска. Файл, который уже был возвращён
+            и остался в папке (например, из-за ошибки обработки), повторно
+            возвращается только после изменения.
+        """
+        ready = []
+        current = {}
+        returned = {}
+        # Готовность файла определяется сравнением между опросами, а не возрастом
+        for phone_file in find_phone_files(config.EXCLUDE_DIRS, self.uploads_dir, min_age=0):
+            signature = file_signature(phone_file)
+            if signature is None:
+                continue
+            if self._returned.get(phone_file) == signature:
+                returned[phone_file] = signature
+            elif self._uploads.get(phone_file) == signature:
+                ready.append(phone_file)
+                returned[phone_file] = signature
+            else:
+                current[phone_file] = signature
+        self._uploads = current
+        self._returned = returned
+        return ready
@@ -0,0 +1,49 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+import csv
+from unittest.mock import patch
+from phone_matcher.ad_cache import load_ad_index, get_cache_path
+from phone_matcher.parse_ad import parse_ad_file
+from phone_matcher import config
+
+class TestAdCache(unittest.TestCase):
+    """Тесты для модуля ad_cache."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_ad_file = os.path.join(self.temp_dir.name, "test_ad.csv")
+        self.cache_dir = os.path.join(self.temp_dir.name, "ad_cache")
+        self.write_ad_file([["Иванов Иван", "123456", "ivanov.ivan@company.com", "True"]])
+
+    def write_ad_file(self, rows):
+        """Записывает тестовый AD-файл."""
+        with open(self.test_ad_file, "w", encoding="utf-8", newline="") as file_handle:
+            writer = csv.writer(file_handle, delimiter=config.AD_DELIMITER, quoting=csv.QUOTE_ALL)
+            writer.writerow(["DisplayName", "telephoneNumber", "mail", "Enabled"])
+            writer.writerows(rows)
+
+    def test_load_from_cache(self):
+        """Проверяет, что повторная загрузка не разбирает CSV."""
+        with patch("phone_matcher.config.AD_CACHE_DIR", self.cache_dir):
+            ad_data, _ = load_ad_index(self.test_ad_file)
+            self.assertTrue(os.path.exists(get_cache_path(self.test_ad_file)))
+            with patch("phone_matcher.ad_cache.parse_ad_file") as mock_parse:
+                cached_data, anomaly_count = load_ad_index(self.test_ad_file)
+                mock_parse.assert_not_called()
+            self.assertEqual(cached_data, ad_data)
+            self.assertEqual(anomaly_count, 0)
+
+    def test_rebuild_on_change(self):
+        """Проверяет пересборку кэша при изменении AD-файла."""
+        with patch("phone_matcher.config.AD_CACHE_DIR", self.cache_dir):
+            load_ad_index(self.test_ad_file)
+            self.write_ad_file([["Петрова Анна", "789012", "anna.petrova@company.com", "False"]])
+            with patch("phone_matcher.ad_cache.parse_ad_file", side_effect=parse_ad_file) as mock_parse:
+                ad_data, _ = load_ad_index(self.test_ad_file)
+                mock_parse.assert_called_once_with(self.test_ad_file)
+            self.assertIn("789012", ad_data)
+            self.assertNotIn("123456", ad_data)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
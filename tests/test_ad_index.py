@@ -0,0 +1,64 @@
+# pylint: disable=consider-using-with
+import unittest
+import pickle
+from phone_matcher.ad_index import AdIndex, record_counts
+
+class TestAdIndex(unittest.TestCase):
+    """Тесты для модуля ad_index."""
+    def setUp(self):
+        self.index = AdIndex()
+        self.index.add("123456", "Иванов Иван", "ivanov@company.com", "True")
+        self.index.add("654321", "Иванов Иван", "ivanov@company.com", "True")
+        self.index.add("123456", "Петров Пётр", "petrov@company.com", "False")
+        self.index.add("777777", "Сидоров 😀", "", "")
+        self.expected = {
+            "123456": [("Иванов Иван", "ivanov@company.com", "True"), ("Петров Пётр", "petrov@company.com", "False")],
+            "654321": [("Иванов Иван", "ivanov@company.com", "True")],
+            "777777": [("Сидоров 😀", "", "")],
+        }
+
+    def test_mapping(self):
+        """Проверяет, что индекс ведёт себя как словарь списков записей."""
+        self.assertEqual(self.index, self.expected)
+        self.assertEqual(len(self.index), 3)
+        self.assertIn("654321", self.index)
+        self.assertNotIn("000000", self.index)
+        self.assertIsNone(self.index.get("000000"))
+        self.assertEqual(list(self.index), ["123456", "654321", "777777"])
+        with self.assertRaises(KeyError):
+            _ = self.index["000000"]
+
+    def test_duplicate_records_kept(self):
+        """Проверяет, что повтор записи для номера сохраняется, как в списке."""
+        self.index.add("654321", "Иванов Иван", "ivanov@company.com", "True")
+        self.assertEqual(self.index["654321"], [("Иванов Иван", "ivanov@company.com", "True")] * 2)
+
+    def test_record_counts(self):
+        """Проверяет подсчёт записей для индекса и обычного словаря."""
+        self.assertEqual(dict(record_counts(self.index)), {"123456": 2, "654321": 1, "777777": 1})
+        self.assertEqual(dict(record_counts(self.expected)), {"123456": 2, "654321": 1, "777777": 1})
+
+    def test_pickle(self):
+        """Проверяет сохранение индекса через pickle и дополнение после загрузки."""
+        restored = pickle.loads(pickle.dumps(self.index, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(restored, self.expected)
+        restored.add("111111", "Иванов Иван", "ivanov@company.com", "True")
+        self.assertEqual(restored["111111"], [("Иванов Иван", "ivanov@company.com", "True")])
+
+    def test_merge(self):
+        """Проверяет объединение индексов доменов с сохранением порядка записей и домена."""
+        index = AdIndex("corp")
+        index.add("123456", "Иванов Иван", "ivanov@company.com", "True")
+        other = AdIndex("branch")
+        other.add("123456", "Иванов И.", "ivanov@branch.company.com", "Disabled")
+        other.add("222222", "Петров Пётр", "petrov@branch.company.com", "True")
+        self.assertEqual(index.merge(other), 1)
+        self.assertEqual(index["123456"], [("Иванов Иван", "ivanov@company.com", "True"),
+                                           ("Иванов И.", "ivanov@branch.company.com", "Disabled")])
+        self.assertEqual(index["222222"], [("Петров Пётр", "petrov@branch.company.com", "True")])
+        self.assertEqual(index.record_domains("123456"), ["corp", "branch"])
+        self.assertEqual(index.record_domains("222222"), ["branch"])
+        merged = AdIndex()
+        merged.merge(index)
+        self.assertEqual(merged.domains, ["corp", "branch"])
+        self.assertEqual(merged, index)
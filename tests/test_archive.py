@@ -0,0 +1,88 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+import errno
+import gzip
+from datetime import datetime
+from unittest.mock import patch
+from phone_matcher.archive import ArchiveIndex, archive_file, numbered_name
+from phone_matcher import config
+
+class TestArchive(unittest.TestCase):
+    """Тесты для модуля archive."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.temp_dir.name, "archive")
+        self.uploads_dir = os.path.join(self.temp_dir.name, "uploads")
+        os.makedirs(self.uploads_dir)
+
+    def make_upload(self, name="calls.csv", content="phone\n123456\n"):
+        path = os.path.join(self.uploads_dir, name)
+        with open(path, "w", encoding="utf-8") as file_handle:
+            file_handle.write(content)
+        return path
+
+    def test_numbered_name(self):
+        """Проверяет номер перед расширениями."""
+        self.assertEqual(numbered_name("calls.csv", 0), "calls.csv")
+        self.assertEqual(numbered_name("calls.csv.gz", 2), "calls_2.csv.gz")
+
+    def test_partition_and_index(self):
+        """Проверяет подпапку даты и номера имён из индекса между запусками."""
+        partition = datetime.now().strftime(config.ARCHIVE_PARTITION_FORMAT)
+        first = archive_file(self.make_upload(), self.archive_dir)
+        second = archive_file(self.make_upload(), self.archive_dir)
+        self.assertEqual(first, os.path.join(self.archive_dir, partition, "calls.csv"))
+        self.assertEqual(second, os.path.join(self.archive_dir, partition, "calls_1.csv"))
+        with ArchiveIndex(self.archive_dir) as index:
+            self.assertEqual(index.reserve(os.path.join(partition, "calls.csv")),
+                             os.path.join(partition, "calls_2.csv"))
+
+    def test_existing_files_without_index(self):
+        """Проверяет, что файлы, положенные в архив без индекса, не перезаписываются."""
+        os.makedirs(self.archive_dir)
+        for name in ("calls.csv", "calls_1.csv"):
+            open(os.path.join(self.archive_dir, name), "w", encoding="utf-8").close()
+        dest = archive_file(self.make_upload(), self.archive_dir, partition_format="")
+        self.assertEqual(dest, os.path.join(self.archive_dir, "calls_2.csv"))
+
+    def test_compress(self):
+        """Проверяет сжатие при архивировании; сжатые файлы не пересжимаются."""
+        upload = self.make_upload(content="phone\n123456\n" * 1000)
+        dest = archive_file(upload, self.archive_dir, compress=True, partition_format="")
+        self.assertEqual(dest, os.path.join(self.archive_dir, "calls.csv.gz"))
+        self.assertFalse(os.path.exists(upload))
+        with gzip.open(dest, "rt", encoding="utf-8") as file_handle:
+            self.assertEqual(file_handle.read(), "phone\n123456\n" * 1000)
+
+        compressed = os.path.join(self.uploads_dir, "calls.txt.gz")
+        with gzip.open(compressed, "wt", encoding="utf-8") as file_handle:
+            file_handle.write("123456\n")
+        dest = archive_file(compressed, self.archive_dir, compress=True, partition_format="")
+        self.assertEqual(dest, os.path.join(self.archive_dir, "calls.txt.gz"))
+        with gzip.open(dest, "rt", encoding="utf-8") as file_handle:
+            self.assertEqual(file_handle.read(), "123456\n")
+
+    def test_cross_device_move(self):
+        """Проверяет потоковое копирование, если архив на другой файловой системе."""
+        upload = self.make_upload()
+        cross_device = OSError(errno.EXDEV, "Invalid cross-device link")
+        with patch("phone_matcher.archive.os.rename", side_effect=cross_device):
+            dest = archive_file(upload, self.archive_dir, partition_format="")
+        self.assertFalse(os.path.exists(upload))
+        self.assertFalse(os.path.exists(f"{dest}.tmp"))
+        with open(dest, encoding="utf-8") as file_handle:
+            self.assertEqual(file_handle.read(), "phone\n123456\n")
+
+    def test_archive_error(self):
+        """Проверяет, что ошибка перемещения логируется, а файл остаётся на месте."""
+        upload = self.make_upload()
+        with patch("phone_matcher.archive.os.rename", side_effect=PermissionError("denied")), \
+             patch("phone_matcher.archive.log_error") as log_error:
+            self.assertIsNone(archive_file(upload, self.archive_dir))
+        self.assertTrue(os.path.exists(upload))
+        log_error.assert_called_once()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
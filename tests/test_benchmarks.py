@@ -0,0 +1,31 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+from benchmarks.generate_data import generate_tier
+from phone_matcher.parse_ad import parse_ad_file
+from phone_matcher.parse_phone import parse_phone_file
+
+class TestBenchmarkData(unittest.TestCase):
+    """Тесты для генератора данных бенчмарков."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def test_generate_tier(self):
+        """Проверяет, что сгенерированные файлы разбираются парсерами."""
+        data = generate_tier(self.temp_dir.name, 1000)
+        with open(data["ad_file"], "rb") as file_handle:
+            self.assertRaises(UnicodeDecodeError, file_handle.read().decode, "utf-8")
+        ad_data, anomaly_count = parse_ad_file(data["ad_file"])
+        self.assertGreater(len(ad_data), 1000)
+        self.assertGreater(anomaly_count, 0)
+        self.assertTrue(any(len(records) > 1 for records in ad_data.values()))
+
+        extensions = sorted({os.path.splitext(path)[1] for path in data["upload_files"]})
+        self.assertEqual(extensions, [".csv", ".txt"])
+        phones = [phone for path in data["upload_files"] for phone in parse_phone_file(path)]
+        self.assertEqual(len(phones), 1000)
+        self.assertTrue(any(phone in ad_data for phone, _ in phones))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
@@ -0,0 +1,32 @@
+import io
+import unittest
+from unittest.mock import patch
+from phone_matcher.encoding import iter_decoded_lines
+
+class TestEncoding(unittest.TestCase):
+    """Тесты для модуля encoding."""
+    def test_utf8_with_bom(self):
+        """Проверяет снятие BOM и сохранение окончаний строк."""
+        data = "\ufeffphone\r\n123456\rИванов\n".encode("utf-8")
+        lines = list(iter_decoded_lines(io.BytesIO(data), "test.csv"))
+        self.assertEqual(lines, ["phone\r\n", "123456\r", "Иванов\n"])
+
+    def test_windows_1251(self):
+        """Проверяет подбор кодировки windows-1251 по первому блоку."""
+        data = "Иванов Иван;123456\n".encode("windows-1251")
+        lines = list(iter_decoded_lines(io.BytesIO(data), "test.csv"))
+        self.assertEqual(lines, ["Иванов Иван;123456\n"])
+
+    def test_late_fallback(self):
+        """Проверяет переход на другую кодировку без повторного чтения блоков."""
+        data = b"123456\n" * 4 + "Петрова Анна\n".encode("windows-1251")
+        binary_file = io.BytesIO(data)
+        with patch("phone_matcher.config.DECODE_CHUNK_SIZE", 8):
+            lines = list(iter_decoded_lines(binary_file, "test.txt"))
+        self.assertEqual(lines, ["123456\n"] * 4 + ["Петрова Анна\n"])
+
+    def test_undecodable(self):
+        """Проверяет ошибку, если блок не декодируется ни в одной кодировке."""
+        with patch("phone_matcher.config.ENCODINGS", ["utf-8"]):
+            with self.assertRaises(UnicodeDecodeError):
+                list(iter_decoded_lines(io.BytesIO(b"\xff\n"), "test.txt"))
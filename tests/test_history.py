@@ -0,0 +1,57 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+from phone_matcher.history import SeenNumberStore, STATUS_CHANGED, STATUS_KNOWN, STATUS_NEW
+
+class TestHistory(unittest.TestCase):
+    """Тесты для модуля history."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "history", "seen.sqlite3")
+        self.ad_data = {"123456": [("Иванов Иван", "ivanov.ivan@company.com", "True")]}
+
+    def resolve(self, phones, ad_data, ad_version, commit=True):
+        with SeenNumberStore(self.db_path) as store:
+            results = {phone: (records, status) for phone, records, status in store.resolve(phones, ad_data, ad_version)}
+            if commit:
+                store.commit()
+        return results
+
+    def test_resolve_statuses(self):
+        """Проверяет статусы номеров между запусками и при изменении AD."""
+        first = self.resolve(["123456", "777777"], self.ad_data, "v1")
+        self.assertEqual(first["123456"], (self.ad_data["123456"], STATUS_NEW))
+        self.assertEqual(first["777777"], ([], STATUS_NEW))
+
+        second = self.resolve(["123456", "777777", "888888"], self.ad_data, "v1")
+        self.assertEqual(second["123456"][1], STATUS_KNOWN)
+        self.assertEqual(second["888888"][1], STATUS_NEW)
+
+        changed_ad = {"777777": [("Петров Пётр", "petrov@company.com", "False")]}
+        third = self.resolve(["123456", "777777", "888888"], changed_ad, "v2")
+        self.assertEqual(third["123456"], ([], STATUS_CHANGED))
+        self.assertEqual(third["777777"], (changed_ad["777777"], STATUS_CHANGED))
+        self.assertEqual(third["888888"], ([], STATUS_KNOWN))
+
+    def test_uncommitted_changes_discarded(self):
+        """Проверяет, что без commit() номера не попадают в историю."""
+        self.resolve(["123456"], self.ad_data, "v1", commit=False)
+        self.assertEqual(self.resolve(["123456"], self.ad_data, "v1")["123456"][1], STATUS_NEW)
+
+    def test_iter_all(self):
+        """Проверяет выдачу всей истории с пересопоставлением после изменения AD."""
+        self.resolve(["777777", "123456"], self.ad_data, "v1")
+        changed_ad = {"777777": [("Петров Пётр", "petrov@company.com", "False")]}
+        with SeenNumberStore(self.db_path) as store:
+            self.assertEqual(len(store), 2)
+            self.assertEqual(list(store.iter_all(changed_ad, "v2")), [
+                ("123456", []),
+                ("777777", [("Петров Пётр", "petrov@company.com", "False")]),
+            ])
+            store.commit()
+        with SeenNumberStore(self.db_path) as store:
+            self.assertEqual(list(store.iter_all({}, "v2"))[1][1], [("Петров Пётр", "petrov@company.com", "False")])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
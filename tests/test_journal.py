@@ -0,0 +1,78 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+from collections import Counter
+from phone_matcher.journal import RunJournal
+
+class TestJournal(unittest.TestCase):
+    """Тесты для модуля journal."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.journal_dir = os.path.join(self.temp_dir.name, "journal")
+        self.uploads = []
+        for name, content in (("a.csv", "phone\n123456\n"), ("b.txt", "777777\n777777\n")):
+            path = os.path.join(self.temp_dir.name, name)
+            with open(path, "w", encoding="utf-8") as file_handle:
+                file_handle.write(content)
+            self.uploads.append(path)
+
+    def test_resume(self):
+        """Проверяет восстановление состояния и сохранённых номеров прерванного прогона."""
+        first, second = self.uploads
+        journal = RunJournal.start("batch", "2025-04-26_13-05-56", self.journal_dir)
+        journal.record_files(self.uploads)
+        journal.record_parsed(first, [("123456", first)])
+        journal.record_parsed(second, Counter({"777777": 2}))
+        # Недописанная запись при аварийном завершении
+        with open(journal.path, "a", encoding="utf-8") as file_handle:
+            file_handle.write('{"event": "out')
+
+        resumed = RunJournal.resume("batch", self.journal_dir)
+        self.assertEqual(resumed.timestamp, "2025-04-26_13-05-56")
+        self.assertEqual(resumed.files, self.uploads)
+        self.assertEqual(resumed.parsed_files, self.uploads)
+        self.assertFalse(resumed.output_committed)
+        self.assertEqual(resumed.load_parsed(first), [("123456", first)])
+        self.assertEqual(resumed.load_parsed(second), {"777777": 2})
+        self.assertIsNone(RunJournal.resume("dedupe", self.journal_dir))
+
+        # Изменившийся файл разбирается заново
+        with open(first, "a", encoding="utf-8") as file_handle:
+            file_handle.write("654321\n")
+        self.assertIsNone(resumed.load_parsed(first))
+
+        resumed.commit_output("result.csv")
+        resumed.record_archived(second)
+        again = RunJournal.resume("batch", self.journal_dir)
+        self.assertTrue(again.output_committed)
+        self.assertEqual(again.archived, {second})
+        again.discard()
+        self.assertEqual(os.listdir(self.journal_dir), [])
+
+    def test_start_discards_stale(self):
+        """Проверяет, что новый прогон без --resume отбрасывает незавершённый журнал режима."""
+        stale = RunJournal.start("batch", "2025-04-26_13-05-56", self.journal_dir)
+        stale.record_parsed(self.uploads[0], [("123456", self.uploads[0])])
+        other = RunJournal.start("stream", "2025-04-26_13-05-56", self.journal_dir)
+        other.record_files(self.uploads)
+
+        journal = RunJournal.start("batch", "2025-04-27_13-05-56", self.journal_dir)
+        self.assertEqual(os.listdir(self.journal_dir), ["stream_2025-04-26_13-05-56.jsonl"])
+        self.assertIsNone(RunJournal.resume("batch", self.journal_dir))
+        # Файл журнала создаётся при первой записи
+        journal.record_files([])
+        self.assertTrue(os.path.exists(journal.path))
+
+    def test_memory_journal(self):
+        """Проверяет журнал без файла."""
+        journal = RunJournal(None, "watch", "2025-04-26_13-05-56")
+        journal.record_parsed(self.uploads[0], [("123456", self.uploads[0])])
+        journal.commit_output(None)
+        self.assertEqual(journal.parsed_files, [self.uploads[0]])
+        self.assertIsNone(journal.load_parsed(self.uploads[0]))
+        journal.discard()
+        self.assertFalse(os.path.exists(self.journal_dir))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
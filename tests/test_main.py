@@ -2,11 +2,20 @@
 import unittest
 import tempfile
 import os
+import random
 import sys
 import csv
+import gzip
+import argparse
+import shutil
 from unittest.mock import patch
-from phone_matcher.main import parse_arguments, process_ad_file, process_phone_files, write_results, main
+from phone_matcher.main import (parse_arguments, process_ad_file, process_phone_files, write_results, stream_results,
+                                watch_uploads, write_counted_results, write_history_results, open_run_journal,
+                                run_journaled, main)
+from phone_matcher.metrics import run_metrics_report, start_run_metrics, write_run_metrics
+from phone_matcher.upload_manifest import UploadManifest
 from phone_matcher import config
+from phone_matcher.parse_ad import parse_ad_file
 
 class TestMain(unittest.TestCase):
     """Тесты для модуля main."""
@@ -30,10 +39,22 @@ class TestMain(unittest.TestCase):
         """Проверяет парсинг аргументов командной строки."""
         with patch.object(sys, "argv", ["main.py", "ad.csv", "-v", "--uploads-dir", "data/phone_data"]):
             args = parse_arguments()
-            self.assertEqual(args.ad_file, "ad.csv")
+            self.assertEqual(args.ad_file, ["ad.csv"])
             self.assertTrue(args.verbose)
             self.assertEqual(args.uploads_dir, "data/phone_data")
 
+    def test_parse_arguments_conflicts(self):
+        """Проверяет, что несовместимые параметры отклоняются, а не игнорируются."""
+        for options in (["--stream", "--dedupe"], ["--stream", "--history"], ["--watch", "--resume"],
+                        ["--serve", "--resume"], ["--stream", "--manifest", "skip"]):
+            with self.subTest(options=options), patch.object(sys, "argv", ["main.py", "ad.csv"] + options), \
+                 patch("sys.stderr"), self.assertRaises(SystemExit) as cm:
+                parse_arguments()
+            self.assertEqual(cm.exception.code, 2)
+        # --watch важнее --stream, и манифест в нём поддерживается
+        with patch.object(sys, "argv", ["main.py", "ad.csv", "--stream", "--watch", "--manifest", "reuse"]):
+            self.assertEqual(parse_arguments().manifest, "reuse")
+
     def test_process_ad_file(self):
         """Проверяет обработку AD-файла."""
         with patch("phone_matcher.main.sys.exit") as mock_exit:
@@ -42,6 +63,29 @@ class TestMain(unittest.TestCase):
             self.assertEqual(ad_data["123456"][0][0], "Иванов Иван")
             mock_exit.assert_not_called()
 
+    def test_process_ad_files(self):
+        """Проверяет объединение нескольких AD-файлов из папки и списка путей."""
+        ad_dir = os.path.join(self.temp_dir.name, "ad_domains")
+        os.makedirs(ad_dir)
+        with open(os.path.join(ad_dir, "branch.csv"), "w", encoding="utf-8", newline="") as file_handle:
+            writer = csv.writer(file_handle, delimiter=config.AD_DELIMITER)
+            writer.writerow(["DisplayName", "telephoneNumber", "mail", "Enabled"])
+            writer.writerow(["Иванов И.", "123456", "ivanov@branch.company.com", "True"])
+            writer.writerow(["Петров Пётр", "222222", "petrov@branch.company.com", "True"])
+        ad_data = process_ad_file([self.test_ad_file, ad_dir])
+        self.assertEqual(len(ad_data), 2)
+        self.assertEqual([record[1] for record in ad_data["123456"]],
+                         ["ivanov.ivan@company.com", "ivanov@branch.company.com"])
+        self.assertEqual(ad_data.record_domains("123456"), ["test_ad", "branch"])
+
+        # Одинаковые имена файлов из разных папок дали бы неразличимые домены
+        other_dir = os.path.join(self.temp_dir.name, "corp")
+        os.makedirs(other_dir)
+        shutil.copy(os.path.join(ad_dir, "branch.csv"), other_dir)
+        with patch("phone_matcher.main.log_error") as mock_error, self.assertRaises(SystemExit):
+            process_ad_file([ad_dir, other_dir])
+        self.assertIn("branch", mock_error.call_args[0][0])
+
     def test_process_phone_files(self):
         """Проверяет обработку файлов выгрузки."""
         with patch("phone_matcher.utils.move_file_to_archive"), \
@@ -50,6 +94,13 @@ class TestMain(unittest.TestCase):
             self.assertIn(("123456", os.path.join(self.uploads_dir, "test.csv")), phones)
             mock_exit.assert_not_called()
 
+        # Недостающий результат пула — ошибка файла, а не молчаливое завершение разбора
+        with patch("phone_matcher.main.parse_phone_files", return_value=iter([])), \
+             patch("phone_matcher.main.log_error") as mock_log_error:
+            self.assertEqual(process_phone_files(self.uploads_dir), [])
+        mock_log_error.assert_any_call(f"Ошибка обработки {os.path.join(self.uploads_dir, 'test.csv')}: "
+                                       "нет результата разбора")
+
     def test_write_results(self):
         """Проверяет запись результатов в выходной файл."""
         phones = [("123456", "source1")]
@@ -72,6 +123,183 @@ class TestMain(unittest.TestCase):
             mock_log_info.assert_any_call("Найдено совпадений с номерами AD: 1")
             mock_log_info.assert_any_call(f"Результат сохранён в {expected_output}")
 
+    def test_stream_results(self):
+        """Проверяет потоковую запись результатов."""
+        ad_data = {"123456": [("Иванов Иван", "ivanov.ivan@company.com", "True")]}
+        timestamp = "2025-04-26_13-05-56"
+        archive_dir = os.path.join(self.temp_dir.name, "data", "archive")
+        with patch("phone_matcher.config.RESULTS_DIR", self.results_dir), \
+             patch("phone_matcher.config.ARCHIVE_DIR", archive_dir), \
+             patch("phone_matcher.main.log_info") as mock_log_info, \
+             patch("phone_matcher.main.sys.exit") as mock_exit:
+            stream_results(self.uploads_dir, ad_data, timestamp)
+            mock_exit.assert_not_called()
+            mock_log_info.assert_any_call("Найдено совпадений с номерами AD: 1")
+
+        output_file = os.path.join(self.results_dir, f"{timestamp}_output.csv")
+        with open(output_file, "r", encoding="utf-8") as file_handle:
+            rows = list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))
+        self.assertEqual(rows[1], ["123456", "Иванов Иван", "ivanov.ivan@company.com", "True"])
+        self.assertFalse(os.path.exists(os.path.join(self.uploads_dir, "test.csv")))
+
+    def test_stream_results_truncated_upload(self):
+        """Проверяет, что строки файла, сбойного в середине, не попадают в потоковый результат."""
+        # Несжимаемые номера: сбой происходит после того, как первые блоки файла уже прочитаны
+        numbers = random.Random(1).sample(range(7000000000, 8000000000), 300000)
+        rows = "phone\n" + "".join(f"{number}\n" for number in numbers)
+        with open(os.path.join(self.uploads_dir, "broken.csv.gz"), "wb") as file_handle:
+            file_handle.write(gzip.compress(rows.encode("utf-8"))[:-2000])
+        with open(os.path.join(self.uploads_dir, "calls.txt"), "w", encoding="utf-8") as file_handle:
+            file_handle.write("777777\n888888\n")
+        timestamp = "2025-04-26_13-05-56"
+        archive_dir = os.path.join(self.temp_dir.name, "data", "archive")
+        with patch("phone_matcher.config.RESULTS_DIR", self.results_dir), \
+             patch("phone_matcher.config.ARCHIVE_DIR", archive_dir), \
+             patch("phone_matcher.config.STREAM_FILE_BUFFER_ROWS", 1000), \
+             patch("phone_matcher.main.log_error") as mock_log_error:
+            stream_results(self.uploads_dir, {}, timestamp)
+        self.assertTrue(any("broken.csv.gz" in call.args[0] for call in mock_log_error.call_args_list))
+
+        with open(os.path.join(self.results_dir, f"{timestamp}_output.csv"), "r", encoding="utf-8") as file_handle:
+            phones = [row[0] for row in csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER)][1:]
+        self.assertEqual(phones, ["123456", "777777", "888888"])
+        self.assertEqual(os.listdir(self.uploads_dir), ["broken.csv.gz"])
+        self.assertEqual([name for name in os.listdir(self.results_dir) if name.startswith(".")], [])
+
+    def test_write_counted_results(self):
+        """Проверяет режим --dedupe: одна строка на номер со счётчиком и файлами."""
+        with open(os.path.join(self.uploads_dir, "calls.txt"), "w", encoding="utf-8") as file_handle:
+            file_handle.write("123456\n123456\n777777\n")
+        archive_dir = os.path.join(self.temp_dir.name, "data", "archive")
+        timestamp = "2025-04-26_13-05-56"
+        with patch("phone_matcher.config.RESULTS_DIR", self.results_dir), \
+             patch("phone_matcher.config.ARCHIVE_DIR", archive_dir):
+            occurrences = process_phone_files(self.uploads_dir, dedupe=True)
+            write_counted_results(occurrences, parse_ad_file(self.test_ad_file)[0], timestamp)
+
+        with open(os.path.join(self.results_dir, f"{timestamp}_output.csv"), "r", encoding="utf-8") as file_handle:
+            rows = list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))
+        self.assertEqual(rows, [
+            config.COUNTED_OUTPUT_FIELDS,
+            ["123456", "Иванов Иван", "ivanov.ivan@company.com", "True", "3", "calls.txt;test.csv"],
+            ["777777", "", "", "", "1", "calls.txt"],
+        ])
+
+    def test_write_history_results(self):
+        """Проверяет режим --history: повторный запуск пишет только новые номера."""
+        ad_data = {"123456": [("Иванов Иван", "ivanov.ivan@company.com", "True")]}
+        db_path = os.path.join(self.temp_dir.name, "data", "history.sqlite3")
+
+        def run(phones, timestamp, full=False):
+            with patch("phone_matcher.config.RESULTS_DIR", self.results_dir):
+                write_history_results(phones, ad_data, "v1", timestamp, full=full, db_path=db_path)
+            with open(os.path.join(self.results_dir, f"{timestamp}_output.csv"), "r", encoding="utf-8") as file_handle:
+                return list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))[1:]
+
+        self.assertEqual(run({"123456": [1, []]}, "2025-04-26_13-05-56"),
+                         [["123456", "Иванов Иван", "ivanov.ivan@company.com", "True"]])
+        self.assertEqual(run({"123456": [3, []], "777777": [1, []]}, "2025-04-27_13-05-56"),
+                         [["777777", "", "", ""]])
+        self.assertEqual(run({"777777": [1, []]}, "2025-04-28_13-05-56"), [])
+        self.assertEqual(len(run({"777777": [1, []]}, "2025-04-29_13-05-56", full=True)), 2)
+
+    def test_watch_uploads(self):
+        """Проверяет обработку нового файла в режиме наблюдения."""
+        archive_dir = os.path.join(self.temp_dir.name, "data", "archive")
+        logs_dir = os.path.join(self.temp_dir.name, "logs")
+        start_run_metrics("watch")
+        with patch("phone_matcher.config.RESULTS_DIR", self.results_dir), \
+             patch("phone_matcher.config.ARCHIVE_DIR", archive_dir), \
+             patch("phone_matcher.config.LOGS_DIR", logs_dir), \
+             patch("phone_matcher.main.parse_ad_file", wraps=parse_ad_file) as mock_parse_ad:
+            watch_uploads(self.test_ad_file, self.uploads_dir, poll_interval=0, max_cycles=3)
+            mock_parse_ad.assert_called_once_with(self.test_ad_file)
+            # Метрики партии записаны, этапы после неё собираются заново
+            self.assertEqual(len(os.listdir(logs_dir)), 1)
+            self.assertEqual(run_metrics_report()["stages"], [])
+            write_run_metrics(os.path.join(logs_dir, "metrics_run.json"))
+
+        self.assertFalse(os.path.exists(os.path.join(self.uploads_dir, "test.csv")))
+        results = os.listdir(self.results_dir)
+        self.assertEqual(len(results), 1)
+        with open(os.path.join(self.results_dir, results[0]), "r", encoding="utf-8") as file_handle:
+            rows = list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))
+        self.assertEqual(rows[1], ["123456", "Иванов Иван", "ivanov.ivan@company.com", "True"])
+
+    def test_resume_interrupted_run(self):
+        """Проверяет, что выгрузки архивируются только после записи результата, а --resume не разбирает их заново."""
+        upload = os.path.join(self.uploads_dir, "test.csv")
+        archive_dir = os.path.join(self.temp_dir.name, "data", "archive")
+        journal_dir = os.path.join(self.temp_dir.name, "data", "journal")
+        args = argparse.Namespace(uploads_dir=self.uploads_dir, workers=1, ad_file=[self.test_ad_file],
+                                  ad_cache=False, suffix_match=False, ranges=None, output_format="csv")
+        with patch("phone_matcher.config.RESULTS_DIR", self.results_dir), \
+             patch("phone_matcher.config.ARCHIVE_DIR", archive_dir), \
+             patch("phone_matcher.config.JOURNAL_DIR", journal_dir):
+            journal = open_run_journal("batch", resume=False)
+            with patch("phone_matcher.main.write_output_file", side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    run_journaled(args, "batch", journal)
+            self.assertTrue(os.path.exists(upload))
+            self.assertEqual(os.listdir(self.results_dir), [])
+
+            with patch("phone_matcher.main.parse_phone_files", wraps=lambda files, *_: iter([])) as mock_parse:
+                run_journaled(args, "batch", open_run_journal("batch", resume=True))
+                mock_parse.assert_called_once_with([], 1, False)
+
+        self.assertFalse(os.path.exists(upload))
+        self.assertEqual(os.listdir(journal_dir), [])
+        output_file = os.path.join(self.results_dir, f"{journal.timestamp}_output.csv")
+        with open(output_file, "r", encoding="utf-8") as file_handle:
+            rows = list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))
+        self.assertEqual(rows[1], ["123456", "Иванов Иван", "ivanov.ivan@company.com", "True"])
+
+    def test_archive_failure_keeps_journal(self):
+        """Проверяет, что при ошибке архивирования журнал остаётся, а --resume дорабатывает архивирование."""
+        upload = os.path.join(self.uploads_dir, "test.csv")
+        journal_dir = os.path.join(self.temp_dir.name, "data", "journal")
+        args = argparse.Namespace(uploads_dir=self.uploads_dir, workers=1, ad_file=[self.test_ad_file],
+                                  ad_cache=False, suffix_match=False, ranges=None, output_format="csv")
+        with patch("phone_matcher.config.RESULTS_DIR", self.results_dir), \
+             patch("phone_matcher.config.ARCHIVE_DIR", os.path.join(self.temp_dir.name, "data", "archive")), \
+             patch("phone_matcher.config.JOURNAL_DIR", journal_dir):
+            with patch("phone_matcher.main.archive_file", return_value=None), \
+                 patch("phone_matcher.main.log_error") as mock_error:
+                run_journaled(args, "batch", open_run_journal("batch", resume=False))
+            self.assertTrue(os.path.exists(upload))
+            self.assertIn(upload, mock_error.call_args[0][0])
+            self.assertNotEqual(os.listdir(journal_dir), [])
+
+            with patch("phone_matcher.main.parse_phone_files") as mock_parse:
+                run_journaled(args, "batch", open_run_journal("batch", resume=True))
+                mock_parse.assert_not_called()
+        self.assertFalse(os.path.exists(upload))
+        self.assertEqual(os.listdir(journal_dir), [])
+        self.assertEqual(len(os.listdir(self.results_dir)), 1)
+
+    def test_manifest_duplicate_uploads(self):
+        """Проверяет, что выгрузки с уже обработанным содержимым не разбираются заново."""
+        upload = os.path.join(self.uploads_dir, "test.csv")
+        copy = os.path.join(self.uploads_dir, "copy.csv")
+        manifest_dir = os.path.join(self.temp_dir.name, "data", "upload_manifest")
+        with patch("phone_matcher.config.UPLOAD_MANIFEST_DB", os.path.join(manifest_dir, "manifest.sqlite3")), \
+             patch("phone_matcher.config.UPLOAD_CACHE_DIR", os.path.join(manifest_dir, "numbers")):
+            with UploadManifest() as manifest:
+                self.assertEqual(process_phone_files(self.uploads_dir, manifest=manifest), [("123456", upload)])
+                manifest.commit()
+
+            shutil.copy(upload, copy)
+            with UploadManifest() as manifest, \
+                 patch("phone_matcher.main.parse_phone_files", wraps=lambda files, *_: iter([])) as mock_parse:
+                phones = process_phone_files(self.uploads_dir, manifest=manifest)
+                mock_parse.assert_called_once_with([], 1, False)
+            # Номера берутся из манифеста и относятся к новому файлу
+            self.assertEqual(phones, [("123456", copy), ("123456", upload)])
+
+            with UploadManifest(skip=True) as manifest, patch("phone_matcher.main.log_info") as log_info:
+                self.assertEqual(process_phone_files(self.uploads_dir, dedupe=True, manifest=manifest), {})
+            log_info.assert_any_call("Файлов с уже обработанным содержимым: 2 (пропущено)")
+
     def test_main_no_parameters(self):
         """Проверяет запуск без параметров."""
         with patch.object(sys, "argv", ["main.py"]):
@@ -1,5 +1,8 @@
+import os
 import unittest
-from phone_matcher.match import match_phones
+from phone_matcher.match import RuleMatcher, iter_counted_matches, iter_matches, iter_rule_matches, match_phones
+from phone_matcher.range_index import RangeIndex
+from phone_matcher.suffix_index import SuffixIndex
 
 class TestMatch(unittest.TestCase):
     """Тесты для модуля match."""
@@ -22,3 +25,52 @@ class TestMatch(unittest.TestCase):
         matches = match_phones(phones, ad_data)
         self.assertEqual(len(matches), 1)
         self.assertEqual(matches[0], ("987654", "", "", ""))
+
+    def test_iter_matches(self):
+        """Проверяет построчное сопоставление с дубликатами в AD."""
+        phones = iter([("123456", "source1"), ("987654", "source1")])
+        ad_data = {
+            "123456": [
+                ("Иванов Иван", "ivanov.ivan@company.com", "True"),
+                ("Иванов И.", "i.ivanov@company.com", "False"),
+            ]
+        }
+        matches = list(iter_matches(phones, ad_data))
+        self.assertEqual(len(matches), 3)
+        self.assertEqual(matches[1], ("123456", "Иванов И.", "i.ivanov@company.com", "False"))
+        self.assertEqual(matches[2], ("987654", "", "", ""))
+
+    def test_iter_counted_matches(self):
+        """Проверяет сопоставление уникальных номеров со счётчиками вхождений."""
+        occurrences = {
+            "123456": [1000, ["/uploads/a.csv", "/uploads/b.txt"]],
+            "987654": [2, ["/uploads/a.csv"]],
+        }
+        ad_data = {"123456": [("Иванов Иван", "ivanov.ivan@company.com", "True")]}
+        matches = list(iter_counted_matches(occurrences, ad_data))
+        self.assertEqual(matches, [
+            ("123456", "Иванов Иван", "ivanov.ivan@company.com", "True", 1000, "a.csv;b.txt"),
+            ("987654", "", "", "", 2, "a.csv"),
+        ])
+        # Файлы из подпапок выгрузок с одинаковыми именами различаются
+        occurrences = {"123456": [2, ["/uploads/site1/calls.csv", "/uploads/site2/calls.csv"]]}
+        matches = list(iter_counted_matches(occurrences, ad_data, uploads_dir="/uploads"))
+        self.assertEqual(matches[0][5], os.path.join("site1", "calls.csv") + ";" + os.path.join("site2", "calls.csv"))
+
+    def test_iter_rule_matches(self):
+        """Проверяет сопоставление по окончанию номера и по диапазону с указанием правила."""
+        ad_data = {
+            "123456": [("Иванов Иван", "ivanov.ivan@company.com", "True")],
+            "4951234567": [("Отдел продаж", "sales@company.com", "True")],
+        }
+        range_index = RangeIndex([("7812555xxxx", ("Филиал СПб", "spb@company.com", "True"))])
+        matcher = RuleMatcher(ad_data, SuffixIndex(ad_data), range_index)
+        phones = [("123456", "source1"), ("74951234567", "source1"), ("78125550042", "source1"),
+                  ("74950000000", "source1")]
+        matches = list(iter_rule_matches(phones, matcher))
+        self.assertEqual(matches, [
+            ("123456", "Иванов Иван", "ivanov.ivan@company.com", "True", "exact", "123456"),
+            ("74951234567", "Отдел продаж", "sales@company.com", "True", "suffix", "4951234567"),
+            ("78125550042", "Филиал СПб", "spb@company.com", "True", "range", "7812555xxxx"),
+            ("74950000000", "", "", "", "", ""),
+        ])
@@ -0,0 +1,84 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+import json
+from unittest.mock import patch
+from phone_matcher.metrics import (stage, timed_items, start_run_metrics, run_metrics_report, write_batch_metrics,
+                                   write_run_metrics)
+from phone_matcher.output import write_output_file
+
+class TestMetrics(unittest.TestCase):
+    """Тесты для модуля metrics."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def test_stage_records(self):
+        """Проверяет запись этапов, строк и итогов по имени этапа."""
+        start_run_metrics("batch")
+        with stage("match") as record:
+            record["rows"] = 3
+        items = list(timed_items([("a.txt", 2), ("b.txt", 5)], "upload_file",
+                                 lambda item: {"file": item[0], "rows": item[1]}))
+        self.assertEqual(len(items), 2)
+
+        report = run_metrics_report()
+        self.assertEqual(report["mode"], "batch")
+        self.assertEqual([record["stage"] for record in report["stages"]], ["match", "upload_file", "upload_file"])
+        self.assertEqual(report["stages"][1]["file"], "a.txt")
+        for record in report["stages"]:
+            self.assertGreaterEqual(record["wall_s"], 0)
+            self.assertGreaterEqual(record["cpu_s"], 0)
+            self.assertIn("rows_per_s", record)
+        self.assertEqual(report["totals"]["upload_file"]["count"], 2)
+        self.assertEqual(report["totals"]["upload_file"]["rows"], 7)
+        write_run_metrics(os.path.join(self.temp_dir.name, "metrics_test.json"))
+
+    def test_write_run_metrics(self):
+        """Проверяет запись отчёта в JSON с этапами сортировки и записи."""
+        metrics_file = os.path.join(self.temp_dir.name, "logs", "metrics_test.json")
+        start_run_metrics("batch")
+        with patch("phone_matcher.config.SORT_BUFFER_ROWS", 1):
+            write_output_file([("2", "", "", ""), ("1", "", "", "")], os.path.join(self.temp_dir.name, "out.csv"))
+        with patch("phone_matcher.metrics.log_info"):
+            report = write_run_metrics(metrics_file)
+
+        with open(metrics_file, "r", encoding="utf-8") as file_handle:
+            saved = json.load(file_handle)
+        self.assertEqual(saved["stages"], report["stages"])
+        self.assertEqual(saved["totals"]["sort"]["rows"], 2)
+        self.assertEqual(saved["totals"]["write"]["rows"], 2)
+        self.assertIn("peak_rss_kb", saved)
+        # Фрагменты сбрасываются в этапе sort, а сливаются при записи
+        self.assertEqual((saved["stages"][0]["spilled_runs"], saved["stages"][1]["merged_runs"]), (2, 2))
+        for record in saved["stages"]:
+            self.assertIn("max_rss_so_far_kb", record)
+            self.assertIn("max_rss_growth_kb", record)
+        self.assertIsNone(run_metrics_report())
+
+    def test_write_batch_metrics(self):
+        """Проверяет, что метрики партии записываются, а этапы не накапливаются между партиями."""
+        start_run_metrics("watch")
+        for batch in range(2):
+            with stage("upload_file", file=f"{batch}.txt") as record:
+                record["rows"] = 1
+            metrics_file = os.path.join(self.temp_dir.name, f"metrics_{batch}_batch.json")
+            with patch("phone_matcher.metrics.log_info"):
+                report = write_batch_metrics(metrics_file)
+            self.assertEqual([record["file"] for record in report["stages"]], [f"{batch}.txt"])
+            self.assertTrue(os.path.exists(metrics_file))
+        report = run_metrics_report()
+        self.assertEqual((report["mode"], report["stages"]), ("watch", []))
+        with patch("phone_matcher.metrics.log_info"):
+            write_run_metrics(os.path.join(self.temp_dir.name, "metrics_run.json"))
+
+    def test_no_run(self):
+        """Проверяет, что без начатого сбора этапы не записываются."""
+        with stage("match") as record:
+            record["rows"] = 1
+        self.assertIsNone(write_run_metrics(os.path.join(self.temp_dir.name, "metrics_test.json")))
+        self.assertIsNone(write_batch_metrics(os.path.join(self.temp_dir.name, "metrics_test.json")))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir.name, "metrics_test.json")))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
@@ -0,0 +1,29 @@
+import unittest
+from phone_matcher.normalize import normalize_phone, normalize_phone_cached, normalize_phones
+
+class TestNormalize(unittest.TestCase):
+    """Тесты для модуля normalize."""
+    def setUp(self):
+        self.phones = ["+7(123)456", " 12-34-56\n", "", "XX", "abc123", "١٢٣٤٥٦", "12²3", "12\x0034"]
+
+    def test_normalize_phone(self):
+        """Проверяет нормализацию одного номера."""
+        self.assertEqual(normalize_phone("+7(123)456"), "7123456")
+        self.assertEqual(normalize_phone(" 12-34-56\n"), "123456")
+        self.assertIsNone(normalize_phone(""))
+        self.assertIsNone(normalize_phone("XX"))
+
+    def test_normalize_phones(self):
+        """Проверяет, что пакетная нормализация совпадает с поштучной."""
+        expected = [normalize_phone(phone) for phone in self.phones]
+        self.assertEqual(normalize_phones(self.phones), expected)
+        ascii_phones = self.phones[:5]
+        self.assertEqual(normalize_phones(ascii_phones), expected[:5])
+        self.assertEqual(normalize_phones([]), [])
+
+    def test_normalize_phone_cached(self):
+        """Проверяет кэширование повторяющихся номеров."""
+        normalize_phone_cached.cache_clear()
+        for _ in range(3):
+            self.assertEqual(normalize_phone_cached("+7(123)456"), "7123456")
+        self.assertEqual(normalize_phone_cached.cache_info().hits, 2)
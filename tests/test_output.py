@@ -3,8 +3,10 @@ import unittest
 import tempfile
 import os
 import csv
+import gzip
+import json
 from unittest.mock import patch
-from phone_matcher.output import write_output_file
+from phone_matcher.output import detect_output_format, write_output_file
 from phone_matcher import config
 
 class TestOutput(unittest.TestCase):
@@ -28,5 +30,49 @@ class TestOutput(unittest.TestCase):
                 self.assertEqual(len(rows), 1)
                 self.assertEqual(rows[0], ["123456", "Иванов Иван", "ivanov.ivan@company.com", "True"])
 
+    def test_write_output_file_external_sort(self):
+        """Проверяет сортировку со сбросом фрагментов на диск."""
+        matches = [
+            ("333333", "Сидоров Петр", "petr.sidorov@company.com", "True"),
+            ("111111", "Иванов Иван", "ivanov.ivan@company.com", "True"),
+            ("222222", "Петрова Анна", "anna.petrova@company.com", "False"),
+            ("111111", "Иванов И.", "i.ivanov@company.com", "False"),
+        ]
+        with patch("phone_matcher.config.SORT_BUFFER_ROWS", 2):
+            count = write_output_file(iter(matches), self.output_file)
+        self.assertEqual(count, 4)
+        with open(self.output_file, "r", encoding="utf-8") as file_handle:
+            rows = list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))[1:]
+        self.assertEqual([row[0] for row in rows], ["111111", "111111", "222222", "333333"])
+        self.assertEqual(rows[0][1], "Иванов Иван")
+        self.assertEqual(os.listdir(self.temp_dir.name), ["output.csv"])
+
+    def test_write_output_formats(self):
+        """Проверяет запись сжатого CSV и JSON Lines с атомарной заменой и сортировкой."""
+        matches = [
+            ("222222", "Петрова Анна", "anna.petrova@company.com", "False", 2, "a.csv"),
+            ("111111", "Иванов \"Иван\"", "ivanov.ivan@company.com", "True", 1000, "a.csv;b.txt"),
+        ]
+        header = config.COUNTED_OUTPUT_FIELDS
+        csv_file = os.path.join(self.temp_dir.name, "output.csv.gz")
+        self.assertEqual(write_output_file(iter(matches), csv_file, header=header), 2)
+        with gzip.open(csv_file, "rt", encoding="utf-8", newline="") as file_handle:
+            rows = list(csv.reader(file_handle, delimiter=config.OUTPUT_DELIMITER))
+        self.assertEqual(rows[0], header)
+        self.assertEqual(rows[1], ["111111", "Иванов \"Иван\"", "ivanov.ivan@company.com", "True", "1000", "a.csv;b.txt"])
+
+        for name, opener in (("output.jsonl", open), ("output.jsonl.gz", gzip.open)):
+            jsonl_file = os.path.join(self.temp_dir.name, name)
+            with patch("phone_matcher.config.SORT_BUFFER_ROWS", 1):
+                self.assertEqual(write_output_file(iter(matches), jsonl_file, header=header), 2)
+            with opener(jsonl_file, "rt", encoding="utf-8") as file_handle:
+                records = [json.loads(line) for line in file_handle]
+            self.assertEqual([record["Номер"] for record in records], ["111111", "222222"])
+            self.assertEqual(records[0]["ФИО"], "Иванов \"Иван\"")
+            self.assertEqual(records[0]["Количество"], "1000")
+            self.assertEqual(os.stat(jsonl_file).st_mode & 0o777, config.FILE_PERMISSIONS)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ["output.csv.gz", "output.jsonl", "output.jsonl.gz"])
+        self.assertEqual(detect_output_format("results/out.txt"), "csv")
+
     def tearDown(self):
         self.temp_dir.cleanup()
@@ -5,7 +5,7 @@ import os
 import csv
 import glob
 from unittest.mock import patch
-from phone_matcher.parse_ad import parse_ad_file, validate_header, process_row
+from phone_matcher.parse_ad import parse_ad_file, parse_ad_files, validate_header, process_row, build_row_getter, decode_row
 from phone_matcher import config
 from phone_matcher.utils import setup_anomaly_logger
 
@@ -63,6 +63,17 @@ class TestParseAd(unittest.TestCase):
             self.assertEqual(anomaly_count, 0)
             mock_log_anomaly.assert_not_called()
 
+    def test_decode_row_projected_columns(self):
+        """Проверяет извлечение полей по позициям при другом порядке столбцов."""
+        header = ["Department", "mail", "Enabled", "telephoneNumber", "DisplayName"]
+        row = ["Отдел ИТ", "ivanov.ivan@company.com", "True", "+7(123)456#12", "Иванов Иван"]
+        get_fields = build_row_getter(header)
+        with patch("phone_matcher.parse_ad.log_anomaly") as mock_log_anomaly:
+            result, anomaly_count = decode_row(row, get_fields)
+            self.assertEqual(result, [("7123456", "Иванов Иван", "ivanov.ivan@company.com", "True")])
+            self.assertEqual(anomaly_count, 1)
+            mock_log_anomaly.assert_called_once_with('"Иванов Иван";"+7(123)456#12";"ivanov.ivan@company.com";"True"')
+
     def test_parse_ad_file(self):
         """Проверяет парсинг AD-файла и создание лога аномалий."""
         with patch("phone_matcher.config.LOGS_DIR", self.logs_dir):
@@ -78,5 +89,20 @@ class TestParseAd(unittest.TestCase):
                 log_content = log_file.read()
                 self.assertIn('Некорректный номер в строке: "Петрова Анна";"XX123;12345";"anna.petрова@company.com";"False"', log_content)
 
+    def test_parse_ad_files(self):
+        """Проверяет параллельный разбор нескольких AD-файлов в исходном порядке."""
+        second_file = os.path.join(self.temp_dir.name, "branch.csv")
+        with open(second_file, "w", encoding="utf-8", newline="") as file_handle:
+            writer = csv.writer(file_handle, delimiter=config.AD_DELIMITER, quoting=csv.QUOTE_ALL)
+            writer.writerow(["DisplayName", "telephoneNumber", "mail", "Enabled"])
+            writer.writerow(["Иванов И.", "123456", "ivanov@branch.company.com", "True"])
+        missing_file = os.path.join(self.temp_dir.name, "missing.csv")
+        results = list(parse_ad_files([self.test_ad_file, second_file, missing_file], workers=2))
+        self.assertEqual([result[0] for result in results], [self.test_ad_file, second_file, missing_file])
+        self.assertEqual(results[0][1].domains, ["test_ad"])
+        self.assertEqual(results[0][2], 2)
+        self.assertEqual(results[1][1]["123456"], [("Иванов И.", "ivanov@branch.company.com", "True")])
+        self.assertIsInstance(results[2][3], FileNotFoundError)
+
     def tearDown(self):
         self.temp_dir.cleanup()
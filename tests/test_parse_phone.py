@@ -3,7 +3,13 @@ import unittest
 import tempfile
 import os
 import csv
-from phone_matcher.parse_phone import parse_phone_file
+import bz2
+import gzip
+import lzma
+import zipfile
+from unittest.mock import patch
+from phone_matcher.parse_phone import (iter_phone_file, parse_phone_file, parse_phone_files, count_phone_file,
+                                      merge_phone_counts)
 from phone_matcher import config
 
 class TestParsePhone(unittest.TestCase):
@@ -31,5 +37,103 @@ class TestParsePhone(unittest.TestCase):
         self.assertEqual(len(phones), 1)
         self.assertIn(("123456", self.test_txt), phones)
 
+    def test_iter_phone_file(self):
+        """Проверяет построчное чтение выгрузки."""
+        phones = iter_phone_file(self.test_csv)
+        self.assertEqual(next(phones), ("123456", self.test_csv))
+        self.assertIsNone(next(phones, None))
+
+    def test_parse_phone_files_workers(self):
+        """Проверяет разбор в пуле процессов: порядок файлов и изоляцию ошибок."""
+        missing = os.path.join(self.temp_dir.name, "missing.csv")
+        phone_files = [self.test_txt, missing, self.test_csv]
+        results = list(parse_phone_files(phone_files, workers=2))
+        self.assertEqual([result[0] for result in results], phone_files)
+        self.assertEqual(results[0][1], [("123456", self.test_txt)])
+        self.assertIsNone(results[1][1])
+        self.assertIsInstance(results[1][2], FileNotFoundError)
+        self.assertEqual(results[2][1], [("123456", self.test_csv)])
+
+    def test_count_phone_files(self):
+        """Проверяет подсчёт повторов номеров по файлам, в том числе в пуле процессов."""
+        with open(self.test_txt, "a", encoding="utf-8") as file_handle:
+            file_handle.write("+1 (234) 56\n123456\n654321\n")
+        self.assertEqual(count_phone_file(self.test_txt), {"123456": 3, "654321": 1})
+
+        occurrences = {}
+        for phone_file, counts, exc in parse_phone_files([self.test_txt, self.test_csv], workers=2, counted=True):
+            self.assertIsNone(exc)
+            merge_phone_counts(occurrences, counts, phone_file)
+        self.assertEqual(occurrences, {
+            "123456": [4, [self.test_txt, self.test_csv]],
+            "654321": [1, [self.test_txt]],
+        })
+
+    def test_parse_compressed(self):
+        """Проверяет потоковое чтение сжатых выгрузок и всех подходящих файлов архива .zip."""
+        content = "phone\n123456\n+7 (495) 123-45-67\n".encode("windows-1251")
+        for ext, opener in ((".csv.gz", gzip.open), (".csv.bz2", bz2.open), (".csv.xz", lzma.open)):
+            compressed = os.path.join(self.temp_dir.name, f"calls{ext}")
+            with opener(compressed, "wb") as file_handle:
+                file_handle.write(content)
+            self.assertEqual(parse_phone_file(compressed), [("123456", compressed), ("74951234567", compressed)])
+
+        archive = os.path.join(self.temp_dir.name, "calls.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr("site1/calls.csv", content)
+            zip_file.writestr("site2/numbers.txt", "654321\n")
+            zip_file.writestr("readme.md", "123456\n")
+        self.assertEqual(parse_phone_file(archive), [("123456", archive), ("74951234567", archive), ("654321", archive)])
+
+        broken = os.path.join(self.temp_dir.name, "broken.zip")
+        with open(broken, "wb") as file_handle:
+            file_handle.write(b"not a zip")
+        with self.assertRaises(ValueError):
+            parse_phone_file(broken)
+
+    def test_corrupted_compressed(self):
+        """Проверяет, что повреждённый .gz и зашифрованный файл .zip — ошибка файла, а не прогона."""
+        data = bytearray(gzip.compress(("phone\n" + "".join(f"{100000 + i}\n" for i in range(5000))).encode()))
+        for index in range(20, 28):
+            data[index] ^= 0xFF
+        corrupted = os.path.join(self.temp_dir.name, "corrupted.csv.gz")
+        with open(corrupted, "wb") as file_handle:
+            file_handle.write(data)
+        with self.assertRaises(ValueError):
+            parse_phone_file(corrupted)
+
+        archive = os.path.join(self.temp_dir.name, "encrypted.zip")
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("calls.csv", "phone\n123456\n")
+        with patch("phone_matcher.compression.zipfile.ZipFile.open",
+                   side_effect=RuntimeError("File is encrypted, password required for extraction")):
+            results = list(parse_phone_files([corrupted, archive, self.test_txt], counted=True))
+        self.assertIsInstance(results[0][2], ValueError)
+        self.assertIsInstance(results[1][2], ValueError)
+        self.assertEqual(results[2], (self.test_txt, {"123456": 1}, None))
+
+    def test_mmap_matches_stream(self):
+        """Проверяет, что разбор через mmap совпадает с построчным разбором."""
+        contents = {
+            "bom.csv": "\ufeffphone;x\n+7 (495) 123-45-67;a\n\n;b\nабв;c\n".replace(";", config.UPLOAD_DELIMITER),
+            "quoted.csv": 'x,phone\n1,"8 (495)\n123-45-67"\n2,74951234567\r\n'.replace(",", config.UPLOAD_DELIMITER),
+            "mixed.txt": "74951234567\r\n\rабв\n٧٤٩٥١٢٣٤٥٦٧\n(\t\r123456\n",
+        }
+        # Последняя строка не декодируется как UTF-8: кодировка меняется посреди файла
+        tail = "ж1" + config.UPLOAD_DELIMITER + "ж1\n"
+        chunk_sizes = [1, 8, config.DECODE_CHUNK_SIZE]
+        for name, content in contents.items():
+            for encoding in ("utf-8", "cp1251"):
+                path = os.path.join(self.temp_dir.name, name)
+                with open(path, "wb") as file_handle:
+                    file_handle.write(content.encode(encoding, "ignore") + tail.encode("cp1251"))
+                for chunk_size in chunk_sizes:
+                    with self.subTest(name=name, encoding=encoding, chunk_size=chunk_size), \
+                            patch.object(config, "DECODE_CHUNK_SIZE", chunk_size):
+                        with patch.object(config, "MMAP_UPLOADS", False):
+                            expected = parse_phone_file(path)
+                        with patch.object(config, "MMAP_UPLOADS", True):
+                            self.assertEqual(parse_phone_file(path), expected)
+
     def tearDown(self):
         self.temp_dir.cleanup()
@@ -0,0 +1,61 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+from unittest.mock import patch
+from phone_matcher.range_index import RangeIndex, parse_range, parse_ranges_file
+
+class TestRangeIndex(unittest.TestCase):
+    """Тесты для модуля range_index."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index = RangeIndex([
+            ("495123xxxx", ("Офис Москва", "msk@company.com", "True")),
+            ("4951234xxx", ("Отдел продаж", "sales@company.com", "True")),
+            ("4951234500-4951234599", ("Колл-центр", "cc@company.com", "True")),
+            ("812555xxxx", ("Офис СПб", "spb@company.com", "False")),
+        ])
+
+    def test_parse_range(self):
+        """Проверяет разбор блоков с подстановочными знаками и явных границ."""
+        self.assertEqual(parse_range("495123xxxx"), (10, 4951230000, 4951239999))
+        self.assertEqual(parse_range("0495123-0495200"), (7, 495123, 495200))
+        for spec in ["49x123xxxx", "4951-49512", "123xx", "4951239999-4951230000", "+7495xxxx"]:
+            with self.assertRaises(ValueError):
+                parse_range(spec)
+
+    def test_find_narrowest(self):
+        """Проверяет выбор самого узкого вложенного диапазона."""
+        self.assertEqual(self.index.find("4951234567")[0], "4951234500-4951234599")
+        self.assertEqual(self.index.find("4951234600")[0], "4951234xxx")
+        self.assertEqual(self.index.find("4951239999")[0], "495123xxxx")
+        self.assertEqual(self.index.find("8125550000")[1], [("Офис СПб", "spb@company.com", "False")])
+
+    def test_not_found(self):
+        """Проверяет номера вне диапазонов и другой длины."""
+        self.assertIsNone(self.index.find("4951220000"))
+        self.assertIsNone(self.index.find("49512345678"))
+        self.assertIsNone(self.index.find("1000000000"))
+
+    def test_overlap_rejected(self):
+        """Проверяет, что частично пересекающийся диапазон пропускается."""
+        with patch("phone_matcher.range_index.log_error") as mock_log_error:
+            index = RangeIndex([
+                ("4951230000-4951235000", ("A", "", "")),
+                ("4951234000-4951239999", ("B", "", "")),
+            ])
+        self.assertEqual(len(index), 1)
+        mock_log_error.assert_called_once()
+        self.assertIsNone(index.find("4951236000"))
+
+    def test_parse_ranges_file(self):
+        """Проверяет чтение файла диапазонов в windows-1251."""
+        ranges_file = os.path.join(self.temp_dir.name, "ranges.csv")
+        with open(ranges_file, "w", encoding="windows-1251") as file_handle:
+            file_handle.write('"range";"DisplayName";"mail";"Enabled"\n')
+            file_handle.write('"495123xxxx";"Офис Москва";"msk@company.com";"True"\n')
+        index = parse_ranges_file(ranges_file)
+        self.assertEqual(index.find("4951230001"), ("495123xxxx", [("Офис Москва", "msk@company.com", "True")]))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
@@ -0,0 +1,62 @@
+import json
+import threading
+import unittest
+from unittest.mock import patch
+from urllib.request import Request, urlopen
+from phone_matcher.server import LookupServer, lookup_result
+from phone_matcher.utils import set_row_event_aggregation
+
+class TestServer(unittest.TestCase):
+    """Тесты для модуля server."""
+    def setUp(self):
+        self.ad_data = {
+            "123456": [
+                ("Иванов Иван", "ivanov.ivan@company.com", "True"),
+                ("Иванов И.", "i.ivanov@company.com", "False"),
+            ]
+        }
+        self.server = LookupServer(("127.0.0.1", 0), self.ad_data)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def test_lookup_result(self):
+        """Проверяет нормализацию и дубликаты при поиске одного номера."""
+        result = lookup_result("+(12) 34-56", self.ad_data)
+        self.assertEqual(result["phone"], "123456")
+        self.assertTrue(result["found"])
+        self.assertEqual(len(result["records"]), 2)
+        self.assertEqual(lookup_result("abc", self.ad_data),
+                         {"query": "abc", "phone": None, "found": False, "records": []})
+
+    def test_get_lookup(self):
+        """Проверяет поиск через GET."""
+        with urlopen(f"{self.base_url}/lookup?phone=123456&phone=987654") as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        self.assertEqual([result["found"] for result in payload["results"]], [True, False])
+        self.assertEqual(payload["results"][0]["records"][0]["name"], "Иванов Иван")
+
+    def test_request_log(self):
+        """Проверяет, что запросы из потоков сервера пишутся в лог сразу, без агрегации построчных событий."""
+        set_row_event_aggregation(True)
+        try:
+            with patch("phone_matcher.server.log_verbose") as mock_log:
+                with urlopen(f"{self.base_url}/lookup?phone=123456") as response:
+                    response.read()
+            self.assertIn('"GET /lookup?phone=123456 HTTP/1.1" 200', mock_log.call_args[0][0])
+        finally:
+            set_row_event_aggregation(False)
+
+    def test_post_lookup(self):
+        """Проверяет пакетный поиск через POST."""
+        body = json.dumps({"phones": ["12-34-56"]}).encode("utf-8")
+        request = Request(f"{self.base_url}/lookup", data=body, headers={"Content-Type": "application/json"})
+        with urlopen(request) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        self.assertEqual(payload["results"][0]["phone"], "123456")
+        self.assertEqual(payload["results"][0]["records"][1]["enabled"], "False")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
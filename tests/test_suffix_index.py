@@ -0,0 +1,26 @@
+import unittest
+from phone_matcher.suffix_index import SuffixIndex
+
+class TestSuffixIndex(unittest.TestCase):
+    """Тесты для модуля suffix_index."""
+    def setUp(self):
+        self.index = SuffixIndex(["123456", "4951123456", "654321", "9123456", "0654321"])
+
+    def test_longest_suffix(self):
+        """Проверяет выбор самого длинного номера AD, которым заканчивается номер."""
+        self.assertEqual(self.index.find("74951123456"), "4951123456")
+        self.assertEqual(self.index.find("78129123456"), "9123456")
+        self.assertEqual(self.index.find("78120123456"), "123456")
+        self.assertEqual(self.index.find("123456"), "123456")
+
+    def test_candidate_between_prefixes(self):
+        """Проверяет поиск, когда ближайший номер в индексе не является окончанием."""
+        # Развёрнутые "0654321" и "654321" лежат между "123456" и "7770654321"
+        self.assertEqual(self.index.find("7770654321"), "0654321")
+        self.assertEqual(self.index.find("7779654321"), "654321")
+
+    def test_not_found(self):
+        """Проверяет номера без подходящего окончания."""
+        self.assertIsNone(self.index.find("23456"))
+        self.assertIsNone(self.index.find("000000"))
+        self.assertEqual(len(self.index), 5)
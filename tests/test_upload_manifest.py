@@ -0,0 +1,126 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from phone_matcher.ad_cache import hash_file
+from phone_matcher.upload_manifest import UploadManifest
+from phone_matcher import config
+
+def days_ago(days):
+    return (datetime.now() - timedelta(days=days)).strftime(config.DATE_FORMAT)
+
+class TestUploadManifest(unittest.TestCase):
+    """Тесты для модуля upload_manifest."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "manifest", "manifest.sqlite3")
+        self.cache_dir = os.path.join(self.temp_dir.name, "manifest", "numbers")
+
+    def make_upload(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8") as file_handle:
+            file_handle.write(content)
+        return path
+
+    def open_manifest(self):
+        return UploadManifest(db_path=self.db_path, cache_dir=self.cache_dir)
+
+    def test_find_duplicates(self):
+        """Проверяет поиск содержимого, обработанного раньше и в этом же прогоне."""
+        first = self.make_upload("a.csv", "phone\n123456\n123456\n")
+        with self.open_manifest() as manifest:
+            manifest.record(first, [("123456", first), ("123456", first)])
+            manifest.commit(days_ago(1))
+
+        copy = self.make_upload("a_copy.csv", "phone\n123456\n123456\n")
+        other = self.make_upload("b.txt", "777777\n")
+        other_copy = self.make_upload("b_copy.txt", "777777\n")
+        same_size = self.make_upload("c.txt", "888888\n")
+        with self.open_manifest() as manifest, \
+             patch("phone_matcher.upload_manifest.hash_file", wraps=hash_file) as mock_hash:
+            duplicates = manifest.find_duplicates([copy, other, other_copy, same_size])
+            self.assertEqual(set(duplicates), {copy, other_copy})
+            self.assertEqual(duplicates[copy]["source"], first)
+            self.assertEqual(duplicates[copy]["processed"], days_ago(1))
+            self.assertEqual(duplicates[other_copy]["source"], other)
+            self.assertIsNone(duplicates[other_copy]["processed"])
+            self.assertEqual(manifest.load_numbers(duplicates[copy]), {"123456": 2})
+            # Хеш считается только для файлов с совпадающим размером, и один раз на файл
+            manifest.record(other, Counter({"777777": 1}))
+            self.assertEqual(mock_hash.call_count, 4)
+            self.assertEqual(len(manifest), 1)
+            manifest.commit()
+            self.assertEqual(len(manifest), 2)
+
+        # Хеши неизменившихся файлов сохраняются в манифесте и не пересчитываются при следующем открытии
+        with self.open_manifest() as manifest, \
+             patch("phone_matcher.upload_manifest.hash_file", wraps=hash_file) as mock_hash:
+            self.assertEqual(set(manifest.find_duplicates([copy, other_copy, same_size])), {copy, other_copy})
+            mock_hash.assert_not_called()
+            with open(same_size, "w", encoding="utf-8") as file_handle:
+                file_handle.write("999999\n")
+            os.utime(same_size, ns=(0, 0))
+            manifest.find_duplicates([same_size])
+            mock_hash.assert_called_once_with(same_size)
+
+    def test_rollback(self):
+        """Проверяет, что незафиксированные записи и их номера не остаются, как и номера после сбоя."""
+        upload = self.make_upload("a.csv", "phone\n123456\n")
+        with self.open_manifest() as manifest:
+            manifest.record(upload, [("123456", upload)])
+            manifest.rollback()
+            self.assertEqual(os.listdir(self.cache_dir), [])
+            manifest.record(upload, [("123456", upload)])
+        # Закрытие без commit() тоже отменяет изменения
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        for name in ("0123abcd.txt", "4567cdef.txt.pending", "89abcdef.txt.pending"):
+            open(os.path.join(self.cache_dir, name), "w", encoding="utf-8").close()
+        old = datetime.now().timestamp() - config.UPLOAD_MANIFEST_ORPHAN_AGE - 60
+        for name in ("0123abcd.txt", "4567cdef.txt.pending"):
+            os.utime(os.path.join(self.cache_dir, name), (old, old))
+        with self.open_manifest() as manifest:
+            self.assertEqual(len(manifest), 0)
+        # Свежий временный файл может принадлежать другому процессу и не удаляется
+        self.assertEqual(os.listdir(self.cache_dir), ["89abcdef.txt.pending"])
+
+    def test_concurrent_open(self):
+        """Проверяет, что открытие манифеста не мешает процессу между record() и commit()."""
+        upload = self.make_upload("a.csv", "phone\n123456\n")
+        other = self.make_upload("b.csv", "phone\n654321\n")
+        with self.open_manifest() as manifest:
+            manifest.record(upload, [("123456", upload)])
+            manifest.record(other, [("654321", other)])
+            self.open_manifest().close()
+            # Временный файл, всё же удалённый извне, не прерывает фиксацию остальных
+            os.remove(os.path.join(self.cache_dir, f"{hash_file(other)}.txt.pending"))
+            with patch("phone_matcher.upload_manifest.log_error") as mock_log_error:
+                manifest.commit()
+            mock_log_error.assert_called_once()
+            self.assertEqual(len(manifest), 1)
+        self.assertEqual(os.listdir(self.cache_dir), [f"{hash_file(upload)}.txt"])
+
+    def test_long_lived_prune(self):
+        """Проверяет датирование встреч в commit() и очистку устаревшего без перезапуска (--watch)."""
+        kept = self.make_upload("a.csv", "phone\n123456\n")
+        dropped = self.make_upload("b.csv", "phone\n654321\n123\n")
+        stale = days_ago(config.UPLOAD_MANIFEST_MAX_AGE_DAYS + 1)
+        with self.open_manifest() as manifest:
+            manifest.record(kept, [("123456", kept)])
+            manifest.record(dropped, [("654321", dropped)])
+            manifest.commit(stale)
+            self.assertEqual(len(manifest), 2)
+
+            copy = self.make_upload("a_copy.csv", "phone\n123456\n")
+            manifest.load_numbers(manifest.find_duplicates([copy])[copy])
+            with patch("phone_matcher.config.UPLOAD_MANIFEST_PRUNE_INTERVAL", 0):
+                manifest.commit()
+            self.assertEqual(len(manifest), 1)
+            self.assertEqual(set(manifest.find_duplicates([copy])), {copy})
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
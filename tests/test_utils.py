@@ -3,8 +3,10 @@ import unittest
 import tempfile
 import os
 import csv
+import logging
 from unittest.mock import patch, Mock
-from phone_matcher.utils import find_phone_files, move_file_to_archive, setup_logger, log_info
+from phone_matcher.utils import (find_phone_files, move_file_to_archive, setup_logger, log_info, log_row_event,
+                                 flush_row_events, set_row_event_aggregation, stop_logger, RelativePathFormatter)
 from phone_matcher import config
 
 class TestUtils(unittest.TestCase):
@@ -26,6 +28,48 @@ class TestUtils(unittest.TestCase):
         files = find_phone_files(config.EXCLUDE_DIRS, self.uploads_dir)
         self.assertEqual(len(files), 1)
         self.assertIn(self.test_file, files)
+        # Служебные папки с файлами .csv/.txt не считаются выгрузками, даже если --uploads-dir указывает на data/
+        for directory in (config.JOURNAL_DIR, config.UPLOAD_CACHE_DIR, config.AD_CACHE_DIR, config.INPUT_DIR):
+            self.assertTrue(any(os.path.commonpath([directory, excluded]) == excluded
+                                for excluded in config.EXCLUDE_DIRS), directory)
+
+    def test_find_compressed_phone_files(self):
+        """Проверяет поиск сжатых выгрузок и архивов .zip."""
+        for name in ("calls.csv.gz", "calls.txt.xz", "calls.zip", "calls.gz", "calls.log.bz2"):
+            open(os.path.join(self.uploads_dir, name), "wb").close()
+        files = find_phone_files(config.EXCLUDE_DIRS, self.uploads_dir)
+        self.assertEqual(sorted(os.path.basename(file) for file in files),
+                         ["calls.csv.gz", "calls.txt.xz", "calls.zip", "test.csv"])
+
+    def test_find_phone_files_recursive(self):
+        """Проверяет поиск в подпапках, исключение папок, минимальный возраст и порядок по размеру."""
+        site_dir = os.path.join(self.uploads_dir, "site1")
+        excluded_dir = os.path.join(self.uploads_dir, "processed")
+        os.makedirs(site_dir)
+        os.makedirs(excluded_dir)
+        os.symlink(excluded_dir, os.path.join(site_dir, "processed_link"))
+        for path, size in ((os.path.join(site_dir, "big.txt"), 100), (os.path.join(site_dir, "notes.md"), 200),
+                           (os.path.join(excluded_dir, "old.csv"), 300), (os.path.join(site_dir, "fresh.csv"), 400)):
+            with open(path, "w", encoding="utf-8") as file_handle:
+                file_handle.write("1" * size)
+        old = os.path.getmtime(self.test_file) - 60
+        for path in (self.test_file, os.path.join(site_dir, "big.txt")):
+            os.utime(path, (old, old))
+
+        files = find_phone_files([excluded_dir], self.uploads_dir)
+        self.assertEqual(files, [os.path.join(site_dir, "fresh.csv"), os.path.join(site_dir, "big.txt"),
+                                 self.test_file])
+        files = find_phone_files([excluded_dir], self.uploads_dir, min_age=30)
+        self.assertEqual(files, [os.path.join(site_dir, "big.txt"), self.test_file])
+        # Время изменения в будущем (расхождение часов) без min_age файл не скрывает
+        future = os.path.getmtime(self.test_file) + 3600
+        os.utime(self.test_file, (future, future))
+        self.assertIn(self.test_file, find_phone_files([excluded_dir], self.uploads_dir, min_age=0))
+        with patch("phone_matcher.utils.log_info") as mock_info:
+            self.assertNotIn(self.test_file, find_phone_files([excluded_dir], self.uploads_dir, min_age=30))
+        self.assertIn(self.test_file, mock_info.call_args[0][0])
+        with patch("phone_matcher.config.UPLOAD_RECURSIVE", False):
+            self.assertEqual(find_phone_files([excluded_dir], self.uploads_dir), [self.test_file])
 
     def test_move_file_to_archive(self):
         """Проверяет перемещение файла в архив."""
@@ -34,6 +78,17 @@ class TestUtils(unittest.TestCase):
             move_file_to_archive(self.test_file, archive_dir)
             self.assertFalse(os.path.exists(self.test_file))
 
+    def test_move_compressed_file_to_archive(self):
+        """Проверяет, что сжатый файл архивируется как есть, а счётчик ставится перед расширениями."""
+        archive_dir = os.path.join(self.temp_dir.name, "data", "archive")
+        with patch("phone_matcher.config.ARCHIVE_PARTITION_FORMAT", ""):
+            for _ in range(2):
+                compressed = os.path.join(self.uploads_dir, "calls.csv.gz")
+                open(compressed, "wb").close()
+                move_file_to_archive(compressed, archive_dir)
+        self.assertEqual(sorted(os.listdir(archive_dir)),
+                         [config.ARCHIVE_INDEX_FILE, "calls.csv.gz", "calls_1.csv.gz"])
+
     def test_setup_logger(self):
         """Проверяет создание лог-файла."""
         log_file = os.path.join(self.logs_dir, "matcher_test.log")
@@ -54,5 +109,47 @@ class TestUtils(unittest.TestCase):
                 content = file_handle.read()
                 self.assertIn("Test log", content)
 
+    def test_log_row_event_aggregation(self):
+        """Проверяет агрегацию построчных событий в счётчики и примеры."""
+        set_row_event_aggregation(True)
+        try:
+            with patch("phone_matcher.config.LOG_ROW_SAMPLES", 2), \
+                 patch("logging.Logger.debug") as mock_debug:
+                for number in range(5):
+                    log_row_event("Не найдено в AD", "Номер %s не найден в AD", number)
+                mock_debug.assert_not_called()
+                flush_row_events()
+                mock_debug.assert_called_once_with("%s: %d, примеры: %s", "Не найдено в AD", 5,
+                                                   "Номер 0 не найден в AD; Номер 1 не найден в AD")
+        finally:
+            set_row_event_aggregation(False)
+
+    def test_setup_logger_queued(self):
+        """Проверяет фоновую запись лога через очередь."""
+        with patch("phone_matcher.config.LOGS_DIR", self.logs_dir):
+            setup_logger(False, queued=True)
+            log_info("Фоновая запись")
+            stop_logger()
+        for handler in logging.getLogger().handlers:
+            handler.close()
+        logging.getLogger().handlers = []
+        log_files = [name for name in os.listdir(self.logs_dir) if name.startswith("matcher_")]
+        self.assertEqual(len(log_files), 1)
+        with open(os.path.join(self.logs_dir, log_files[0]), "r", encoding="utf-8") as file_handle:
+            self.assertIn("Фоновая запись", file_handle.read())
+
+    def test_relative_path_formatter(self):
+        """Проверяет замену абсолютных путей на относительные."""
+        formatter = RelativePathFormatter("%(message)s")
+        path = os.path.join(config.BASE_DIR, "data", "phone_data", "test.csv")
+        record = logging.LogRecord("root", logging.INFO, __file__, 0, f"Файл {path}", None, None)
+        self.assertEqual(formatter.format(record), "Файл ./data/phone_data/test.csv")
+        record = logging.LogRecord("root", logging.INFO, __file__, 0, "Без путей", None, None)
+        self.assertEqual(formatter.format(record), "Без путей")
+        # Пути в аргументах шаблона (log_row_event) тоже заменяются, исходная запись не меняется
+        record = logging.LogRecord("root", logging.DEBUG, __file__, 0, "Номер %s из %s", ("123456", path), None)
+        self.assertEqual(formatter.format(record), "Номер 123456 из ./data/phone_data/test.csv")
+        self.assertEqual(record.getMessage(), f"Номер 123456 из {path}")
+
     def tearDown(self):
         self.temp_dir.cleanup()
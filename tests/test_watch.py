@@ -0,0 +1,41 @@
+# pylint: disable=consider-using-with
+import unittest
+import tempfile
+import os
+from phone_matcher.watch import UploadWatcher
+
+class TestWatch(unittest.TestCase):
+    """Тесты для модуля watch."""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.uploads_dir = os.path.join(self.temp_dir.name, "phone_data")
+        self.ad_file = os.path.join(self.temp_dir.name, "ad.csv")
+        self.test_file = os.path.join(self.uploads_dir, "test.csv")
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        with open(self.ad_file, "w", encoding="utf-8") as file_handle:
+            file_handle.write("DisplayName;telephoneNumber;mail;Enabled\n")
+        with open(self.test_file, "w", encoding="utf-8") as file_handle:
+            file_handle.write("phone\n123456\n")
+        self.watcher = UploadWatcher(self.ad_file, self.uploads_dir)
+
+    def test_poll_waits_for_stable_file(self):
+        """Проверяет, что файл отдаётся только после того, как перестал меняться."""
+        self.assertEqual(self.watcher.poll(), [])
+        with open(self.test_file, "a", encoding="utf-8") as file_handle:
+            file_handle.write("789012\n")
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.poll(), [self.test_file])
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_ad_changed(self):
+        """Проверяет перезагрузку AD только после изменения файла."""
+        self.assertTrue(self.watcher.ad_changed())
+        self.assertFalse(self.watcher.ad_changed())
+        with open(self.ad_file, "a", encoding="utf-8") as file_handle:
+            file_handle.write('"Иванов Иван";"123456";"ivanov.ivan@company.com";"True"\n')
+        self.assertFalse(self.watcher.ad_changed())
+        self.assertTrue(self.watcher.ad_changed())
+        self.assertFalse(self.watcher.ad_changed())
+
+    def tearDown(self):
+        self.temp_dir.cleanup()